@@ -1,6 +1,11 @@
 import pika
 from pika.exchange_type import ExchangeType
 import bson
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../Metadata_Module')))
+from blob_store import resolve_payload
 
 def consumer_connection(routing_key):
     # Establish a connection to RabbitMQ server
@@ -29,7 +34,7 @@ def on_message_received(ch, method, properties, body):
     body=bson.loads(body)
     #save the image
     with open(f'{body["file_name"]}', 'wb') as image_file:
-        image_file.write(body['Payload'])
+        image_file.write(resolve_payload(body))
   
     
 
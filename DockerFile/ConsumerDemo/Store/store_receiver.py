@@ -1,6 +1,11 @@
 import pika
 from pika.exchange_type import ExchangeType
 import bson
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../Metadata_Module')))
+from blob_store import resolve_payload
 
 def consumer_connection(routing_key):
     # Establish a connection to RabbitMQ server
@@ -32,7 +37,7 @@ def on_message_received(ch, method, properties, body):
     
     #save the image
     with open(f'{body["FileName"]}', 'wb') as file:
-        file.write(body['Payload'])
+        file.write(resolve_payload(body))
     # Save the 'Meta' data to a new file with .txt extension
     with open(f'{base_file_name} Meta.txt', 'wb') as file:
         file.write(body['Meta'])
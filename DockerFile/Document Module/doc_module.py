@@ -1,222 +1,194 @@
-import spacy
 import pdfplumber
-from spacy.lang.en.stop_words import STOP_WORDS
-from string import punctuation
-from heapq import nlargest
 import os
 import io
+import time
+import functools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import fitz
 import pika
 from bson import BSON, decode, encode
 import json
 from datetime import datetime
-import random
-import hashlib
 import sys
 from bson import ObjectId
 from copy import deepcopy
 from pprint import pprint
+from model_registry import models
 
 
 sys.path.append(
     os.path.abspath(os.path.join(os.path.dirname(__file__), "../Metadata_Module"))
 )
 
-from analyzer import entityRelationExtraction
-from recNparse import MessageProcessor
-from image_moduleMac import ImageClassifier
+from analyzer import entityRelationExtraction, extract_sentence_entities
+from document_analysis import analyze_document
+from page_extractor import extract_text, start_pool
+from blob_store import blob_store, offload_payload, resolve_payload
+from id_service import new_id, content_hash
+from dedup_index import DedupIndex, DEDUP_ENABLED
+from statusFeed import statusFeed
+from publisher import publish_to_rabbitmq as publish_status
+from dead_letter import should_requeue
 
 
 # from image_module import ImageProcessor
-FilePath = os.path.dirname(__file__)
 
-
-def openFile(the_file, file_name, contentID):
-    # Pass file to Meta and Convert file to Text
-    Meta_file = Meta(the_file, file_name)
-    Text_Summerizer, Keyword = ConvertFile_txt(the_file, file_name, contentID)
-    return Meta_file, Text_Summerizer, Keyword
-
-
-def Meta(the_file, file_name):
-    with pdfplumber.open(the_file) as pdf:
-        with open(FilePath + "/" + "Meta.txt", "w") as f:
-            print(pdf.metadata, file=f)
-            print(pdf.pages, file=f)
-
-    # Open Meta.txt as binary
-    with open(FilePath + "/" + "Meta.txt", "rb") as f:
-        return f
-
-
-def ConvertFile_txt(the_file, file_name, contentID):
-    text_pdf = ""
-    with pdfplumber.open(the_file) as pdf:
-        for page in pdf.pages:
-            text_pdf += page.extract_text()
-    Summerizer_file = Text_Summerizer(text_pdf, file_name, contentID)
-    Keyword_file = KeyWord(text_pdf)
-    return Summerizer_file, Keyword_file
+# Worker processes consuming the Document queue and unacknowledged
+# documents each of them holds. With several workers each one gets
+# cpu_count // DOCUMENT_WORKERS page extraction processes (PAGE_WORKERS in
+# single worker mode) and forks NER_N_PROCESS more for the NER model
+# (analyzer.py, 1 by default), so the cores are not oversubscribed.
+DOCUMENT_WORKERS = int(os.environ.get("DOCUMENT_WORKERS", 1))
+DOCUMENT_PREFETCH = int(os.environ.get("DOCUMENT_PREFETCH", 1))
+
+# Images are always deduplicated within a document. With IMAGE_DEDUP_GLOBAL=1
+# an image whose bytes were already classified for any earlier document is
+# not sent to the Image queue again either.
+IMAGE_DEDUP_GLOBAL = os.environ.get("IMAGE_DEDUP_GLOBAL", "0") == "1"
+
+# Extracted images larger than this on their longest side are downscaled to
+# it. 0 sends them as embedded; the classifier works at 224x224.
+IMAGE_MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", 0))
+
+# Fields left out of the dashboard status of a failed document
+PROCESSED_FIELDS = ("Payload", "PayloadRef", "Meta", "Summary", "Keywords")
+
+# Results of documents already processed, keyed by content hash
+dedup_index = DedupIndex() if DEDUP_ENABLED else None
+
+
+def openFile(pdf_bytes, file_name, contentID):
+    # Open the PDF from memory for the metadata, the text comes from the page extractor
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        Meta_file = Meta(pdf)
+    Text_Summerizer, Keyword, graph = ConvertFile_txt(pdf_bytes, file_name, contentID)
+    return Meta_file, Text_Summerizer, Keyword, graph
+
+
+def Meta(pdf):
+    # Same content Meta.txt used to hold: the metadata dict and the page list
+    return f"{pdf.metadata}\n{pdf.pages}\n".encode()
+
+
+def ConvertFile_txt(pdf_bytes, file_name, contentID):
+    # Pages are extracted in parallel; the analysis needs the whole text, so
+    # it starts once the last page is in
+    started = time.perf_counter()
+    text_pdf = extract_text(pdf_bytes)
+    print(f"Extracted text in {time.perf_counter() - started:.2f}s")
+    # One parse of the text gives the summary, keywords and entity candidates
+    analysis = analyze_document(text_pdf, extract_sentence_entities)
+    print(
+        f"Document analysis CPU time: {analysis.cpu_seconds:.2f}s, "
+        f"saved: {analysis.cpu_saved_seconds:.2f}s"
+    )
+    Summerizer_file, graph = Text_Summerizer(analysis, file_name, contentID)
+    Keyword_file = KeyWord(analysis)
+    return Summerizer_file, Keyword_file, graph
 
 
-def Text_Summerizer(text_pdf, file_name, contentID):
+def Text_Summerizer(analysis, file_name, contentID):
     """
-    Summarize the provided text, handling line breaks as separate sentences.
-    Return the summary as an array of sentences, save it to 'summary.txt', and print the sentences.
+    Print the summary sentences of the analysis and build the entity graph
+    from them.
+    Return the summary as bytes, one sentence per line, and the entity graph
+    written to Neo4j.
     """
-    nlp = spacy.load("en_core_web_lg")
-
-    # Split the text on '\n' and process each line separately
-    text_lines = text_pdf.split("\n")
-    doc = nlp(" ".join(text_lines))  # Re-combine the lines after splitting
-
-    # Calculate word frequencies excluding stop words and punctuation
-    word_frequencies = {}
-    for word in doc:
-        if word.text.lower() not in STOP_WORDS and word.text not in punctuation:
-            word_frequencies[word.text.lower()] = (
-                word_frequencies.get(word.text.lower(), 0) + 1
-            )
-
-    # Normalize word frequencies
-    max_frequency = max(word_frequencies.values(), default=1)
-    for word in word_frequencies:
-        word_frequencies[word] /= max_frequency
-
-    # Score sentences based on word frequencies
-    sentence_scores = {}
-    for sent in doc.sents:
-        for word in sent:
-            if word.text.lower() in word_frequencies:
-                sentence_scores[sent] = (
-                    sentence_scores.get(sent, 0) + word_frequencies[word.text.lower()]
-                )
-
-    # Select top sentences for summary
-    select_length = int(
-        len(list(doc.sents)) * 0.6
-    )  # Adjust the proportion of sentences as needed
-    summary_sentences = nlargest(
-        select_length, sentence_scores, key=sentence_scores.get
-    )
-
-    # Convert the selected sentences to a list of strings, handling each line as a separate sentence
-    summary = []
-    for sent in summary_sentences:
-        # Split each sentence by '\n' to handle line breaks as separate sentences
-        summary.extend([line.strip() for line in sent.text.split("\n") if line.strip()])
-
-    # Save the summary to a text file
-    summary_path = os.path.join(FilePath, "summary.txt")
-    with open(summary_path, "w") as f:
-        for sentence in summary:
-            f.write(sentence + "\n")
+    summary = analysis.summary
 
     # Print the summary sentences in a structured format
     print("Summary Sentences:")
     for sentence in summary:
         print(f"- {sentence}")
 
-    entityRelationExtraction.analyze(summary, file_name, contentID)
-
-    return summary
-
-
-def KeyWord(text_pdf):
-    nlp = spacy.load("en_core_web_lg")
-    pos_tag = ["PROPN", "ADJ", "NOUN"]  # 1
-    doc = nlp(text_pdf.lower())  # 2
-    result = []
-    for token in doc:
-        # 3
-        if token.text in nlp.Defaults.stop_words or token.text in punctuation:
-            continue
-        # 4
-        if token.pos_ in pos_tag:
-            result.append(token.text)
-    with open(FilePath + "/" + "keywords_from_document.txt", "w") as f:
-        print(result, file=f)
-    # Open keywords_from_document.txt as binary
-    with open(FilePath + "/" + "keywords_from_document.txt", "rb") as f:
-        return f
-
-
-# iterate over PDF pages
-def IteratePDF(pdf_file_path, content_ID):
-    pdf_file = fitz.open(pdf_file_path)
-    image_len = 0
-    for page_index, page in enumerate(pdf_file):
-        image_list = page.get_images()
-
-        # printing number of images found in this page
-        if image_list:
-            print(f"[+] Found a total of {len(image_list)} images in page {page_index}")
-            image_len += 1
-        else:
-            print("[!] No images found on page", page_index)
+    graph = entityRelationExtraction.analyze(summary, file_name, contentID, analysis.entities)
 
-        for image_index, img in enumerate(page.get_images(), start=1):
-            # get the XREF of the image
-            xref = img[0]
+    return "".join(sentence + "\n" for sentence in summary).encode(), graph
 
-            # extract the image bytes
-            base_image = pdf_file.extract_image(xref)
 
-            image_bytes = base_image["image"]
+def KeyWord(analysis):
+    return f"{analysis.keywords}\n".encode()
 
-            # get the image extension
-            image_ext = base_image["ext"]
 
-            # load it to PIL
-            image = Image.open(io.BytesIO(image_bytes))
-
-            # Define the path to the images folder
-            image_path = os.path.join(os.path.dirname(__file__), "images")
-
-            # Create the folder if it does not exist
-            os.makedirs(image_path, exist_ok=True)
+def downscale_image(base_image):
+    """
+    Return the encoded bytes and extension of an image extracted by fitz.
+    The bytes pass through untouched, unless IMAGE_MAX_SIDE is set and the
+    image is larger: then it is decoded once and shrunk to fit, keeping its
+    aspect ratio, so messages and inference stay small.
+    """
+    image_bytes, image_ext = base_image["image"], base_image["ext"]
+    if not IMAGE_MAX_SIDE or max(base_image["width"], base_image["height"]) <= IMAGE_MAX_SIDE:
+        return image_bytes, image_ext
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        image_format = "JPEG" if image_ext in ("jpg", "jpeg") and image.mode in ("RGB", "L") else "PNG"
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format)
+    except Exception as e:
+        # Formats PIL cannot read (JBIG2, some JPX) are sent as they are
+        print(f"Could not downscale {image_ext} image, sending it unchanged: {e}")
+        return image_bytes, image_ext
+    return buffer.getvalue(), image_format.lower().replace("jpeg", "jpg")
 
-            # save it to local disk
-            image.save(
-                open(
-                    f"{image_path}/image{page_index+1}_{image_index}.{image_ext}", "wb"
-                )
-            )
-    # return amount of images
-    return image_len
 
+# iterate over PDF pages
+def IteratePDF(pdf_bytes):
+    """
+    Return the unique images of the PDF in order of first appearance, as
+    dicts with the file name, encoded bytes and the pages the image is on:
+        {"file_name": "image3_1.png", "payload": bytes, "pages": [3, 4, 9]}
+    An image repeated on many pages, the same xref or identical bytes under
+    another xref, is extracted once and only gains a page.
+    """
+    images = []
+    by_xref = {}
+    by_hash = {}
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_file:
+        for page_index, page in enumerate(pdf_file):
+            image_list = page.get_images()
+
+            # printing number of images found in this page
+            if image_list:
+                print(f"[+] Found a total of {len(image_list)} images in page {page_index}")
+            else:
+                print("[!] No images found on page", page_index)
+
+            for image_index, img in enumerate(image_list, start=1):
+                # get the XREF of the image
+                xref = img[0]
+
+                first = by_xref.get(xref)
+                if first is None:
+                    # extract the image bytes
+                    base_image = pdf_file.extract_image(xref)
+
+                    image_bytes = base_image["image"]
+                    image_hash = content_hash(image_bytes)
+                    first = by_hash.get(image_hash)
+
+                if first is None:
+                    # the encoded bytes as stored in the PDF and their extension
+                    image_bytes, image_ext = downscale_image(base_image)
+
+                    first = {
+                        "file_name": f"image{page_index+1}_{image_index}.{image_ext}",
+                        "payload": image_bytes,
+                        "pages": [],
+                    }
+                    images.append(first)
+                    by_hash[image_hash] = first
+                by_xref[xref] = first
 
-def remove_files():
-    try:
-        # Try to remove Meta.txt if it exists
-        if os.path.exists(FilePath + "/" + "Meta.txt"):
-            os.remove(FilePath + "/" + "Meta.txt")
-
-        # Try to remove summary.txt if it exists
-        if os.path.exists(FilePath + "/" + "summary.txt"):
-            os.remove(FilePath + "/" + "summary.txt")
-
-        # Try to remove keywords_from_document.txt if it exists
-        if os.path.exists(FilePath + "/" + "keywords_from_document.txt"):
-            os.remove(FilePath + "/" + "keywords_from_document.txt")
-
-        # Check if images directory exists before trying to remove files
-        images_path = os.path.join(FilePath, "images")
-        if os.path.exists(images_path):
-            # Remove all files in the images directory
-            for file in os.listdir(images_path):
-                file_path = os.path.join(images_path, file)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-            # Optionally remove the empty images directory
-            try:
-                os.rmdir(images_path)
-            except Exception as e:
-                print(f"Could not remove images directory: {e}")
+                if page_index + 1 not in first["pages"]:
+                    first["pages"].append(page_index + 1)
 
-    except Exception as e:
-        print(f"Error during file cleanup: {e}")
+    occurrences = sum(len(image["pages"]) for image in images)
+    print(f"[+] {len(images)} unique images on {occurrences} page occurrences")
+    return images
 
 
 # Function to publish messages to RabbitMQ
@@ -228,6 +200,8 @@ def publish_to_rabbitmq(routing_key, message):
     # Create a channel for communication with RabbitMQ
     channel = connection.channel()
 
+    # Payloads travel through the blob store, only the PayloadRef is published
+    message = offload_payload(message)
     status_message = message.copy()
     # if 'Payload' in message:
     #     del message['Payload']
@@ -243,13 +217,13 @@ def publish_to_rabbitmq(routing_key, message):
             "Message has been Processed and sent to the Image Queue"
         )
 
-        del status_message["Payload"]
+        status_message.pop("PayloadRef", None)
     else:
         status_message["Status"] = "Processed Successfully in Document Module"
         status_message["Message"] = (
             "Message has been Processed and sent to the Store Queue"
         )
-        del status_message["Payload"]
+        status_message.pop("PayloadRef", None)
         del status_message["Meta"]
         del status_message["Summary"]
         del status_message["Keywords"]
@@ -271,9 +245,7 @@ def publish_to_rabbitmq(routing_key, message):
         print("ContentID is missing from the status_message.")
 
     status_message = encode(status_message)
-    peek = message.copy()
-    del peek["Payload"]
-    print("Publishing message without Payload:", peek)
+    print("Publishing message:", message)
 
     # Serialize the message to BSON
     message = encode(message)
@@ -294,44 +266,196 @@ def publish_to_rabbitmq(routing_key, message):
     return contentIDtoSend
 
 
-def consumer_connection(routing_key):
+def consumer_connection(routing_key, prefetch_count=None):
     # Establish a connection to RabbitMQ server
     connection_parameters = pika.ConnectionParameters("localhost")
     connection = pika.BlockingConnection(connection_parameters)
 
     # Create a channel
     channel = connection.channel()
+    # Hold at most this many unacknowledged documents, the rest stay in the
+    # queue for the other workers
+    channel.basic_qos(prefetch_count=prefetch_count or DOCUMENT_PREFETCH)
 
     # Declare a queue (queue names are generated based on the routing key)
     queue_name = routing_key
 
-    # Consume messages from the queue
-    a = channel.basic_consume(
-        queue=queue_name, auto_ack=True, on_message_callback=on_message_received
-    )
+    # Documents are processed off the connection thread so heartbeats keep
+    # flowing while a long PDF is analyzed, one at a time per worker
+    executor = ThreadPoolExecutor(max_workers=1)
 
-    print("Preprocess Starting Consuming")
+    def on_delivery(ch, method, properties, body):
+        executor.submit(handle_delivery, connection, ch, method, properties, body)
+
+    # Consume messages from the queue, acknowledged only once processed
+    channel.basic_consume(queue=queue_name, auto_ack=False, on_message_callback=on_delivery)
+
+    print(f"Preprocess Starting Consuming (pid {os.getpid()}, prefetch {prefetch_count or DOCUMENT_PREFETCH})")
 
     try:
         channel.start_consuming()
     except KeyboardInterrupt:
-        channel.close()
-        connection.close()
+        channel.stop_consuming()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if connection.is_open:
+            connection.close()
+
+
+def handle_delivery(connection, channel, method, properties, body):
+    try:
+        processed = on_message_received(channel, method, properties, body)
+    except Exception as e:
+        print(f"Could not report the failure of delivery {method.delivery_tag}: {e}")
+        processed = False
+
+    # Ack after success. A failed document is requeued while it has delivery
+    # attempts left, then dead lettered to the DeadLetter queue. A worker that
+    # dies before this line leaves the document unacked and RabbitMQ hands it
+    # to another worker.
+    if processed:
+        settle = functools.partial(channel.basic_ack, delivery_tag=method.delivery_tag)
+    else:
+        settle = functools.partial(
+            channel.basic_nack, delivery_tag=method.delivery_tag, requeue=should_requeue(method, properties)
+        )
+    try:
+        connection.add_callback_threadsafe(settle)
+    except Exception as e:
+        # Connection gone: the broker requeues the delivery itself
+        print(f"Could not settle delivery {method.delivery_tag}: {e}")
+
+
+def run_worker(routing_key, page_workers=None):
+    global dedup_index
+    if dedup_index and multiprocessing.parent_process() is not None:
+        # A SQLite connection must not be shared with the parent across fork
+        dedup_index = DedupIndex(dedup_index.path)
+    # Fork the page extraction workers while the process is still small
+    start_pool(page_workers)
+    # Load the NLP pipelines once before taking the first message
+    models.warmup()
+    print("Model status:", models.status())
+    consumer_connection(routing_key)
+
+
+def run_worker_pool(routing_key, workers):
+    """
+    Run the consumer in 'workers' processes, each with its own connection,
+    channel and models, and restart any that exits. The cores are split
+    between the document workers and their page extraction pools.
+    """
+    page_workers = max(1, (os.cpu_count() or 1) // workers)
+    context = multiprocessing.get_context("fork")
+
+    def start(index):
+        process = context.Process(
+            target=run_worker, args=(routing_key, page_workers), name=f"DocumentWorker-{index}"
+        )
+        process.start()
+        return process
+
+    if dedup_index:
+        # Each worker opens its own connection
+        dedup_index.close()
+    processes = [start(index) for index in range(workers)]
+    try:
+        while True:
+            for index, process in enumerate(processes):
+                process.join(timeout=1 / workers)
+                if not process.is_alive():
+                    print(f"{process.name} exited with code {process.exitcode}, restarting")
+                    processes[index] = start(index)
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+def publish_image(body, file_name, payload_ref, payload_size, pages=None):
+    image = {
+        "time": datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p"),
+        # "job_id": body['ID'],
+        "content_id": body["content_id"],
+        "content_type": "Image",
+        "file_name": file_name,
+        "status": "Processed",
+        "message": f"Image file '{file_name}' successfully sent to Image queue",
+        "_id": ObjectId(),
+        "PayloadRef": payload_ref,
+        "PayloadSize": payload_size,
+        # Pages this image appears on, repeats are not sent again
+        "Pages": pages or [],
+    }
+    image["PictureID"] = new_id()
+    image["media_id"] = image["PictureID"]
+    image["job_id"] = new_id()
+    # send the image to the next module
+    publish_to_rabbitmq(".Image.", image)
+
+
+def process_document(body, payload_hash):
+    # Everything stays in memory, concurrent documents never share a file name
+    pdf_bytes = resolve_payload(body)
+
+    body["Meta"], body["Summary"], body["Keywords"], graph = openFile(
+        pdf_bytes, body["file_name"], body["content_id"]
+    )
 
+    images = []
+    for extracted in IteratePDF(pdf_bytes):
+        image_payload = extracted["payload"]
+        image = {
+            "file_name": extracted["file_name"],
+            "PayloadRef": blob_store.put(image_payload),
+            "PayloadSize": len(image_payload),
+            "pages": extracted["pages"],
+        }
+        images.append(image)
+        # Classified and written to the graph under an earlier document
+        if IMAGE_DEDUP_GLOBAL and dedup_index and dedup_index.get_image_class(image["PayloadRef"]):
+            print(f"Image '{image['file_name']}' already classified, not sent again")
+            image["known"] = True
+            continue
+        publish_image(body, image["file_name"], image["PayloadRef"], image["PayloadSize"], image["pages"])
+    if not images:
+        print("No images found in the document")
+
+    if dedup_index:
+        dedup_index.put_document(
+            payload_hash,
+            body["content_id"],
+            body["file_name"],
+            body["Meta"],
+            body["Summary"],
+            body["Keywords"],
+            graph,
+            images,
+        )
 
-def compute_unique_id(data_object):
-    # Convert the object to a string
-    data_str = str(encode(data_object))
 
-    # Append the current date and time
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+def serve_from_cache(body, cached):
+    # A byte-identical document was processed before: reuse its results instead of rerunning the pipeline
+    print(f"Document '{body['file_name']}' already processed as {cached['content_id']}, serving from cache")
+    body["Meta"] = cached["Meta"]
+    body["Summary"] = cached["Summary"]
+    body["Keywords"] = cached["Keywords"]
 
-    combined_data = data_str + current_time + str(random.random())
+    if cached["graph"]:
+        entityRelationExtraction.replay(cached["graph"], body["file_name"], body["content_id"])
 
-    # Generate SHA-256 hash
-    unique_id = hashlib.sha256(combined_data.encode()).hexdigest()
+    # Extracted images are already in the blob store, their classes in the index
+    for image in cached["images"]:
+        if not image.get("known"):
+            publish_image(body, image["file_name"], image["PayloadRef"], image["PayloadSize"], image.get("pages"))
 
-    return unique_id
+    statusFeed.messageBuilder(
+        body["file_name"],
+        body["content_id"],
+        "Served from cache",
+        f"Identical to content {cached['content_id']} processed on {cached['time']}",
+    )
 
 
 def on_message_received(ch, method, properties, body):
@@ -347,54 +471,13 @@ def on_message_received(ch, method, properties, body):
         pprint(message_structure, indent=2)
         print("-------------------------\n")
 
-        # save the payload to a file
-        with open(FilePath + "/" + body["file_name"], "wb") as f:
-            f.write(body["Payload"])
-
-        # open the file and convert it to text
-        Meta_file, Text_Summerizer, Keyword = openFile(
-            FilePath + "/" + body["file_name"], body["file_name"], body["content_id"]
-        )
-
-        Image_file = IteratePDF(FilePath + "/" + body["file_name"], body["content_id"])
-
-        if Image_file > 0:
-            for file in os.listdir(FilePath + "/images"):
-                _, ext = os.path.splitext(file)
-                ext = ext.lstrip(".")  # Remove the leading dot from the extension
-                with open(FilePath + "/images/" + file, "rb") as f:
-                    image_payload = f.read()
-                    image = {
-                        "time": datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p"),
-                        # "job_id": body['ID'],
-                        "content_id": body["content_id"],
-                        "content_type": "Image",
-                        "file_name": file,
-                        "status": "Processed",
-                        "message": f"Image file '{file}' successfully sent to Image queue",
-                        "_id": ObjectId(),
-                        "Payload": image_payload,
-                    }
-                    image["PictureID"] = compute_unique_id(image)
-                    image["media_id"] = image["PictureID"]
-                    image["job_id"] = compute_unique_id(image)
-                    # send the image to the next module
-                    publish_to_rabbitmq(".Image.", image)
+        payload_hash = body.get("PayloadRef") or content_hash(resolve_payload(body))
+        cached = dedup_index.get_document(payload_hash) if dedup_index else None
+        if cached:
+            serve_from_cache(body, cached)
         else:
-            print("No images found in the document")
-
-        with open("Meta.txt", "rb") as f:
-            file = f.read()
-            body["Meta"] = file
-            f.close()
-        with open("summary.txt", "rb") as f:
-            file = f.read()
-            body["Summary"] = file
-            f.close()
-        with open("keywords_from_document.txt", "rb") as f:
-            file = f.read()
-            body["Keywords"] = file
-            f.close()
+            process_document(body, payload_hash)
+
         """
         This will be sent to the store module
             {
@@ -402,43 +485,41 @@ def on_message_received(ch, method, properties, body):
                 "DocumentId": "ObjectID",
                 "DocumentType": "String",
                 "file_name": "String",
-                "Payload": "Binary"
+                "PayloadRef": "sha256:<hex digest>",
                 "Meta": "Binary",
                 "Summary": "Binary",
                 "Keywords": "Binary"
             }
         """
 
-        # send the document to the next module
-        contentID = publish_to_rabbitmq(".Store.", body)
-        processorStore = MessageProcessor()
-        processorStore.consume_store(contentID)
-
-        processorImage = ImageClassifier()
-        processorImage.consume_image(contentID)
-
-        # Example usage: consume from the Store queue
-
-        # processorImage = ImageProcessor(contentID)
-        # processorImage.consume_image()
-
-        # CALL IMAGE MODULE WITH CONTENT ID
-        # processor.image_store(contentID)
-        # remove the files
-        remove_files()
-        # remove the file
-        os.remove(FilePath + "/" + body["file_name"])
+        # send the document to the next module; the long-lived Store and
+        # Image consumers (recNparse.py, image_module.py or image_moduleMac.py)
+        # take it from there
+        publish_to_rabbitmq(".Store.", body)
+        return True
     except Exception as e:
         print(e)
         # send the error message to the dashboard
-        status_message = body.copy()
-        del status_message["Payload"]
-        status_message["Status"] = "Processing Failed"
-        status_message["Message"] = e
-        status_message = encode(status_message)
-        publish_to_rabbitmq(".Status.", status_message)
+        publish_status(".Status.", failure_status(body, e, should_requeue(method, properties)))
+        return False
+
+
+def failure_status(body, error, retrying):
+    """Dashboard status of a document that could not be processed."""
+    # The body is still the raw bytes when it could not be decoded
+    status_message = (
+        {key: value for key, value in body.items() if key not in PROCESSED_FIELDS}
+        if isinstance(body, dict)
+        else {}
+    )
+    status_message["Status"] = "Processing Failed"
+    status_message["Message"] = str(error) + (", retrying" if retrying else "")
+    return status_message
 
 
 if __name__ == "__main__":
     # Start consuming messages from the queue
-    consumer_connection("Document")
+    if DOCUMENT_WORKERS > 1:
+        run_worker_pool("Document", DOCUMENT_WORKERS)
+    else:
+        run_worker("Document")
@@ -0,0 +1,140 @@
+import os
+import time
+from string import punctuation
+import numpy as np
+from spacy.attrs import LOWER, SENT_START
+from spacy.lang.en.stop_words import STOP_WORDS
+from model_registry import models
+
+# Components of en_core_web_lg the analysis never reads: the summary and
+# keywords only need sentences and POS tags, entities come from the custom model
+UNUSED_COMPONENTS = ("ner", "lemmatizer")
+KEYWORD_POS = ("PROPN", "ADJ", "NOUN")
+# Share of the sentences kept in the summary, optionally capped at a count
+SUMMARY_RATIO = float(os.environ.get("SUMMARY_RATIO", 0.6))
+SUMMARY_MAX_SENTENCES = int(os.environ.get("SUMMARY_MAX_SENTENCES", 0))
+# Split sentences with the rule-based sentencizer instead of the dependency
+# parser: the summary then needs no model and the parser is skipped entirely
+LIGHTWEIGHT_SUMMARY = os.environ.get("LIGHTWEIGHT_SUMMARY", "0") == "1"
+
+
+class DocumentAnalysis:
+    """
+    Summary, keywords and entity candidates of one document, derived from a
+    single parse of its text, plus the CPU time the analysis took.
+    """
+
+    def __init__(self, summary, keywords, entities, cpu_seconds, cpu_saved_seconds):
+        self.summary = summary  # list of sentences
+        self.keywords = keywords  # list of lowercased tokens
+        self.entities = entities  # per summary sentence, a list of (text, label)
+        self.cpu_seconds = cpu_seconds
+        # Lower bound: the duplicate parse of the whole text that no longer runs
+        self.cpu_saved_seconds = cpu_saved_seconds
+
+
+def _counted_terms(doc, term_ids):
+    """Mask over the distinct term IDs: True for words, False for stop words and punctuation."""
+    strings = doc.vocab.strings
+    return np.fromiter(
+        (
+            strings[int(term_id)] not in STOP_WORDS and strings[int(term_id)] not in punctuation
+            for term_id in term_ids
+        ),
+        dtype=bool,
+        count=len(term_ids),
+    )
+
+
+def summarize(doc, ratio=None, max_sentences=None):
+    """
+    Extractive summary: the highest scoring sentences of the doc, in
+    descending score order. A sentence scores the sum of the normalized
+    frequencies of its words, stop words and punctuation excluded.
+
+    Scoring runs on NumPy arrays of lowercase token IDs: one term-frequency
+    vector over the distinct IDs, gathered per token and summed per
+    sentence, so no Python code runs per token.
+    """
+    ratio = SUMMARY_RATIO if ratio is None else ratio
+    max_sentences = SUMMARY_MAX_SENTENCES if max_sentences is None else max_sentences
+    if len(doc) == 0:
+        return []
+
+    # Word frequencies over the distinct lowercase forms
+    tokens = doc.to_array([LOWER, SENT_START])
+    term_ids, term_of_token = np.unique(tokens[:, 0], return_inverse=True)
+    counted = _counted_terms(doc, term_ids)
+    frequencies = np.bincount(term_of_token, weights=counted, minlength=len(term_ids))
+    # Normalize word frequencies
+    frequencies /= frequencies.max() or 1
+
+    # Score sentences: sum of their token weights, one slice per sentence
+    starts = np.flatnonzero(tokens[:, 1].astype(np.int64) == 1)
+    if len(starts) == 0 or starts[0] != 0:
+        starts = np.concatenate(([0], starts))
+    scores = np.add.reduceat(frequencies[term_of_token], starts)
+    # Sentences without any counted word are never selected
+    has_words = np.add.reduceat(counted[term_of_token].astype(np.int64), starts) > 0
+
+    # Select top sentences for summary, earlier sentences first on equal scores
+    select_length = int(len(starts) * ratio)
+    if max_sentences:
+        select_length = min(select_length, max_sentences)
+    ranked = np.flatnonzero(has_words)
+    ranked = ranked[np.argsort(-scores[ranked], kind="stable")][:select_length]
+
+    ends = np.append(starts[1:], len(doc))
+    # Handle line breaks inside a sentence as separate sentences
+    summary = []
+    for index in ranked:
+        sent = doc[starts[index]:ends[index]]
+        summary.extend([line.strip() for line in sent.text.split("\n") if line.strip()])
+    return summary
+
+
+def extract_keywords(doc):
+    # Read from the shared parse of the cased text. The tags differ from
+    # those of the lowercased copy parsed before, capitalized names are
+    # more often PROPN, so the POS filter keeps a somewhat different set of
+    # tokens; they are lowercased to keep the output format.
+    return [
+        token.lower_
+        for token in doc
+        if token.lower_ not in STOP_WORDS
+        and token.text not in punctuation
+        and token.pos_ in KEYWORD_POS
+    ]
+
+
+def analyze_document(text, extract_entities=None):
+    """
+    Parse the text once with en_core_web_lg and derive the summary and the
+    keywords from that parse, then run extract_entities (the custom NER
+    model, see analyzer.extract_sentence_entities) over the summary
+    sentences only. Without it no entities are extracted.
+
+    With LIGHTWEIGHT_SUMMARY the parser is not run: sentences for the
+    summary come from a tokenizer-only pipeline with a sentencizer.
+    """
+    nlp = models.get("en_core_web_lg")
+    text = " ".join(text.split("\n"))
+
+    unused = UNUSED_COMPONENTS + ("parser",) if LIGHTWEIGHT_SUMMARY else UNUSED_COMPONENTS
+
+    started = time.process_time()
+    doc = nlp(text, disable=[name for name in unused if name in nlp.pipe_names])
+    parse_seconds = time.process_time() - started
+
+    # The keywords only need the POS tags, the summary only sentence boundaries
+    summary = summarize(models.get("sentencizer")(text) if LIGHTWEIGHT_SUMMARY else doc)
+    keywords = extract_keywords(doc)
+    entities = extract_entities(summary) if extract_entities is not None else None
+    cpu_seconds = time.process_time() - started
+
+    analysis = DocumentAnalysis(summary, keywords, entities, cpu_seconds, parse_seconds)
+    print(
+        f"Analyzed {len(doc)} tokens in {cpu_seconds:.2f}s CPU, "
+        f"saved at least {analysis.cpu_saved_seconds:.2f}s CPU by parsing once"
+    )
+    return analysis
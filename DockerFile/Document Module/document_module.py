@@ -13,8 +13,15 @@ import json
 import datetime
 import random
 import hashlib
+import sys
 from copy import deepcopy  # Import deepcopy if you need a deep copy
 
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../Metadata_Module"))
+)
+
+from blob_store import resolve_payload
+
 FilePath = os.path.dirname(__file__)
 
 def openFile(the_file):
@@ -157,11 +164,12 @@ def publish_to_rabbitmq(routing_key, message):
     if 'PictureID' in status_message:
         status_message['status'] = 'Processed Successfully in Document Module'
         status_message['Message'] = 'Message has been Processed and sent to the Image Queue'
-        del status_message['Payload']
+        status_message.pop('Payload', None)
     else:
         status_message['Status'] = 'Processed Successfully in Document Module'
         status_message['Message'] = 'Message has been Processed and sent to the Store Queue'
-        del status_message['Payload']
+        status_message.pop('Payload', None)
+        status_message.pop('PayloadRef', None)
         del status_message['Meta']
         del status_message['Summary']
         del status_message['Keywords']
@@ -247,13 +255,13 @@ def on_message_received(ch, method, properties, body):
                 "DocumentId": "ObjectID",
                 "DocumentType": "String",
                 "FileName": "String",
-                "Payload": "Binary"
+                "PayloadRef": "sha256:<hex digest>"
             }
         '''
 
-        #save the payload to a file
+        #save the payload to a file, inline or from the blob store
         with open(FilePath + "/" + body['FileName'], 'wb') as f:
-            f.write(body['Payload'])
+            f.write(resolve_payload(body))
 
         #open the file and convert it to text
         Meta_file, Text_Summerizer, Keyword = openFile(FilePath + "/" + body['FileName'])
@@ -317,7 +325,8 @@ def on_message_received(ch, method, properties, body):
         print(e)
         #send the error message to the dashboard
         status_message= body.copy()
-        del status_message['Payload']
+        status_message.pop('Payload', None)
+        status_message.pop('PayloadRef', None)
         status_message['Status'] = 'Processing Failed'
         status_message['Message'] = e
         status_message=bson.dumps(status_message)
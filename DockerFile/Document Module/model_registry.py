@@ -0,0 +1,95 @@
+import time
+import logging
+import threading
+import spacy
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of NLP pipelines.
+
+    Each model is loaded once, the first time it is needed or during warmup
+    at worker startup, and then shared by every message the worker handles.
+    Loading the large spaCy pipeline takes seconds and close to a gigabyte,
+    so it must never happen per message.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._status = {}
+        self._load_locks = {}  # one per model, so status() never waits for a load
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks[name] = threading.Lock()
+            self._status[name] = {"state": "registered", "load_seconds": None, "error": None}
+            self._ready.clear()
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._load_locks[name]:
+            # Another thread may have loaded it while we waited for the lock
+            if name not in self._models:
+                self._load(name)
+            return self._models[name]
+
+    def _load(self, name):
+        status = self._status[name]
+        status["state"] = "loading"
+        status["error"] = None
+        started = time.perf_counter()
+        try:
+            self._models[name] = self._loaders[name]()
+        except Exception as e:
+            status["state"] = "failed"
+            status["error"] = str(e)
+            raise
+        status["state"] = "loaded"
+        status["load_seconds"] = time.perf_counter() - started
+        logging.info(f"Loaded model '{name}' in {status['load_seconds']:.1f}s")
+        if all(s["state"] == "loaded" for s in self._status.values()):
+            self._ready.set()
+
+    def warmup(self, background=False):
+        """Load every registered model, in a background thread if asked so the worker can start."""
+        if background:
+            thread = threading.Thread(target=self.warmup, name="ModelWarmup", daemon=True)
+            thread.start()
+            return thread
+        for name in list(self._loaders):
+            try:
+                self.get(name)
+            except Exception as e:
+                logging.error(f"Could not load model '{name}': {e}")
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def status(self):
+        """Readiness of every model: state, load time in seconds and the load error if any."""
+        with self._lock:
+            return {"ready": self.is_ready(), "models": {name: dict(s) for name, s in self._status.items()}}
+
+
+# Shared by the whole Document Module process
+models = ModelRegistry()
+models.register("en_core_web_lg", lambda: spacy.load("en_core_web_lg"))
+
+
+def _sentencizer():
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    return nlp
+
+
+# Tokenizer and rule-based sentence splitter, no model weights
+models.register("sentencizer", _sentencizer)
@@ -0,0 +1,106 @@
+import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+import pdfplumber
+
+# Worker processes shared by every document, 1 extracts in the calling process
+PAGE_WORKERS = int(os.environ.get("PAGE_WORKERS", os.cpu_count() or 1))
+# Documents shorter than this many pages per worker are extracted serially,
+# copying the PDF to the workers would cost more than it saves
+MIN_PAGES_PER_WORKER = int(os.environ.get("MIN_PAGES_PER_WORKER", 16))
+
+_pool = None
+# Processes in _pool, which sizes the page ranges
+_pool_workers = 1
+
+
+def start_pool(workers=None):
+    """
+    Start the page worker processes. Call it at worker startup, before the
+    pipelines are warmed up and connections opened: the workers are forked,
+    all at once on the first task, and must not inherit those threads or the
+    loaded models. Spawned workers would re-import the consumer script and
+    its models instead.
+    """
+    global _pool, _pool_workers
+    workers = PAGE_WORKERS if workers is None else workers
+    if _pool is None and workers > 1:
+        _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+        _pool_workers = workers
+        _pool.submit(int).result()
+    return _pool
+
+
+def _plumber_page_text(pdf_bytes, page_number, plumber):
+    if plumber[0] is None:
+        plumber[0] = pdfplumber.open(io.BytesIO(pdf_bytes))
+    return plumber[0].pages[page_number].extract_text() or ""
+
+
+def extract_page_range(pdf_bytes, start, stop):
+    """
+    Text of pages [start, stop) in order. PyMuPDF extracts each page; pages
+    it fails on or returns no text for go through pdfplumber, which copes
+    better with unusual layouts and encodings.
+    """
+    texts = []
+    plumber = [None]  # opened on the first fallback only
+    try:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+            for page_number in range(start, stop):
+                try:
+                    text = document[page_number].get_text()
+                except Exception as e:
+                    print(f"PyMuPDF failed on page {page_number + 1}, using pdfplumber: {e}")
+                    text = ""
+                if not text.strip():
+                    text = _plumber_page_text(pdf_bytes, page_number, plumber)
+                texts.append(text)
+    finally:
+        if plumber[0] is not None:
+            plumber[0].close()
+    return texts
+
+
+def page_ranges(page_count, workers):
+    """Split the pages into one contiguous range per worker, so the PDF is copied to each worker once."""
+    size = -(-page_count // workers)
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def iter_page_text(pdf_bytes, workers=None):
+    """
+    Yield the text of every page of the PDF, in page order.
+
+    Long documents are split into one page range per process of the worker
+    pool (or per 'workers' if given), extracted in parallel. Ranges are
+    yielded as soon as they and every range before them are done, so a
+    caller that consumes pages one by one can start on the first while the
+    last ones are still being extracted.
+    """
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+        page_count = document.page_count
+
+    pool = start_pool()
+    # A document worker started the pool with its share of the cores
+    workers = _pool_workers if workers is None else workers
+    if pool is None or workers < 2 or page_count < workers * MIN_PAGES_PER_WORKER:
+        yield from extract_page_range(pdf_bytes, 0, page_count)
+        return
+
+    futures = [
+        pool.submit(extract_page_range, pdf_bytes, start, stop)
+        for start, stop in page_ranges(page_count, workers)
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def extract_text(pdf_bytes, workers=None):
+    return "".join(iter_page_text(pdf_bytes, workers))
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import glob
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../Metadata_Module"))
+from model_registry import models
+from document_analysis import analyze_document, summarize
+from analyzer import nlp as ner_nlp, extract_sentence_entities
+from bench_model_registry import TEST_PDFS, extract_text
+
+# CPU time per document of the old analysis (full pipeline for the summary,
+# again on a lowercased copy for the keywords, then the NER model once per
+# summary sentence) against the single-pass analyze_document.
+
+
+def two_pass(text):
+    nlp = models.get("en_core_web_lg")
+    doc = nlp(" ".join(text.split("\n")))
+    summary = summarize(doc)
+    keywords_doc = nlp(text.lower())
+    [token.text for token in keywords_doc if token.pos_ in ("PROPN", "ADJ", "NOUN")]
+    [ner_nlp(sentence).ents for sentence in summary]
+
+
+def cpu_time(function, text):
+    started = time.process_time()
+    function(text)
+    return time.process_time() - started
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(TEST_PDFS, "*.pdf")))
+    models.warmup()
+
+    total_before = total_after = 0
+    for path in paths:
+        text = extract_text(path)
+        before = cpu_time(two_pass, text)
+        after = cpu_time(lambda t: analyze_document(t, extract_sentence_entities), text)
+        total_before += before
+        total_after += after
+        print(f"{os.path.basename(path):<32} two passes {before:6.2f}s  single pass {after:6.2f}s  saved {before - after:6.2f}s CPU")
+    print(f"{'Total':<32} two passes {total_before:6.2f}s  single pass {total_after:6.2f}s  saved {total_before - total_after:6.2f}s CPU")
@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import glob
+import spacy
+import pdfplumber
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from model_registry import ModelRegistry
+
+# Per-document latency of the summary and keyword NLP passes, with the
+# pipeline loaded per call (the old behaviour) and from the warm registry.
+# Uses the sample PDFs in Main_Server/TEST PDFS unless PDFs are passed in.
+
+MODEL = "en_core_web_lg"
+TEST_PDFS = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../Main_Server/TEST PDFS")
+
+
+def extract_text(path):
+    with pdfplumber.open(path) as pdf:
+        return "".join(page.extract_text() or "" for page in pdf.pages)
+
+
+def analyze(get_nlp, text):
+    # Text_Summerizer and KeyWord each get the pipeline and parse the text
+    get_nlp()(text)
+    get_nlp()(text.lower())
+
+
+def time_documents(get_nlp, texts):
+    latencies = []
+    for text in texts:
+        started = time.perf_counter()
+        analyze(get_nlp, text)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(TEST_PDFS, "*.pdf")))
+    texts = [extract_text(path) for path in paths]
+
+    cold = time_documents(lambda: spacy.load(MODEL), texts)
+
+    registry = ModelRegistry()
+    registry.register(MODEL, lambda: spacy.load(MODEL))
+    started = time.perf_counter()
+    registry.warmup()
+    warmup = time.perf_counter() - started
+    warm = time_documents(lambda: registry.get(MODEL), texts)
+
+    print(f"Warmup at worker startup: {warmup:.2f}s, ready: {registry.is_ready()}")
+    for path, before, after in zip(paths, cold, warm):
+        print(f"{os.path.basename(path):<32} cold {before:7.2f}s  warm {after:7.2f}s  ({before / after:5.1f}x)")
+    print(f"{'Mean':<32} cold {sum(cold) / len(cold):7.2f}s  warm {sum(warm) / len(warm):7.2f}s")
@@ -0,0 +1,44 @@
+import io
+import os
+import sys
+import time
+import glob
+import pdfplumber
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from page_extractor import extract_text, start_pool
+from bench_model_registry import TEST_PDFS
+
+# Text extraction latency per document: the old serial pdfplumber loop
+# against the page-parallel extractor with a growing number of workers.
+# Pass a long PDF (a few hundred pages) to see the parallel speedup, the
+# sample PDFs are short enough to stay on the serial path.
+
+
+def serial_pdfplumber(pdf_bytes):
+    text_pdf = ""
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages:
+            text_pdf += page.extract_text()
+    return text_pdf
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(TEST_PDFS, "*.pdf")))
+    start_pool()
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+
+    for path in paths:
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        baseline = timed(serial_pdfplumber, pdf_bytes)
+        results = "  ".join(
+            f"{workers}w {timed(extract_text, pdf_bytes, workers):6.2f}s" for workers in worker_counts
+        )
+        print(f"{os.path.basename(path):<32} pdfplumber {baseline:6.2f}s  {results}")
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import glob
+from heapq import nlargest
+from string import punctuation
+from spacy.lang.en.stop_words import STOP_WORDS
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from model_registry import models
+from document_analysis import summarize, UNUSED_COMPONENTS, SUMMARY_RATIO
+from bench_model_registry import TEST_PDFS, extract_text
+
+# Wall time of the summary over long documents: the previous dict and loop
+# scoring against the vectorized summarize, on the full parse and on the
+# tokenizer-only sentencizer pipeline, and how much of the previous summary
+# each one keeps. Pass long PDFs, or a repeat count to lengthen the samples.
+
+
+def loop_summarize(doc):
+    # The summarizer as it was before scoring was vectorized
+    word_frequencies = {}
+    for word in doc:
+        if word.lower_ not in STOP_WORDS and word.text not in punctuation:
+            word_frequencies[word.lower_] = word_frequencies.get(word.lower_, 0) + 1
+    max_frequency = max(word_frequencies.values(), default=1)
+    for word in word_frequencies:
+        word_frequencies[word] /= max_frequency
+    sentences = list(doc.sents)
+    sentence_scores = {}
+    for sent in sentences:
+        for word in sent:
+            if word.lower_ in word_frequencies:
+                sentence_scores[sent] = sentence_scores.get(sent, 0) + word_frequencies[word.lower_]
+    select_length = int(len(sentences) * SUMMARY_RATIO)
+    summary_sentences = nlargest(select_length, sentence_scores, key=sentence_scores.get)
+    summary = []
+    for sent in summary_sentences:
+        summary.extend([line.strip() for line in sent.text.split("\n") if line.strip()])
+    return summary
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+def overlap(reference, summary):
+    return len(set(reference) & set(summary)) / max(len(set(reference)), 1)
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 10
+    paths = [arg for arg in sys.argv[1:] if not arg.isdigit()] or sorted(glob.glob(os.path.join(TEST_PDFS, "*.pdf")))
+    models.warmup()
+    nlp = models.get("en_core_web_lg")
+    sentencizer = models.get("sentencizer")
+
+    for path in paths:
+        text = " ".join([" ".join(extract_text(path).split("\n"))] * repeat)
+        doc = nlp(text, disable=[name for name in UNUSED_COMPONENTS if name in nlp.pipe_names])
+        loop_seconds, reference = timed(loop_summarize, doc)
+        numpy_seconds, summary = timed(summarize, doc)
+        # Tokenizer-only: the pass itself is timed, it replaces the parser
+        light_seconds, light_summary = timed(lambda t: summarize(sentencizer(t)), text)
+        print(
+            f"{os.path.basename(path):<32} {len(doc):>8} tokens  "
+            f"loop {loop_seconds:6.3f}s  numpy {numpy_seconds:6.3f}s ({loop_seconds / numpy_seconds:5.1f}x, "
+            f"overlap {overlap(reference, summary):.0%})  "
+            f"sentencizer {light_seconds:6.3f}s (overlap {overlap(reference, light_summary):.0%})"
+        )
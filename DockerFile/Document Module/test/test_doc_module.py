@@ -0,0 +1,223 @@
+import unittest
+import unittest.mock
+import os
+import sys
+import tempfile
+import io
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import pika
+from bson import encode, ObjectId
+from PIL import Image
+import doc_module
+from dedup_index import DedupIndex
+
+class FakeChannel:
+    # Records how deliveries are settled
+    def __init__(self):
+        self.settled = []
+
+    def basic_ack(self, delivery_tag):
+        self.settled.append(("ack", delivery_tag, None))
+
+    def basic_nack(self, delivery_tag, requeue):
+        self.settled.append(("nack", delivery_tag, requeue))
+
+class FakeConnection:
+    # Runs the settle callback right away instead of on the connection thread
+    def add_callback_threadsafe(self, callback):
+        callback()
+
+def document_message(content_id="content-1", file_name="a.pdf"):
+    return {
+        "ID": "job-1",
+        "content_id": content_id,
+        "_id": ObjectId(),
+        "file_name": file_name,
+        "PayloadRef": "sha256:" + "0" * 64,
+        "PayloadSize": 10,
+    }
+
+class FakePage:
+    # A page listing the xrefs of the images drawn on it, as page.get_images() does
+    def __init__(self, *xrefs):
+        self.xrefs = xrefs
+
+    def get_images(self):
+        return [(xref, 0, 100, 50, 8, "DeviceRGB", "", f"Im{xref}", "DCTDecode") for xref in self.xrefs]
+
+class FakePDF:
+    # Stands in for the fitz document: pages and the encoded images behind the xrefs
+    def __init__(self, pages, images):
+        self.pages = pages
+        self.images = images
+        self.extracted = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def extract_image(self, xref):
+        self.extracted.append(xref)
+        return {"image": self.images[xref], "ext": "png", "width": 100, "height": 50}
+
+def encoded_image(width, height, image_format="PNG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def delivery(redelivered=False):
+    return pika.spec.Basic.Deliver(delivery_tag=7, redelivered=redelivered), pika.BasicProperties()
+
+class TestDocumentFailures(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            unittest.mock.patch("doc_module.dedup_index", None),
+            unittest.mock.patch("doc_module.process_document", side_effect=RuntimeError("blob store unavailable")),
+            # autospec: a call that does not match the publisher signature fails
+            unittest.mock.patch("doc_module.publish_status", autospec=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.publish_status = doc_module.publish_status
+
+    '''
+        purpose: To verify that a document failing to process is reported to the dashboard.
+        process: Delivers a document whose processing raises, for the first time.
+        validation: Ensures that the handler returns False and publishes, on the .Status. routing key, a BSON encodable "Processing Failed" status with the error text, the retry and without the payload reference.
+    '''
+    def test_failure_status_published(self):
+        method, properties = delivery()
+        processed = doc_module.on_message_received(None, method, properties, encode(document_message()))
+        self.assertFalse(processed)
+        self.publish_status.assert_called_once()
+        routing_key, status = self.publish_status.call_args.args
+        self.assertEqual(routing_key, ".Status.")
+        encode(status)
+        self.assertEqual(status["Status"], "Processing Failed")
+        self.assertEqual(status["Message"], "blob store unavailable, retrying")
+        self.assertEqual(status["content_id"], "content-1")
+        self.assertNotIn("PayloadRef", status)
+
+    '''
+        purpose: To verify that a message that cannot be decoded is still reported.
+        process: Delivers bytes that are not BSON, as a redelivery.
+        validation: Ensures that the handler returns False and publishes an encodable failure status that does not announce a retry.
+    '''
+    def test_undecodable_message_reported(self):
+        method, properties = delivery(redelivered=True)
+        processed = doc_module.on_message_received(None, method, properties, b"not bson")
+        self.assertFalse(processed)
+        routing_key, status = self.publish_status.call_args.args
+        self.assertEqual(routing_key, ".Status.")
+        encode(status)
+        self.assertEqual(status["Status"], "Processing Failed")
+        self.assertFalse(status["Message"].endswith("retrying"))
+
+    '''
+        purpose: To verify that failed documents are retried once and then dead lettered.
+        process: Hands a failing document to handle_delivery as a first delivery, then as a redelivery.
+        validation: Ensures that the first delivery is nacked with requeue and the redelivery without, so the broker moves it to the DeadLetter queue.
+    '''
+    def test_failed_document_requeued_then_dead_lettered(self):
+        channel = FakeChannel()
+        for redelivered in (False, True):
+            method, properties = delivery(redelivered)
+            doc_module.handle_delivery(FakeConnection(), channel, method, properties, encode(document_message()))
+        self.assertEqual(channel.settled, [("nack", 7, True), ("nack", 7, False)])
+
+class TestDocumentDedup(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.index = DedupIndex(os.path.join(folder.name, "dedup_index.sqlite3"))
+        self.addCleanup(self.index.close)
+        patches = [
+            unittest.mock.patch("doc_module.dedup_index", self.index),
+            unittest.mock.patch("doc_module.process_document", autospec=True, side_effect=self.first_run),
+            unittest.mock.patch("doc_module.publish_to_rabbitmq", autospec=True),
+            unittest.mock.patch("doc_module.entityRelationExtraction"),
+            unittest.mock.patch("doc_module.statusFeed"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.graph = ["content-1", ["a.pdf", "learnerObject", "Document"], ["GE414", "digitalTwin", "Engine"]]
+        self.images = [
+            {"file_name": "a.pdf_page1_img1.png", "PayloadRef": "sha256:" + "1" * 64, "PayloadSize": 5, "pages": [1, 3]},
+            {"file_name": "a.pdf_page2_img1.png", "PayloadRef": "sha256:" + "2" * 64, "PayloadSize": 7, "pages": [2], "known": True},
+        ]
+
+    def first_run(self, body, payload_hash):
+        # What process_document leaves behind once the pipeline succeeded
+        body["Meta"], body["Summary"], body["Keywords"] = b"meta", b"summary", b"keywords"
+        self.index.put_document(payload_hash, body["content_id"], body["file_name"], b"meta", b"summary", b"keywords", self.graph, self.images)
+
+    '''
+        purpose: To verify that a byte-identical document is served from the dedup index instead of being processed again.
+        process: Delivers a document, then a second upload with the same content hash under another content ID and file name.
+        validation: Ensures that the pipeline runs only for the first delivery, and that the second replays the stored graph under the new upload, publishes the images not known yet with their pages and sends the stored results to the Store queue.
+    '''
+    def test_second_delivery_replayed_from_cache(self):
+        method, properties = delivery()
+        self.assertTrue(doc_module.on_message_received(None, method, properties, encode(document_message())))
+        doc_module.publish_to_rabbitmq.reset_mock()
+
+        second = document_message(content_id="content-2", file_name="b.pdf")
+        self.assertTrue(doc_module.on_message_received(None, method, properties, encode(second)))
+        doc_module.process_document.assert_called_once()
+        doc_module.entityRelationExtraction.replay.assert_called_once_with(self.graph, "b.pdf", "content-2")
+
+        (image_key, image), (store_key, store) = [c.args for c in doc_module.publish_to_rabbitmq.call_args_list]
+        self.assertEqual(image_key, ".Image.")
+        self.assertEqual(image["content_id"], "content-2")
+        self.assertEqual(image["PayloadRef"], self.images[0]["PayloadRef"])
+        self.assertEqual(image["Pages"], [1, 3])
+        self.assertEqual(store_key, ".Store.")
+        self.assertEqual(store["content_id"], "content-2")
+        self.assertEqual((store["Meta"], store["Summary"], store["Keywords"]), (b"meta", b"summary", b"keywords"))
+        self.assertEqual(doc_module.statusFeed.messageBuilder.call_args.args[2], "Served from cache")
+
+class TestImageExtraction(unittest.TestCase):
+    '''
+        purpose: To verify that repeated images are extracted and published once with all their pages.
+        process: Iterates a fake PDF where one xref is drawn on three pages and twice on one of them, another xref has the same bytes, and a second image is on two pages.
+        validation: Ensures that every xref is extracted at most once and that two images come out in order of first appearance, each with the pages it is on, listed once.
+    '''
+    def test_repeated_images_extracted_once(self):
+        logo, photo = b"logo bytes", b"photo bytes"
+        pdf = FakePDF(
+            pages=[FakePage(10, 11), FakePage(10), FakePage(12, 11), FakePage(10, 10)],
+            images={10: logo, 11: photo, 12: logo},
+        )
+        with unittest.mock.patch.object(doc_module.fitz, "open", return_value=pdf), \
+            unittest.mock.patch("doc_module.IMAGE_MAX_SIDE", 0):
+            images = doc_module.IteratePDF(b"%PDF")
+        self.assertEqual(pdf.extracted, [10, 11, 12])
+        self.assertEqual(images, [
+            {"file_name": "image1_1.png", "payload": logo, "pages": [1, 2, 3, 4]},
+            {"file_name": "image1_2.png", "payload": photo, "pages": [1, 3]},
+        ])
+
+    '''
+        purpose: To verify that large images are downscaled to IMAGE_MAX_SIDE without distortion.
+        process: Downscales a wide PNG, a tall JPEG and an image already within the limit, with IMAGE_MAX_SIDE set to 100.
+        validation: Ensures that the longest side becomes 100 with the aspect ratio kept, that JPEG stays JPEG, and that a small image passes through byte for byte.
+    '''
+    def test_downscale_keeps_aspect_ratio(self):
+        with unittest.mock.patch("doc_module.IMAGE_MAX_SIDE", 100):
+            wide, wide_ext = doc_module.downscale_image({"image": encoded_image(400, 100), "ext": "png", "width": 400, "height": 100})
+            tall, tall_ext = doc_module.downscale_image({"image": encoded_image(150, 300, "JPEG"), "ext": "jpeg", "width": 150, "height": 300})
+            small = encoded_image(80, 40)
+            unchanged = doc_module.downscale_image({"image": small, "ext": "png", "width": 80, "height": 40})
+        self.assertEqual((Image.open(io.BytesIO(wide)).size, wide_ext), ((100, 25), "png"))
+        self.assertEqual((Image.open(io.BytesIO(tall)).size, tall_ext), ((50, 100), "jpg"))
+        self.assertEqual(unchanged, (small, "png"))
+
+if __name__ == '__main__':
+    unittest.main()
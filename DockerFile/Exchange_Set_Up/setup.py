@@ -14,18 +14,26 @@ routing_keys = [
     "#.Image.#",
     "#.Audio.#",
     "#.Video.#",
+    "#.Enrichment.#",
 ]
 channel.exchange_declare(exchange='Topic', exchange_type=ExchangeType.topic, durable=True)
 
+# Messages a consumer gave up on are parked in the DeadLetter queue, same
+# names as Metadata_Module/dead_letter.py (this container only has setup.py)
+channel.exchange_declare(exchange='DeadLetter', exchange_type=ExchangeType.fanout, durable=True)
+channel.queue_declare(queue='DeadLetter', durable=True)
+channel.queue_bind(exchange='DeadLetter', queue='DeadLetter')
+dead_letter = {"x-dead-letter-exchange": "DeadLetter"}
+
 channel.queue_declare(queue='Dashboard', durable=True)
 
 # Declare queues
 for key in routing_keys:
     if key not in ["#.Audio.#", "#.Video.#"]:
-        channel.queue_declare(queue=key[2:-2], durable=True)
+        channel.queue_declare(queue=key[2:-2], durable=True, arguments=dead_letter)
     else:
         # make it a lazy queue
-        channel.queue_declare(queue=key[2:-2], durable=True, arguments={"x-queue-mode": "lazy"})
+        channel.queue_declare(queue=key[2:-2], durable=True, arguments={"x-queue-mode": "lazy", **dead_letter})
     #bind queues to exchange
     channel.queue_bind(exchange='Topic', queue=key[2:-2], routing_key=key)
 
@@ -1,14 +1,34 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from typing import List
-import hashlib
-import datetime
-import random
-from bson import encode
 import socket
 import asyncio
+import sys
+import os
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../Metadata_Module"))
+)
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../Parser_Module"))
+)
+from parser_client import AsyncParserClient, ack_ok
+from id_service import new_id
+
+# One persistent connection to the parser shared by every upload request
+parser_client = AsyncParserClient("localhost", 12349)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # The connection is opened by the first upload and closed on shutdown
+    try:
+        yield
+    finally:
+        await parser_client.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -20,23 +40,15 @@ app.add_middleware(
 )
 
 
-def compute_unique_id(data_object):
-    data_str = str(encode(data_object))
-    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-    combined_data = data_str + current_time + str(random.random())
-    return hashlib.sha256(combined_data.encode()).hexdigest()
-
-
 async def send_bson_obj(job):
     try:
-        reader, writer = await asyncio.open_connection("localhost", 12349)
-        writer.write(encode(job))
-        await writer.drain()
-        writer.close()
-        await writer.wait_closed()
-        return True
+        # Chunked mode so large media is not limited by the BSON document size
+        ack = await parser_client.send_job_chunked(job)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not ack_ok(ack):
+        raise HTTPException(status_code=502, detail=ack.get("Message"))
+    return True
 
 
 @app.post("/upload")
@@ -57,90 +69,94 @@ async def upload_files(
         "Audio": [],
         "Video": [],
     }
+    # (item, UploadFile) pairs. Starlette already spools uploads to disk and
+    # send_job_chunked reads them chunk by chunk while forwarding them to the
+    # parser, so no upload is ever held in memory as a whole.
+    uploads = []
 
     # Process document
     if document:
-        content = await document.read()
         job["Documents"].append(
             {
                 "ID": "ObjectID",
                 "content_id": "ObjectID",
                 "DocumentType": document.filename.split(".")[-1],
                 "file_name": document.filename,
-                "Payload": content,
             }
         )
+        uploads.append((job["Documents"][-1], document))
         job["NumberOfDocuments"] = 1
 
     # Process image
     if image:
-        content = await image.read()
         job["Images"].append(
             {
                 "ID": "ObjectID",
                 "content_id": "ObjectID",
                 "PictureType": image.filename.split(".")[-1],
                 "file_name": image.filename,
-                "Payload": content,
             }
         )
+        uploads.append((job["Images"][-1], image))
         job["NumberOfImages"] = 1
 
     # Process audio files
     if audio:
         for audio_file in audio:
-            content = await audio_file.read()
             job["Audio"].append(
                 {
                     "ID": "ObjectID",
                     "content_id": "ObjectID",
                     "AudioType": audio_file.filename.split(".")[-1],
                     "file_name": audio_file.filename,
-                    "Payload": content,
                 }
             )
+            uploads.append((job["Audio"][-1], audio_file))
         job["NumberOfAudio"] = len(job["Audio"])
 
     # Process video
     if video:
-        content = await video.read()
         job["Video"].append(
             {
                 "ID": "ObjectID",
                 "VideoID": "ObjectID",
                 "VideoType": video.filename.split(".")[-1],
                 "file_name": video.filename,
-                "Payload": content,
             }
         )
+        uploads.append((job["Video"][-1], video))
         job["NumberOfVideo"] = 1
 
     # Generate IDs
-    job["ID"] = compute_unique_id(job)
+    job["ID"] = new_id()
 
     if job["NumberOfDocuments"] > 0:
         for document in job["Documents"]:
             document["ID"] = job["ID"]
-            document["content_id"] = compute_unique_id(document)
-            document["DocumentId"] = compute_unique_id(document)
+            document["content_id"] = new_id()
+            document["DocumentId"] = new_id()
             
     if job["NumberOfImages"] > 0:
         for image in job["Images"]:
             image["ID"] = job["ID"]
-            image["content_id"] = compute_unique_id(image)
-            image['PictureID'] = compute_unique_id(image)
+            image["content_id"] = new_id()
+            image['PictureID'] = new_id()
     if job["NumberOfAudio"] > 0:
         for audio in job["Audio"]:
             audio["ID"] = job["ID"]
-            audio["content_id"] = compute_unique_id(audio)
-            audio["AudioID"] = compute_unique_id(audio)
+            audio["content_id"] = new_id()
+            audio["AudioID"] = new_id()
     if job["NumberOfVideo"] > 0:
         for video in job["Video"]:
             video["ID"] = job["ID"]
-            video["content_id"] = compute_unique_id(video)
-            video["VideoID"] = compute_unique_id(video)
+            video["content_id"] = new_id()
+            video["VideoID"] = new_id()
+
+    # The payloads are attached after the IDs are generated
+    for item, upload in uploads:
+        item["Payload"] = upload
 
-    # Send to existing socket service
+    # Stream the job to the parser
     await send_bson_obj(job)
 
     return {"message": "Files uploaded successfully", "job_id": job["ID"]}
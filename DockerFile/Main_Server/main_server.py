@@ -1,48 +1,43 @@
 import socket
 import bson
-import hashlib
-import datetime
 import json
-import random
+import sys
+import os
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../Metadata_Module"))
+)
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../Parser_Module"))
+)
+from parser_client import ParserClient, ack_ok
+from id_service import new_id
 
-def compute_unique_id(data_object):
-    # Convert the object to a string
-    data_str = str(bson.dumps(data_object))
-    
-    # Append the current date and time
-    current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
-    
-    combined_data = data_str + current_time + str(random.random())
-    
-    # Generate SHA-256 hash
-    unique_id = hashlib.sha256(combined_data.encode()).hexdigest()
-    
-    return unique_id
+# Reused for every job sent from this process
+parser_client = ParserClient('localhost', 12345)
 
-def send_bson_obj(job):   
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.connect(('localhost', 12345))  # Ensure this line is present and correctly written
-    s.sendall(bson.dumps(job))
-    s.close()
+def send_bson_obj(job):
+    # Returns True once the parser has acknowledged the job
+    ack = parser_client.send_job(job)
+    return ack_ok(ack)
 
 def id_generator(job):
-    job['ID'] = compute_unique_id(job)  # Assigning unique ID as a string
+    job['ID'] = new_id()  # Assigning unique ID as a string
     if 'NumberOfDocuments' in job and job['NumberOfDocuments'] > 0:
         for document in job['Documents']:
             document['ID'] = job['ID']
-            document['DocumentId'] = compute_unique_id(document)
+            document['DocumentId'] = new_id()
     if 'NumberOfImages' in job and job['NumberOfImages'] > 0:
         for image in job['Images']:
             image['ID'] = job['ID']
-            image['PictureID'] = compute_unique_id(image)
+            image['PictureID'] = new_id()
     if 'NumberOfAudio' in job and job['NumberOfAudio'] > 0:
         for audio in job['Audio']:
             audio['ID'] = job['ID']
-            audio['AudioID'] = compute_unique_id(audio)
+            audio['AudioID'] = new_id()
     if 'NumberOfVideo' in job and job['NumberOfVideo'] > 0:
         for video in job['Video']:
             video['ID'] = job['ID']
-            video['VideoID'] = compute_unique_id(video)
+            video['VideoID'] = new_id()
     return job
 
 
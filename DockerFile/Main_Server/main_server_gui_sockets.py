@@ -2,16 +2,18 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import socket
 from bson import BSON, encode, decode
-import hashlib
-import datetime
 import json
-import random
 from pathlib import Path
 import sys
 import os
 sys.path.append(
     os.path.abspath(os.path.join(os.path.dirname(__file__), "../Metadata_Module"))
 )
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../Parser_Module"))
+)
+from parser_client import ParserClient, ack_ok
+from id_service import new_id
 
 
 # from image_module import ImageClassifier
@@ -24,6 +26,10 @@ class FileUploaderGUI:
         self.root.title("File Uploader")
         self.root.geometry("600x800")
 
+        # Kept open between uploads and closed with the window
+        self.parser_client = ParserClient("localhost", 12349)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
         # Configure root grid
         self.root.grid_rowconfigure(0, weight=1)
         self.root.grid_columnconfigure(0, weight=1)
@@ -263,47 +269,45 @@ class FileUploaderGUI:
                     ]
                     self.job["NumberOfVideo"] = 1
 
-    def compute_unique_id(self, data_object):
-        data_str = str(encode(data_object))
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        combined_data = data_str + current_time + str(random.random())
-        return hashlib.sha256(combined_data.encode()).hexdigest()
-
     def id_generator(self, job):
-        job["ID"] = self.compute_unique_id(job)
+        job["ID"] = new_id()
         if job["NumberOfDocuments"] > 0:
             for document in job["Documents"]:
                 document["ID"] = job["ID"]
-                document["content_id"] = self.compute_unique_id(document)
-                document["DocumentId"] = self.compute_unique_id(document)
+                document["content_id"] = new_id()
+                document["DocumentId"] = new_id()
                 
         if job["NumberOfImages"] > 0:
             for image in job["Images"]:
                 image["ID"] = job["ID"]
-                image["content_id"] = self.compute_unique_id(image)
-                image['PictureID'] = self.compute_unique_id(image)
+                image["content_id"] = new_id()
+                image['PictureID'] = new_id()
         if job["NumberOfAudio"] > 0:
             for audio in job["Audio"]:
                 audio['ID'] = job['ID']
-                audio["content_id"] = self.compute_unique_id(audio)
-                audio["AudioID"] = self.compute_unique_id(audio)
+                audio["content_id"] = new_id()
+                audio["AudioID"] = new_id()
         if job["NumberOfVideo"] > 0:
             for video in job["Video"]:
                 video["ID"] = job["ID"]
-                video["content_id"] = self.compute_unique_id(video)
-                video["VideoID"] = self.compute_unique_id(video)
+                video["content_id"] = new_id()
+                video["VideoID"] = new_id()
         return job
 
     def send_bson_obj(self, job):
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect(("localhost", 12349))
-            s.sendall(encode(job))
-            s.close()
-            return True
+            # Chunked mode so large media is not limited by the BSON document size
+            ack = self.parser_client.send_job_chunked(job)
+            if ack_ok(ack):
+                return True
+            return ack.get("Message")
         except Exception as e:
             return str(e)
 
+    def on_close(self):
+        self.parser_client.close()
+        self.root.destroy()
+
     def upload_files(self):
         # Check if at least one file is selected
         if (
@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from urllib.parse import urlparse
+import httpx
+import psutil
+
+# Requires the running stack: the parser (python parse.py) and the uploader
+# (uvicorn file_uploader_backend:app). Sends concurrent large uploads and
+# samples the uploader's RSS, which should stay flat whatever the file size.
+
+MB = 1024 * 1024
+
+
+def find_server_pid(url):
+    port = urlparse(url).port or 80
+    for conn in psutil.net_connections(kind="tcp"):
+        if conn.status == psutil.CONN_LISTEN and conn.laddr.port == port and conn.pid:
+            return conn.pid
+    raise SystemExit(f"No process listening on port {port}, pass --pid")
+
+
+def make_file(size_mb):
+    f = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
+    block = os.urandom(MB)
+    for _ in range(size_mb):
+        f.write(block)
+    f.close()
+    return f.name
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid, interval=0.05):
+        super().__init__(daemon=True)
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = self.baseline = self.rss()
+        self.stopped = threading.Event()
+
+    def rss(self):
+        # Include the worker children uvicorn --reload starts
+        processes = [self.process] + self.process.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes if p.is_running())
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.rss())
+
+
+async def upload(client, url, path):
+    with open(path, "rb") as f:
+        response = await client.post(url, files={"video": (os.path.basename(path), f, "video/mp4")})
+    response.raise_for_status()
+    return response.json()["job_id"]
+
+
+async def run(url, path, concurrency):
+    async with httpx.AsyncClient(timeout=None) as client:
+        return await asyncio.gather(*[upload(client, url, path) for _ in range(concurrency)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000/upload")
+    parser.add_argument("--pid", type=int, help="uploader process, found from the URL port by default")
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    path = make_file(args.size_mb)
+    sampler = RssSampler(args.pid or find_server_pid(args.url))
+    sampler.start()
+    try:
+        started = time.perf_counter()
+        job_ids = asyncio.run(run(args.url, path, args.concurrency))
+        elapsed = time.perf_counter() - started
+    finally:
+        sampler.stopped.set()
+        sampler.join()
+        os.remove(path)
+
+    total_mb = args.size_mb * args.concurrency
+    growth = (sampler.peak - sampler.baseline) / MB
+    print(f"Uploaded {len(job_ids)} x {args.size_mb} MB in {elapsed:.1f}s ({total_mb / elapsed:.1f} MB/s)")
+    print(f"Uploader RSS: baseline {sampler.baseline / MB:.1f} MB, peak {sampler.peak / MB:.1f} MB")
+    print(f"Peak growth {growth:.1f} MB for {total_mb} MB uploaded ({growth / total_mb:.1%})")
+    sys.exit(0 if growth < total_mb / 4 else 1)
@@ -0,0 +1,87 @@
+import unittest
+import unittest.mock
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from fastapi.testclient import TestClient
+import file_uploader_backend
+from parser_client import iter_chunks_async
+from framing import ACK_RECEIVED, ACK_FAILED
+
+class FakeParserClient:
+    # Consumes every payload the way AsyncParserClient does and records what it read
+    def __init__(self, status=ACK_RECEIVED, chunk_size=1024):
+        self.status = status
+        self.chunk_size = chunk_size
+        self.jobs = []
+        self.payloads = {}
+        self.largest_chunk = 0
+
+    async def send_job_chunked(self, job):
+        self.jobs.append(job)
+        for data_type in ("Documents", "Images", "Audio", "Video"):
+            for item in job[data_type]:
+                data = b""
+                async for chunk in iter_chunks_async(item["Payload"], self.chunk_size):
+                    self.largest_chunk = max(self.largest_chunk, len(chunk))
+                    data += chunk
+                self.payloads[item["file_name"]] = data
+        return {"ID": job["ID"], "Status": self.status, "Message": "failed" if self.status == ACK_FAILED else ""}
+
+    async def close(self):
+        pass
+
+class TestFileUploaderBackend(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(file_uploader_backend.app)
+
+    '''
+        purpose: To verify that the upload endpoint streams files to the parser instead of reading them into memory.
+        process: Uploads a document, an image and two audio files through the endpoint with a fake parser client that reads every payload in small chunks.
+        validation: Ensures that the payloads are passed on as file objects, are read at most one chunk at a time and arrive complete, and that every item gets its IDs.
+    '''
+    def test_upload_streams_payloads(self):
+        document = os.urandom(50000)
+        audio = [os.urandom(3000), os.urandom(4000)]
+        fake_client = FakeParserClient()
+        with unittest.mock.patch('file_uploader_backend.parser_client', fake_client):
+            response = self.client.post('/upload', files=[
+                ('document', ('a.pdf', document, 'application/pdf')),
+                ('image', ('b.png', b'png-data', 'image/png')),
+                ('audio', ('c.mp3', audio[0], 'audio/mpeg')),
+                ('audio', ('d.mp3', audio[1], 'audio/mpeg')),
+            ])
+        self.assertEqual(response.status_code, 200)
+        job = fake_client.jobs[0]
+        self.assertEqual(response.json()['job_id'], job['ID'])
+        self.assertFalse(isinstance(job['Documents'][0]['Payload'], bytes))
+        self.assertEqual(fake_client.largest_chunk, fake_client.chunk_size)
+        self.assertEqual(fake_client.payloads, {'a.pdf': document, 'b.png': b'png-data', 'c.mp3': audio[0], 'd.mp3': audio[1]})
+        self.assertEqual(job['NumberOfAudio'], 2)
+        self.assertEqual(job['Documents'][0]['ID'], job['ID'])
+        self.assertNotEqual(job['Documents'][0]['DocumentId'], 'ObjectID')
+
+    '''
+        purpose: To verify that a job the parser could not publish is reported as an error.
+        process: Uploads a document with a fake parser client that answers with a failed ack.
+        validation: Ensures that the endpoint answers with 502 instead of reporting success.
+    '''
+    def test_upload_failed_ack(self):
+        with unittest.mock.patch('file_uploader_backend.parser_client', FakeParserClient(status=ACK_FAILED)):
+            response = self.client.post('/upload', files=[('document', ('a.pdf', b'data', 'application/pdf'))])
+        self.assertEqual(response.status_code, 502)
+
+    '''
+        purpose: To verify that the parser connection is closed when the app shuts down.
+        process: Starts and stops the app through its lifespan with a mocked parser client.
+        validation: Ensures that the client is closed exactly once, at shutdown.
+    '''
+    def test_shutdown_closes_parser_client(self):
+        with unittest.mock.patch('file_uploader_backend.parser_client') as mock_client:
+            mock_client.close = unittest.mock.AsyncMock()
+            with TestClient(file_uploader_backend.app):
+                mock_client.close.assert_not_called()
+            mock_client.close.assert_awaited_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,27 @@
 import unittest
 import unittest.mock
+import io
 import os
+import hashlib
 import sys
+from bson import ObjectId
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from main_server import compute_unique_id, send_bson_obj, id_generator
+from main_server import send_bson_obj, id_generator
+from id_service import new_id, content_hash
+from parser_client import ParserClient
+from framing import build_ack, ACK_RECEIVED
 
 class TestMainServerFunctions(unittest.TestCase):
+    # Patches the shared parser client with a fresh one whose socket answers every job with an ack
+    def patch_parser_client(self, mock_socket, job):
+        acks = io.BytesIO(build_ack(job["ID"], ACK_RECEIVED, "") * 10)
+        def recv_into(view):
+            chunk = acks.read(len(view))
+            view[:len(chunk)] = chunk
+            return len(chunk)
+        mock_socket.return_value.recv_into.side_effect = recv_into
+        return unittest.mock.patch('main_server.parser_client', ParserClient('localhost', 12345))
+
     # This test verifies that the send_bson_obj function correctly handles an empty payload.
     '''
         purpose: To verify that the send_bson_obj function correctly handles an empty payload.
@@ -14,9 +30,10 @@ class TestMainServerFunctions(unittest.TestCase):
     '''
     def test_send_bson_obj_empty_payload(self):
         job_empty_payload = {"ID": "ObjectID", "NumberOfDocuments": 1, "Documents": [{"ID": "ObjectID", "DocumentId": "ObjectID", "DocumentType": "String", "FileName": "String", "Payload": ""}]}
-        with unittest.mock.patch('socket.socket') as mock_socket_empty_payload:
+        with unittest.mock.patch('socket.socket') as mock_socket_empty_payload, \
+            self.patch_parser_client(mock_socket_empty_payload, job_empty_payload):
             instance_empty_payload = mock_socket_empty_payload.return_value
-            send_bson_obj(job_empty_payload)
+            self.assertTrue(send_bson_obj(job_empty_payload))
             instance_empty_payload.connect.assert_called_once_with(('localhost', 12345))
             instance_empty_payload.sendall.assert_called_once()
     
@@ -29,23 +46,38 @@ class TestMainServerFunctions(unittest.TestCase):
     def test_send_bson_obj_large_payload(self):
         large_payload = "X" * (1024 * 1024)  # 1 MB payload
         job_large_payload = {"ID": "ObjectID", "NumberOfDocuments": 1, "Documents": [{"ID": "ObjectID", "DocumentId": "ObjectID", "DocumentType": "String", "FileName": "String", "Payload": large_payload}]}
-        with unittest.mock.patch('socket.socket') as mock_socket_large_payload:
+        with unittest.mock.patch('socket.socket') as mock_socket_large_payload, \
+            self.patch_parser_client(mock_socket_large_payload, job_large_payload):
             instance_large_payload = mock_socket_large_payload.return_value
-            send_bson_obj(job_large_payload)
+            self.assertTrue(send_bson_obj(job_large_payload))
             instance_large_payload.connect.assert_called_once_with(('localhost', 12345))
             instance_large_payload.sendall.assert_called_once()
  
-    # This test verifies that the compute_unique_id function correctly computes a unique ID for a given data object.
-    '''
-        purpose: To verify that the compute_unique_id function correctly computes a unique ID for a given data object.
-        process: Creates two data objects and checks if the compute_unique_id function returns different IDs for them.
-        validation: Ensures that the compute_unique_id function correctly computes a unique ID for a given data object.
-    '''
-    def test_compute_unique_id(self):
-        data_object = {"key": "value"}
-        id1 = compute_unique_id(data_object)
-        id2 = compute_unique_id(data_object)
-        self.assertNotEqual(id1, id2)
+    # This test verifies that new_id mints unique, time-ordered IDs.
+    '''
+        purpose: To verify that the new_id function mints unique, time-ordered IDs.
+        process: Mints a batch of IDs and compares them.
+        validation: Ensures that every ID is different and that their timestamps never go backwards. The IDs themselves are not compared: within one second their order depends on the counter, which can wrap.
+    '''
+    def test_new_id(self):
+        ids = [new_id() for _ in range(1000)]
+        self.assertEqual(len(set(ids)), len(ids))
+        times = [ObjectId(i).generation_time for i in ids]
+        self.assertEqual(sorted(times), times)
+        self.assertEqual(len(ids[0]), 24)
+
+    # This test verifies that content_hash gives the same hash for bytes and for a file streamed in chunks.
+    '''
+        purpose: To verify that the content_hash function streams file objects and leaves them ready to be sent.
+        process: Hashes the same payload as bytes and as a file object read in small chunks.
+        validation: Ensures that both hashes match the SHA-256 of the payload and the file is rewound afterwards.
+    '''
+    def test_content_hash(self):
+        payload = os.urandom(10000)
+        f = io.BytesIO(payload)
+        self.assertEqual(content_hash(payload), "sha256:" + hashlib.sha256(payload).hexdigest())
+        self.assertEqual(content_hash(f, chunk_size=1024), content_hash(payload))
+        self.assertEqual(f.tell(), 0)
 
     # This test verifies that the id_generator function correctly generates an ID for a given job.
     '''
@@ -70,9 +102,10 @@ class TestMainServerFunctions(unittest.TestCase):
         for payload in payloads:
             with self.subTest(payload=payload):
                 job = {"ID": "ObjectID", "NumberOfDocuments": 1, "Documents": [{"ID": "ObjectID", "DocumentId": "ObjectID", "DocumentType": "String", "FileName": "String", "Payload": payload}]}
-                with unittest.mock.patch('socket.socket') as mock_socket:
+                with unittest.mock.patch('socket.socket') as mock_socket, \
+                    self.patch_parser_client(mock_socket, job):
                     instance = mock_socket.return_value
-                    send_bson_obj(job)
+                    self.assertTrue(send_bson_obj(job))
                     instance.connect.assert_called_once_with(('localhost', 12345))
                     instance.sendall.assert_called_once()
                     
@@ -143,6 +176,22 @@ class TestMainServerFunctions(unittest.TestCase):
         with self.assertRaises(TypeError):
             id_generator(job)
             
+    # This test verifies that the send_bson_obj function reuses one connection for several jobs.
+    '''
+        purpose: To verify that the send_bson_obj function reuses one persistent connection to the parser.
+        process: Mocks the socket.socket function, sends two jobs and checks how often connect, sendall and close are called.
+        validation: Ensures that the connection is opened once, both jobs are sent over it and it is not closed between jobs.
+    '''
+    def test_send_bson_obj_reuses_connection(self):
+        job = {"ID": "ObjectID", "NumberOfDocuments": 1, "Documents": [{"ID": "ObjectID", "DocumentId": "ObjectID", "DocumentType": "String", "FileName": "String", "Payload": ""}]}
+        with unittest.mock.patch('socket.socket') as mock_socket, \
+            self.patch_parser_client(mock_socket, job):
+            send_bson_obj(job)
+            send_bson_obj(job)
+            mock_socket.return_value.connect.assert_called_once_with(('localhost', 12345))
+            self.assertEqual(mock_socket.return_value.sendall.call_count, 2)
+            mock_socket.return_value.close.assert_not_called()
+
     # This test verifies that the id_generator function correctly generates unique IDs for all types of files in a given job.
     '''
         purpose: To verify that the id_generator function correctly generates unique IDs for all types of files in a given job.
@@ -1,7 +1,9 @@
 import traceback
 import spacy
 from spacy.tokens import Doc
-from dbOperationsLocal import nodeBuilder
+from dbOperationsLocal import nodeBuilder, updateMissionProfile
+from mission_profile_client import mission_profiles
+from enrichment import enqueue_enrichment, ENRICHMENT_ENABLED
 import copy
 import os
 
@@ -17,9 +19,38 @@ current_dir = os.path.dirname(__file__)
 model_path = os.path.join(current_dir, "custom_ner_modelREL")
 nlp = spacy.load(model_path) # change to your custom directory
 
+# Batched inference settings for the NER model, overridable from the environment
+NER_BATCH_SIZE = int(os.environ.get("NER_BATCH_SIZE", 64))
+# Processes nlp.pipe forks per call. Each of the DOCUMENT_WORKERS document
+# workers (doc_module.py) already has its own page extraction pool, so the
+# host runs up to DOCUMENT_WORKERS * (page workers + NER_N_PROCESS)
+# processes: keep DOCUMENT_WORKERS * NER_N_PROCESS within the cores, or
+# raise it only with a single document worker.
+NER_N_PROCESS = int(os.environ.get("NER_N_PROCESS", 1))
+
+
+def extract_sentence_entities(sentences, batch_size=None, n_process=None):
+    """
+    Run the NER model over the sentences with nlp.pipe and return the
+    (text, label) pairs of each sentence, in sentence order.
+    """
+    sentences = list(sentences)
+    batch_size = batch_size or NER_BATCH_SIZE
+    n_process = n_process or NER_N_PROCESS
+    # Starting worker processes costs more than tagging a handful of sentences
+    if len(sentences) < batch_size * 2:
+        n_process = 1
+    # Only the entity recognizer and the tok2vec it listens to are needed
+    disable = [name for name in nlp.pipe_names if name not in ("tok2vec", "ner")]
+    return [
+        [(ent.text, ent.label_) for ent in doc.ents]
+        for doc in nlp.pipe(sentences, batch_size=batch_size, n_process=n_process, disable=disable)
+    ]
+
 
 class entityRelationExtraction:
-    def analyze(sentences, file_name, contentID):
+    def analyze(sentences, file_name, contentID, entities=None):
+        # entities: (text, label) pairs per sentence when the caller already ran the NER model
         print(sentences)
         nodes = []
 
@@ -38,30 +69,27 @@ class entityRelationExtraction:
             ("digitalTwinElectricGenerator", "digitalTwinMarine"): "generator",
             # Add more relationships as needed
         }
-        entity_counts = {}
-        for sentence in sentences:
-            doc = nlp(sentence)
-
-            for ent in doc.ents:
-                print(f"Entity: {ent.text}, Label: {ent.label_}")
+        # Mention counts and first node of every entity, for the main topic
+        entity_index = EntityIndex()
+        if entities is None:
+            entities = extract_sentence_entities(sentences)
+        for sentence_entities in entities:
+            for ent_text, ent_label in sentence_entities:
+                print(f"Entity: {ent_text}, Label: {ent_label}")
 
                 # extracting the properties of the nodes  - the format is always digitalTwin(11 charcters) followed by whatever the digital twin may be. for example digitalTwinAircraft
-                nodeType = ent.label_[:11]  # digitalTwin
-                digitalTwinType = ent.label_[
+                nodeType = ent_label[:11]  # digitalTwin
+                digitalTwinType = ent_label[
                     11:
                 ]  # after the 11th character is Aircraft
                 
-                currentNode = [ent.text, nodeType, digitalTwinType]
+                currentNode = [ent_text, nodeType, digitalTwinType]
 
                 # Add current node to nodes list
                 nodes.append(currentNode)
 
-                # This ensures that we ignore leading/trailing spaces and treat the entity text in a case-insensitive manner.
-                normalized_entity = ent.text.strip().lower()
                 # counts the number each entity appears
-                entity_counts[normalized_entity] = (
-                    entity_counts.get(normalized_entity, 0) + 1
-                )
+                entity_index.add(currentNode)
 
                 # Check for relation after every two nodes
                 if len(nodes) >= 2:
@@ -77,12 +105,11 @@ class entityRelationExtraction:
                     if relationship:
                         # Add relationship node if found in the map
                         relation_node = [relationship]
-                        nodes.insert(len(nodes) - 1, relation_node)
-        main_topic = None
-        if entity_counts:
-            # Select the most frequent entity from the counts
-            main_topic = max(entity_counts, key=entity_counts.get)
-        print(entity_counts)
+                        # Before the current node, without shifting the whole list
+                        nodes[-1:] = [relation_node, current_node]
+        # Select the most frequent entity from the counts
+        main_topic = entity_index.main_topic()
+        print(entity_index.counts)
         print(f"Main Topic: {main_topic}")
         print("Total Nodes:")
         print(nodes)
@@ -91,15 +118,16 @@ class entityRelationExtraction:
         nodesUnique = remove_duplicate_nodes(nodes)
         print("Unique Nodes:")
        
-        main_topic_node_copy = find_main_topic_node(nodesUnique, main_topic)
+        main_topic_node_copy = entity_index.node(main_topic)
 
-        prompt = "".join(sentences)
-        if len(prompt) > 900:
-            prompt = prompt[:900]
         mainNodeName = main_topic_node_copy[0]
-        prompt = f"What is the {mainNodeName} and what does it do? Two sentences max."
 
-        missionProfile = missionProfileExtraction(prompt)
+        # A known profile goes into the graph now, a new one is generated
+        # by the enrichment worker so the LLM never holds up the graph write
+        if ENRICHMENT_ENABLED:
+            missionProfile = mission_profiles.cached(mainNodeName)
+        else:
+            missionProfile = missionProfileExtraction(mainNodeName)
         main_topic_node_copy.append(missionProfile)
         print("MAIN HERE")
         print(main_topic_node_copy)
@@ -112,58 +140,76 @@ class entityRelationExtraction:
 
         print(nodesUnique)
 
+        # Keep a copy for the dedup index, packageParser consumes the package
+        graph = copy.deepcopy(nodesUnique)
+
         # Parse the nodes with relationships
 
         nodeBuilder.packageParser(nodesUnique)
-
-
-def missionProfileExtraction(mainNode):
-    import requests
-
-    url = "http://127.0.0.1:5002/generate"
-
-    # input_text = input("Enter Prompt: ")
-
-    payload = {"input_text": mainNode}
-
-    response = requests.post(url, json=payload)
-
-    if response.status_code == 200:
-        # Parse the JSON response
-        data = response.json()
-        generated_text = data.get("generated_text", "No text generated.")
-
-        result = generated_text
-        nodesArray = result
-        print(nodesArray)
-        print(result)  # Optional: Print it to verify
-        return result
-    else:
-        print(f"Failed to connect to API: {response.status_code}")
-        return
-
-
-def find_main_topic_node(nodesUnique, main_topic):
-    # Iterate over nodes to find the one containing the main topic
-    for node in nodesUnique:
-        # Check if the main topic is present in the node (specifically the first element, which seems to be the entity)
-        if (
-            main_topic.lower() in node[0].lower()
-        ):  # .lower() to handle case insensitivity
-            # Make a copy of the node
-            main_topic_node_copy = copy.deepcopy(
-                node
-            )  # Using deepcopy to make sure it's a true copy
-            return main_topic_node_copy
-
-    # Return None if no node is found with the main topic
-    return None
+        if missionProfile is None and ENRICHMENT_ENABLED:
+            if not enqueue_enrichment(mainNodeName, file_name, contentID):
+                # Broker unreachable: generate it now rather than never
+                missionProfile = missionProfileExtraction(mainNodeName)
+                if missionProfile is not None:
+                    updateMissionProfile(mainNodeName, missionProfile)
+        return graph
+
+    def replay(graph, file_name, contentID):
+        # Write the graph of an identical document again for a new upload, without any NLP or LLM calls
+        package = copy.deepcopy(graph)
+        package[0] = contentID
+        package[1][0] = file_name
+        nodeBuilder.packageParser(package)
+
+
+def missionProfileExtraction(mainNodeName):
+    # Cached by entity name, repeat entities cost no LLM call
+    result = mission_profiles.get(mainNodeName)
+    print(result)  # Optional: Print it to verify
+    return result
+
+
+def normalize_entity_name(name):
+    # Ignore leading/trailing spaces and treat the entity text in a case-insensitive manner
+    return name.strip().lower()
+
+
+class EntityIndex:
+    """
+    Entity mentions of one document, indexed as they are added: the mention
+    count and the first node of every normalized entity name. Adding,
+    picking the main topic and looking up its node cost O(1) per mention.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.first_nodes = {}
+
+    def add(self, node):
+        name = normalize_entity_name(node[0])
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.first_nodes.setdefault(name, node)
+
+    def main_topic(self):
+        # The most mentioned entity, the first one seen on equal counts
+        if not self.counts:
+            return None
+        return max(self.counts, key=self.counts.get)
+
+    def node(self, name):
+        """Copy of the first node of the entity, None if it was never added."""
+        node = self.first_nodes.get(normalize_entity_name(name)) if name else None
+        return copy.deepcopy(node) if node is not None else None
 
 
 def remove_duplicate_nodes(nodes):
+    # Keep the first occurrence of every node in order, nodes are lists of strings
+    seen = set()
     unique_nodes = []
     for node in nodes:
-        if node not in unique_nodes:
+        key = tuple(node)
+        if key not in seen:
+            seen.add(key)
             unique_nodes.append(node)
     print("Unique Nodes")
     print(unique_nodes)
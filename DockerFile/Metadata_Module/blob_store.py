@@ -0,0 +1,157 @@
+"""
+Content-addressed blob store for message payloads (claim check).
+
+Binary payloads are written once into a directory keyed by their SHA-256
+and the RabbitMQ messages only carry a reference to them:
+    {
+        ...,
+        "PayloadRef": "sha256:<hex digest>",
+        "PayloadSize": 123456
+    }
+Consumers call resolve_payload(message) to read the bytes when they
+actually need them. Messages that still carry an inline "Payload" keep
+working, so old producers and consumers can be mixed during an upgrade.
+"""
+
+import os
+import shutil
+import tempfile
+from id_service import HASH_PREFIX, ContentHasher, content_hash
+
+# Shared by every module running on this machine, overridable from the environment
+BLOB_STORE_DIR = os.environ.get(
+    "BLOB_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "blob_store"),
+)
+# A PayloadRef is the content hash of the payload
+REF_PREFIX = HASH_PREFIX
+
+
+class BlobStore:
+    """
+    Filesystem blob store. Blobs live at <root>/<ab>/<cd>/<digest> and are
+    immutable: writing the same content twice stores it once, and a blob is
+    moved into place atomically so readers never see a partial file.
+    """
+
+    def __init__(self, root=BLOB_STORE_DIR):
+        self.root = root
+
+    def path(self, ref):
+        digest = ref[len(REF_PREFIX):] if ref.startswith(REF_PREFIX) else ref
+        if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Invalid blob reference {ref!r}")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, ref):
+        return os.path.exists(self.path(ref))
+
+    def _temp_file(self):
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=self.root, prefix=".incoming_", delete=False)
+
+    def _commit(self, temp_name, ref):
+        target = self.path(ref)
+        if os.path.exists(target):
+            os.remove(temp_name)  # already stored
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(temp_name, target)
+        return ref
+
+    def put(self, data):
+        """Store bytes and return their reference."""
+        ref = content_hash(data)
+        if self.exists(ref):
+            return ref
+        with self._temp_file() as f:
+            f.write(data)
+        return self._commit(f.name, ref)
+
+    def put_stream(self, chunks):
+        """Store an iterable of byte chunks without holding them all in memory."""
+        hasher = ContentHasher()
+        temp_name = None
+        try:
+            with self._temp_file() as f:
+                temp_name = f.name
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            # Nothing to clean up if the temp file could not be created
+            if temp_name and os.path.exists(temp_name):
+                os.remove(temp_name)
+            raise
+        return self._commit(temp_name, hasher.hexdigest())
+
+    def put_file(self, path, move=False, ref=None):
+        """
+        Store the content of a file. With move=True the file itself is renamed
+        into the store when it is on the same filesystem, so it is not copied.
+        Pass ref when the content hash was already computed while the file was
+        written, so the file is not read again.
+        """
+        if ref is None:
+            with open(path, "rb") as f:
+                ref = content_hash(f)
+        if self.exists(ref):
+            if move:
+                os.remove(path)
+            return ref
+
+        with self._temp_file() as f:
+            temp_name = f.name
+        try:
+            if move:
+                shutil.move(path, temp_name)
+            else:
+                shutil.copyfile(path, temp_name)
+        except BaseException:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+            raise
+        return self._commit(temp_name, ref)
+
+    def get(self, ref):
+        with open(self.path(ref), "rb") as f:
+            return f.read()
+
+    def open(self, ref):
+        return open(self.path(ref), "rb")
+
+
+# Default store used by the parser and the processing modules
+blob_store = BlobStore()
+
+
+def offload_payload(message, store=None):
+    """
+    Return a copy of the message with its inline Payload (or the spool file
+    of a chunked job, see PayloadSpool in the parser) replaced by a PayloadRef.
+    Messages without a binary payload are returned unchanged.
+    """
+    store = store or blob_store
+    if "PayloadSpool" in message:
+        message = dict(message)
+        spool = message.pop("PayloadSpool")
+        message["PayloadSize"] = os.path.getsize(spool)
+        # The parser hashes chunks while spooling them, see SpooledJob
+        message["PayloadRef"] = store.put_file(spool, move=True, ref=message.get("PayloadRef"))
+        return message
+
+    payload = message.get("Payload")
+    if not isinstance(payload, (bytes, bytearray, memoryview)):
+        return message
+    message = dict(message)
+    del message["Payload"]
+    message["PayloadRef"] = store.put(payload)
+    message["PayloadSize"] = len(payload)
+    return message
+
+
+def resolve_payload(message, store=None):
+    """Return the payload bytes of a message, reading them from the store if needed."""
+    if "Payload" in message:
+        return message["Payload"]
+    return (store or blob_store).get(message["PayloadRef"])
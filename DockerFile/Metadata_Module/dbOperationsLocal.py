@@ -202,6 +202,17 @@ def addLearnerRelation(node1array, relation, node2array):
             )
 
 
+def updateMissionProfile(nodeName, missionProfile):
+    # Enrichment result for a digital twin written without one, an existing profile is kept
+    with GraphDatabase.driver(URI, auth=AUTH) as driver:
+        with driver.session() as session:
+            query = """
+                MATCH (node:digitalTwin {name: $nameofNode})
+                SET node.missionProfile = coalesce(node.missionProfile, $missionProfile)
+            """
+            session.run(query, {"nameofNode": nodeName, "missionProfile": missionProfile})
+
+
 def addDigitalTwinRelation(node1array, relation, node2array):
     with GraphDatabase.driver(URI, auth=AUTH) as driver:
         primaryType1 = node1array[1]
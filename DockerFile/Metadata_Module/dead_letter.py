@@ -0,0 +1,44 @@
+"""
+Dead lettering for the work queues (Document, Store, Image, Enrichment).
+
+A consumer that fails on a message requeues it while it still has
+delivery attempts left, so a dependency that was briefly down (Neo4j, the
+LLM service, the blob store) does not cost the document. After that it
+nacks the message without requeue and RabbitMQ moves it to the DeadLetter
+exchange, where the DeadLetter queue parks it for inspection instead of
+dropping it or redelivering it forever.
+
+Every declaration of a work queue must pass queue_arguments(): RabbitMQ
+refuses to redeclare a queue with different arguments. Queues created
+before dead lettering was added have to be deleted once and declared again
+(Exchange_Set_Up/setup.py does it on a fresh broker).
+"""
+
+import os
+
+DEAD_LETTER_EXCHANGE = "DeadLetter"
+DEAD_LETTER_QUEUE = "DeadLetter"
+# Deliveries of a message before it is dead lettered. Classic queues only
+# flag redeliveries, so they allow at most 2; quorum queues count them in
+# the x-delivery-count header.
+DELIVERY_ATTEMPTS = int(os.environ.get("DELIVERY_ATTEMPTS", 2))
+
+
+def queue_arguments():
+    return {"x-dead-letter-exchange": DEAD_LETTER_EXCHANGE}
+
+
+def declare_dead_letter(channel):
+    """Declare the dead letter exchange and the queue that keeps what reaches it."""
+    channel.exchange_declare(exchange=DEAD_LETTER_EXCHANGE, exchange_type="fanout", durable=True)
+    channel.queue_declare(queue=DEAD_LETTER_QUEUE, durable=True)
+    channel.queue_bind(exchange=DEAD_LETTER_EXCHANGE, queue=DEAD_LETTER_QUEUE)
+
+
+def should_requeue(method, properties=None, attempts=DELIVERY_ATTEMPTS):
+    """True while a failed message has delivery attempts left, False to dead letter it."""
+    headers = getattr(properties, "headers", None) or {}
+    if "x-delivery-count" in headers:
+        # Quorum queue: earlier deliveries of this message
+        return headers["x-delivery-count"] + 1 < attempts
+    return attempts > 1 and not method.redelivered
@@ -0,0 +1,122 @@
+"""
+Deduplication index keyed by payload content hash.
+
+When a byte-identical document is uploaded again, the Document Module
+finds the results of its first run here and replays them instead of
+running the summary, NER, mission profile, image extraction and
+classification again. Keys are content hashes in the "sha256:<hex>" form
+of id_service.content_hash, which is also the blob store PayloadRef.
+
+The index is a SQLite file shared by the modules running on this machine.
+"""
+
+import os
+import json
+import sqlite3
+import datetime
+import threading
+
+DEDUP_INDEX_PATH = os.environ.get(
+    "DEDUP_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dedup_index.sqlite3"),
+)
+# Set DEDUP_ENABLED=0 to always reprocess uploads
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "1") != "0"
+
+
+class DedupIndex:
+    """
+    Results of processed documents and classified images by content hash.
+
+    A document record holds what the Store message and the graph need:
+        {
+            "content_id": "ID of the first upload",
+            "file_name": "String",
+            "Meta": bytes, "Summary": bytes, "Keywords": bytes,
+            "graph": [...],       # node package passed to nodeBuilder.packageParser
+            "images": [{"file_name": "String", "PayloadRef": "sha256:...", "PayloadSize": int,
+                        "pages": [int], "known": bool}],  # unique images, pages they appear on
+            "time": "String"
+        }
+    Records are only written once processing succeeded, so a failed run is
+    retried on the next upload.
+    """
+
+    def __init__(self, path=DEDUP_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS documents (
+                    content_hash TEXT PRIMARY KEY,
+                    content_id TEXT,
+                    file_name TEXT,
+                    meta BLOB,
+                    summary BLOB,
+                    keywords BLOB,
+                    graph TEXT,
+                    images TEXT,
+                    time TEXT
+                )"""
+            )
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS images (
+                    content_hash TEXT PRIMARY KEY,
+                    predicted_class TEXT
+                )"""
+            )
+
+    def get_document(self, content_hash):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_id, file_name, meta, summary, keywords, graph, images, time"
+                " FROM documents WHERE content_hash = ?",
+                (content_hash,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "content_id": row[0],
+            "file_name": row[1],
+            "Meta": row[2],
+            "Summary": row[3],
+            "Keywords": row[4],
+            "graph": json.loads(row[5]) if row[5] else None,
+            "images": json.loads(row[6]),
+            "time": row[7],
+        }
+
+    def put_document(self, content_hash, content_id, file_name, meta, summary, keywords, graph, images):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    content_hash,
+                    content_id,
+                    file_name,
+                    meta,
+                    summary,
+                    keywords,
+                    json.dumps(graph) if graph is not None else None,
+                    json.dumps(images),
+                    datetime.datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p"),
+                ),
+            )
+
+    def get_image_class(self, content_hash):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT predicted_class FROM images WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_image_class(self, content_hash, predicted_class):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO images VALUES (?, ?)", (content_hash, predicted_class)
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
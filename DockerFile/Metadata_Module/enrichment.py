@@ -0,0 +1,133 @@
+"""
+Mission profile enrichment, off the Document consumer's critical path.
+
+entityRelationExtraction.analyze writes the graph right away. When the
+mission profile of the main entity is not cached yet, it enqueues an
+enrichment job on the Enrichment queue instead of waiting for the LLM.
+This worker generates the profile and sets missionProfile on the
+digital-twin node when the answer arrives.
+
+The dashboard sees both phases as status events: "Mission profile
+enrichment queued" with the graph, then "Mission profile added" or
+"Mission profile enrichment failed". A generation that fails is tried
+again ENRICHMENT_RETRIES times, then the job is requeued once and finally
+parked in the DeadLetter queue. When the job cannot even be published,
+enqueue_enrichment returns False and the analyzer generates the profile
+inline instead.
+
+Run it as its own process: python enrichment.py
+"""
+
+import os
+import time
+import logging
+from datetime import datetime
+import pika
+from bson import decode
+from bson.errors import BSONError
+from publisher import publish_to_rabbitmq
+from statusFeed import statusFeed
+from mission_profile_client import mission_profiles
+from dead_letter import queue_arguments, should_requeue
+
+ENRICHMENT_QUEUE = "Enrichment"
+ENRICHMENT_ROUTING_KEY = ".Enrichment."
+# Set MISSION_PROFILE_ENRICHMENT=0 to generate mission profiles inline again
+ENRICHMENT_ENABLED = os.environ.get("MISSION_PROFILE_ENRICHMENT", "1") != "0"
+# Generation runs one prompt at a time on the LLM service
+ENRICHMENT_PREFETCH = int(os.environ.get("ENRICHMENT_PREFETCH", 1))
+# Further attempts at a generation that failed, ENRICHMENT_RETRY_DELAY
+# seconds apart and doubling, before the job is requeued or dead lettered
+ENRICHMENT_RETRIES = int(os.environ.get("ENRICHMENT_RETRIES", 2))
+ENRICHMENT_RETRY_DELAY = float(os.environ.get("ENRICHMENT_RETRY_DELAY", 5))
+
+
+def enqueue_enrichment(entity_name, file_name, content_id):
+    """Queue the generation of the mission profile, False if the job could not be published."""
+    job = {
+        "time": datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p"),
+        "content_id": content_id,
+        "file_name": file_name,
+        "entity": entity_name,
+    }
+    if not publish_to_rabbitmq(ENRICHMENT_ROUTING_KEY, job):
+        logging.error(f"Could not queue the mission profile enrichment of '{entity_name}'")
+        return False
+    statusFeed.messageBuilder(
+        file_name,
+        content_id,
+        "Mission profile enrichment queued",
+        f"Graph stored, mission profile of '{entity_name}' will be added when generated",
+    )
+    return True
+
+
+def generate_profile(entity, retries=ENRICHMENT_RETRIES, delay=ENRICHMENT_RETRY_DELAY):
+    # The LLM service may be restarting or busy: try again a few times
+    for attempt in range(retries + 1):
+        profile = mission_profiles.get(entity)
+        if profile is not None or attempt == retries:
+            return profile
+        logging.warning(f"Mission profile of '{entity}' not generated, retrying in {delay:.0f}s")
+        time.sleep(delay)
+        delay *= 2
+
+
+class EnrichmentWorker:
+    def __init__(self, host="localhost"):
+        self.connection = pika.BlockingConnection(
+            pika.ConnectionParameters(host, heartbeat=600, blocked_connection_timeout=300)
+        )
+        self.channel = self.connection.channel()
+        self.channel.exchange_declare(exchange="Topic", exchange_type="topic", durable=True)
+        self.channel.queue_declare(queue=ENRICHMENT_QUEUE, durable=True, arguments=queue_arguments())
+        self.channel.queue_bind(exchange="Topic", queue=ENRICHMENT_QUEUE, routing_key="#.Enrichment.#")
+
+    def process_job(self, ch, method, properties, body):
+        # Imported here: the worker only needs Neo4j once a job arrives
+        from dbOperationsLocal import updateMissionProfile
+
+        try:
+            job = decode(body)
+            entity = job["entity"]
+            profile = generate_profile(entity)
+            if profile is None:
+                requeue = should_requeue(method, properties)
+                if not requeue:
+                    statusFeed.messageBuilder(
+                        job["file_name"],
+                        job["content_id"],
+                        "Mission profile enrichment failed",
+                        f"No mission profile generated for '{entity}'",
+                    )
+                # Requeued once, then parked in the DeadLetter queue
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=requeue)
+                return
+
+            updateMissionProfile(entity, profile)
+            statusFeed.messageBuilder(job["file_name"], job["content_id"], "Mission profile added", profile)
+            logging.info(f"Mission profile of '{entity}' added, cache stats: {mission_profiles.stats()}")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+        except (KeyError, BSONError) as e:
+            logging.error(f"Invalid enrichment job: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        except Exception as e:
+            logging.error(f"Error processing enrichment job: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=should_requeue(method, properties))
+
+    def consume(self, prefetch_count=ENRICHMENT_PREFETCH):
+        self.channel.basic_qos(prefetch_count=prefetch_count)
+        self.channel.basic_consume(queue=ENRICHMENT_QUEUE, on_message_callback=self.process_job)
+        logging.info(f"Consuming the {ENRICHMENT_QUEUE} queue")
+        try:
+            self.channel.start_consuming()
+        except KeyboardInterrupt:
+            self.channel.stop_consuming()
+        finally:
+            if self.connection.is_open:
+                self.connection.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    EnrichmentWorker().consume()
@@ -0,0 +1,55 @@
+"""
+IDs for jobs, items and extracted media, shared by every module.
+
+new_id() mints a unique, time-ordered ID without looking at the data it
+names: a BSON ObjectId (4-byte timestamp, per-process random value and a
+counter) rendered as 24 hex characters. Minting one costs microseconds,
+whatever the size of the job.
+
+content_hash() is the separate, optional fingerprint of a payload used
+for deduplication. It streams bytes or a file in chunks, so a payload is
+hashed once without being copied, and has the same "sha256:<hex>" form
+as the blob store's PayloadRef.
+"""
+
+import hashlib
+from bson import ObjectId
+
+HASH_PREFIX = "sha256:"
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def new_id():
+    return str(ObjectId())
+
+
+class ContentHasher:
+    """Incremental content hash for payloads that arrive in chunks."""
+
+    def __init__(self):
+        self._sha = hashlib.sha256()
+        self.size = 0
+
+    def update(self, chunk):
+        self._sha.update(chunk)
+        self.size += len(chunk)
+
+    def hexdigest(self):
+        return HASH_PREFIX + self._sha.hexdigest()
+
+
+def content_hash(payload, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Hash bytes or a binary file object. A file is read from its current
+    position and rewound to it afterwards, so it can still be sent.
+    """
+    hasher = ContentHasher()
+    if hasattr(payload, "read"):
+        position = payload.tell() if hasattr(payload, "seek") else None
+        for chunk in iter(lambda: payload.read(chunk_size), b""):
+            hasher.update(chunk)
+        if position is not None:
+            payload.seek(position)
+    else:
+        hasher.update(payload)
+    return hasher.hexdigest()
@@ -8,6 +8,12 @@ from bson import decode, decode_all, BSON
 import logging
 from transformers import AutoModelForImageClassification, AutoImageProcessor
 from dbOperationsLocal import nodeBuilder
+from blob_store import resolve_payload
+from dead_letter import queue_arguments, should_requeue
+from dedup_index import DedupIndex, DEDUP_ENABLED
+
+# Unacknowledged images held by the long-lived consumer
+IMAGE_PREFETCH = int(os.environ.get("IMAGE_PREFETCH", 8))
 
 
 class ImageClassifier:
@@ -28,6 +34,9 @@ class ImageClassifier:
         # RabbitMQ setup
         self.setup_rabbitmq()
 
+        # Classes of images already seen, keyed by content hash
+        self.dedup_index = DedupIndex() if DEDUP_ENABLED else None
+
     def load_model(self):
         try:
             self.model = AutoModelForImageClassification.from_pretrained(
@@ -46,7 +55,7 @@ class ImageClassifier:
             )
             self.channel = self.connection.channel()
             for queue in self.queues.values():
-                self.channel.queue_declare(queue=queue, durable=True)
+                self.channel.queue_declare(queue=queue, durable=True, arguments=queue_arguments())
             logging.info("RabbitMQ connection established")
         except Exception as e:
             logging.error(f"Error setting up RabbitMQ: {e}")
@@ -78,48 +87,62 @@ class ImageClassifier:
         with open(path, "wb") as f:
             f.write(data)
 
-    def classify_images(self, ch, method, properties, body, content_id):
+    def classify_images(self, ch, method, properties, body, content_id=None):
         imageNodes = []
         try:
             obj = decode(body)
             message_content_id = obj["content_id"]
             file_name = obj["file_name"]
-            image_data = obj["Payload"]
 
-            if message_content_id != content_id:
+            # Ensure the content ID matches, None accepts any
+            if content_id is None:
+                content_id = message_content_id
+            elif message_content_id != content_id:
                 logging.info(
                     f"Skipping image with non-matching Content ID: {message_content_id}"
                 )
                 # Do not send ack; requeue message implicitly by not acking
                 return
 
+            # Read from the blob store only for an image this consumer handles
+            image_data = resolve_payload(obj)
+
             # Create or use the directory store_<contentID>
             target_folder = f"store_{content_id}"
             os.makedirs(target_folder, exist_ok=True)
 
-            # Process and classify image
+            # Classify the image, unless an identical one was classified before
+            payload_ref = obj.get("PayloadRef")
+            predictedString = None
+            if self.dedup_index and payload_ref:
+                predictedString = self.dedup_index.get_image_class(payload_ref)
             try:
-                image = Image.open(io.BytesIO(image_data)).convert("RGB")
-                inputs = self.preprocessor(images=image, return_tensors="pt")
+                if predictedString is None:
+                    image = Image.open(io.BytesIO(image_data)).convert("RGB")
+                    inputs = self.preprocessor(images=image, return_tensors="pt")
 
-                with torch.no_grad():
-                    outputs = self.model(**inputs)
+                    with torch.no_grad():
+                        outputs = self.model(**inputs)
 
-                logits = outputs.logits
-                predicted_class_indices = torch.argmax(logits, dim=-1).tolist()
-                predicted_class = self.model.config.id2label[predicted_class_indices[0]]
-                confidence_score = F.softmax(logits, dim=-1)[
-                    0, predicted_class_indices[0]
-                ].item()
+                    logits = outputs.logits
+                    predicted_class_indices = torch.argmax(logits, dim=-1).tolist()
+                    predicted_class = self.model.config.id2label[predicted_class_indices[0]]
+                    confidence_score = F.softmax(logits, dim=-1)[
+                        0, predicted_class_indices[0]
+                    ].item()
 
-                logging.info(
-                    f"Classification results - Class: {predicted_class}, Confidence: {confidence_score:.2f}"
-                )
-                print(
-                    f"Classification results - Class: {predicted_class}, Confidence: {confidence_score:.2f}"
-                )
+                    logging.info(
+                        f"Classification results - Class: {predicted_class}, Confidence: {confidence_score:.2f}"
+                    )
+                    print(
+                        f"Classification results - Class: {predicted_class}, Confidence: {confidence_score:.2f}"
+                    )
 
-                predictedString = (f"{predicted_class}, Confidence: {confidence_score:.2f}")
+                    predictedString = (f"{predicted_class}, Confidence: {confidence_score:.2f}")
+                    if self.dedup_index and payload_ref:
+                        self.dedup_index.put_image_class(payload_ref, predictedString)
+                else:
+                    logging.info(f"Image class served from cache: {predictedString}")
 
 
 
@@ -143,7 +166,7 @@ class ImageClassifier:
 
             # Add classification results to log message
             logging.info(
-                f"Processed image with Content ID: {message_content_id}, Class: {predicted_class}"
+                f"Processed image with Content ID: {message_content_id}, Class: {predictedString}"
             )
             ch.basic_ack(delivery_tag=method.delivery_tag)
             # functionCall here to send to DB
@@ -154,7 +177,7 @@ class ImageClassifier:
             ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
         except Exception as e:
             logging.error(f"Error processing image message: {str(e)}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=should_requeue(method, properties))
 
     def consume_image(self, contentID):
         logging.info(
@@ -190,6 +213,25 @@ class ImageClassifier:
                 )
                 continue
 
+    def consume(self, prefetch_count=IMAGE_PREFETCH):
+        """
+        Long-lived consumer: classify every image as it arrives, whatever its
+        content ID, with the model loaded once for the life of the process.
+        """
+        logging.info("Starting to consume messages from the Image queue")
+        self.channel.basic_qos(prefetch_count=prefetch_count)
+        self.channel.basic_consume(
+            queue=self.queues["image"],
+            on_message_callback=self.classify_images,
+        )
+        try:
+            self.channel.start_consuming()
+        except KeyboardInterrupt:
+            logging.info("Shutting down gracefully...")
+            self.channel.stop_consuming()
+        finally:
+            self.cleanup()
+
     def cleanup(self):
         try:
             if hasattr(self, "channel") and self.channel.is_open:
@@ -214,7 +256,7 @@ class ImageClassifier:
 
 def main():
     classifier = ImageClassifier()
-    classifier.run()
+    classifier.consume()
 
 
 if __name__ == "__main__":
@@ -10,6 +10,14 @@ import logging
 from bson import decode
 from dbOperationsLocal import nodeBuilder
 from statusFeed import statusFeed
+from blob_store import resolve_payload
+from dead_letter import queue_arguments, should_requeue
+from dedup_index import DedupIndex, DEDUP_ENABLED
+
+# Unacknowledged images held by the long-lived consumer
+IMAGE_PREFETCH = int(os.environ.get("IMAGE_PREFETCH", 8))
+
+
 class ImageClassifier:
     def __init__(self):
         # Set up logging
@@ -25,6 +33,9 @@ class ImageClassifier:
         self.queues = {"image": "Image"}
         self.setup_rabbitmq()
 
+        # Classes of images already seen, keyed by content hash
+        self.dedup_index = DedupIndex() if DEDUP_ENABLED else None
+
     def load_model(self):
         try:
             # Load pretrained weights
@@ -51,7 +62,7 @@ class ImageClassifier:
             )
             self.channel = self.connection.channel()
             for queue in self.queues.values():
-                self.channel.queue_declare(queue=queue, durable=True)
+                self.channel.queue_declare(queue=queue, durable=True, arguments=queue_arguments())
             logging.info("RabbitMQ connection established")
         except Exception as e:
             logging.error(f"Error setting up RabbitMQ: {e}")
@@ -87,37 +98,48 @@ class ImageClassifier:
             logging.error(f"Error saving file {path}: {e}")
             raise
 
-    def classify_images(self, ch, method, properties, body, content_id):
+    def classify_images(self, ch, method, properties, body, content_id=None):
         try:
             # Decode BSON message
             obj = decode(body)
             message_content_id = obj["content_id"]
             file_name = obj["file_name"]
-            image_data = obj["Payload"]
             PictureID = obj["PictureID"]
 
-            # Ensure the content ID matches
-            if message_content_id != content_id:
+            # Ensure the content ID matches, None accepts any
+            if content_id is None:
+                content_id = message_content_id
+            elif message_content_id != content_id:
                 logging.info(
                     f"Skipping image with non-matching Content ID: {message_content_id}"
                 )
                 return
 
+            # Read from the blob store only for an image this consumer handles
+            image_data = resolve_payload(obj)
+
             # Create or use a folder to store images
             target_folder = os.path.abspath(f"store_{content_id}")
             os.makedirs(target_folder, exist_ok=True)
 
-            # Classify the image
-            predicted_class, confidence_score = self.classify_image(image_data)
+            # Classify the image, unless an identical one was classified before
+            payload_ref = obj.get("PayloadRef")
+            predictedString = None
+            if self.dedup_index and payload_ref:
+                predictedString = self.dedup_index.get_image_class(payload_ref)
+            if predictedString is None:
+                predicted_class, confidence_score = self.classify_image(image_data)
+                logging.info(f"Image classified: {predicted_class}, Confidence: {confidence_score:.2f}")
+                predictedString = (f"{predicted_class}, Confidence: {confidence_score:.2f}")
+                if self.dedup_index and payload_ref:
+                    self.dedup_index.put_image_class(payload_ref, predictedString)
+            else:
+                logging.info(f"Image class served from cache: {predictedString}")
 
             # Save the image
             image_file_name = f"{file_name}_{message_content_id}.png"
             self.save_file(os.path.join(target_folder, image_file_name), image_data)
 
-            # Log classification result
-            logging.info(f"Image classified: {predicted_class}, Confidence: {confidence_score:.2f}")
-            predictedString = (f"{predicted_class}, Confidence: {confidence_score:.2f}")
-
             # Prepare node for database insertion
             image_node = [
                 file_name,
@@ -140,7 +162,9 @@ class ImageClassifier:
             ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
         except Exception as e:
             logging.error(f"Error processing image message: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            # Retried once, then dead lettered: an image that cannot be
+            # decoded would otherwise come straight back to this consumer forever
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=should_requeue(method, properties))
 
     def consume_image(self, contentID):
         logging.info(f"Starting to consume messages from the Image queue with Content ID: {contentID}")
@@ -176,6 +200,25 @@ class ImageClassifier:
 
 
 
+    def consume(self, prefetch_count=IMAGE_PREFETCH):
+        """
+        Long-lived consumer: classify every image as it arrives, whatever its
+        content ID, with the model loaded once for the life of the process.
+        """
+        logging.info("Starting to consume messages from the Image queue")
+        self.channel.basic_qos(prefetch_count=prefetch_count)
+        self.channel.basic_consume(
+            queue=self.queues["image"],
+            on_message_callback=self.classify_images,
+        )
+        try:
+            self.channel.start_consuming()
+        except KeyboardInterrupt:
+            logging.info("Shutting down gracefully...")
+            self.channel.stop_consuming()
+        finally:
+            self.cleanup()
+
     def cleanup(self):
         try:
             if hasattr(self, "channel") and self.channel.is_open:
@@ -199,7 +242,7 @@ class ImageClassifier:
 
 def main():
     classifier = ImageClassifier()
-    classifier.run()
+    classifier.consume()
 
 if __name__ == "__main__":
     main()
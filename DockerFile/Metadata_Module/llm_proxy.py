@@ -0,0 +1,401 @@
+"""
+Async proxy in front of the Ollama model server, shared by the
+metabackend scripts.
+
+Requests wait in a bounded queue: past LLM_QUEUE_SIZE pending
+generations new ones are turned away with 503 instead of piling up. At
+most LLM_MODEL_CONCURRENCY generations run per model at a time, and
+identical prompts for the same model that are already in flight share
+one generation. Models are kept loaded between requests with Ollama's
+keep_alive and loaded at startup.
+
+With "stream": true the tokens are relayed as a chunked text/plain
+response as Ollama produces them. Generation is cut off server side after
+max_tokens tokens (capped at LLM_MAX_TOKENS) or at a stop sequence, and
+after max_sentences sentences the proxy closes the stream to Ollama,
+which stops generating.
+
+GET /metrics reports the queue depth, counters and latency histograms
+of the queue wait, the first token, the generation and the whole request.
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import functools
+from bisect import bisect_left
+from contextlib import aclosing, asynccontextmanager
+from typing import List, Optional
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+# Generations accepted at once, running and waiting
+LLM_QUEUE_SIZE = int(os.environ.get("LLM_QUEUE_SIZE", 32))
+# Generations running at once per model, a CPU model gains nothing from more
+LLM_MODEL_CONCURRENCY = int(os.environ.get("LLM_MODEL_CONCURRENCY", 1))
+# How long Ollama keeps a model loaded after its last request
+LLM_KEEP_ALIVE = os.environ.get("LLM_KEEP_ALIVE", "30m")
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 300))
+# Longest generation allowed, 0 leaves it to the model
+LLM_MAX_TOKENS = int(os.environ.get("LLM_MAX_TOKENS", 256))
+# Comma separated stop sequences applied to every request
+LLM_STOP = [stop for stop in os.environ.get("LLM_STOP", "").split(",") if stop]
+
+# A stop followed by whitespace and a capital letter. A stop at the end of
+# the text so far is undecided until more text arrives.
+SENTENCE_END = re.compile(r"[.!?](?=\s+[\"'(\[]?[A-Z])")
+# Words whose period does not end a sentence, besides initials like "U.S."
+ABBREVIATIONS = {
+    "adm.", "approx.", "capt.", "cmdr.", "col.", "dr.", "e.g.", "fig.", "gen.", "i.e.",
+    "jr.", "lt.", "mk.", "mr.", "mrs.", "ms.", "mt.", "no.", "prof.", "sgt.", "sr.", "st.", "vs.",
+}
+INITIALS = re.compile(r"(?:[A-Za-z]\.)+")
+WORD_BEFORE = re.compile(r"[\"'(\[]?(\S+)$")
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram in seconds, Prometheus style buckets."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[f"le_{bound}"] = cumulative
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+class OllamaBackend:
+    """Ollama's HTTP API over one pooled async client."""
+
+    def __init__(self, base_url=OLLAMA_URL, keep_alive=LLM_KEEP_ALIVE, timeout=LLM_TIMEOUT, transport=None):
+        self.keep_alive = keep_alive
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=timeout, transport=transport)
+
+    def _request(self, model, prompt, options, stream):
+        body = {"model": model, "prompt": prompt, "stream": stream, "keep_alive": self.keep_alive}
+        if options:
+            body["options"] = options
+        return body
+
+    async def generate(self, model, prompt, options=None):
+        response = await self.client.post("/api/generate", json=self._request(model, prompt, options, False))
+        response.raise_for_status()
+        return response.json()["response"]
+
+    async def stream(self, model, prompt, options=None):
+        """Yield the text pieces of the generation as Ollama produces them."""
+        async with self.client.stream("POST", "/api/generate", json=self._request(model, prompt, options, True)) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    return
+
+    async def load(self, model):
+        # A request without a prompt only loads the model and keeps it resident
+        response = await self.client.post("/api/generate", json={"model": model, "keep_alive": self.keep_alive})
+        response.raise_for_status()
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def is_abbreviation(text, stop):
+    """Whether the period at text[stop] ends an abbreviation or initials rather than a sentence."""
+    if text[stop] != ".":
+        return False
+    word = WORD_BEFORE.search(text, max(stop - 15, 0), stop + 1)
+    if word is None:
+        return False
+    word = word.group(1)
+    return word.lower() in ABBREVIATIONS or INITIALS.fullmatch(word) is not None
+
+
+async def cut_after_sentences(pieces, max_sentences):
+    """
+    Relay the text pieces until max_sentences sentences are complete, then
+    close the source, which closes the connection and stops the generation.
+    """
+    text = ""
+    relayed = 0  # characters yielded
+    scanned = 0  # stops before this are decided
+    sentences = 0
+    async with aclosing(pieces):
+        async for piece in pieces:
+            text += piece
+            for end in SENTENCE_END.finditer(text, scanned):
+                scanned = end.end()
+                if is_abbreviation(text, end.start()):
+                    continue
+                sentences += 1
+                if sentences == max_sentences:
+                    if end.end() > relayed:
+                        yield text[relayed:end.end()]
+                    return
+            # Only a stop ending the text is still undecided: hold back the
+            # whitespace after it, which would trail the last sentence
+            content = len(text.rstrip())
+            scanned = max(scanned, content - 1)
+            safe = content if text[content - 1:content] in (".", "!", "?") else len(text)
+            if safe > relayed:
+                yield text[relayed:safe]
+                relayed = safe
+        if len(text) > relayed:
+            yield text[relayed:]
+
+
+def generation_options(max_tokens=None, stop=None):
+    """Ollama options of a request, with the server-wide limits applied."""
+    options = {}
+    if LLM_MAX_TOKENS:
+        max_tokens = min(max_tokens or LLM_MAX_TOKENS, LLM_MAX_TOKENS)
+    if max_tokens:
+        options["num_predict"] = max_tokens
+    if stop or LLM_STOP:
+        options["stop"] = list(stop or []) + LLM_STOP
+    return options
+
+
+class QueuedStream:
+    """
+    Text pieces of a streamed generation. Holds its place in the queue from
+    the moment it is created, so a stream that is never iterated cannot
+    slip past the queue bound, until exhausted, failed or closed.
+    """
+
+    def __init__(self, pieces, release):
+        self._pieces = pieces
+        self._release = release
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._pieces.__anext__()
+        except BaseException:
+            # Exhausted, failed or cancelled, the generation is over
+            self.release()
+            raise
+
+    async def aclose(self):
+        try:
+            await self._pieces.aclose()
+        finally:
+            self.release()
+
+    def release(self):
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
+
+    def __del__(self):
+        self.release()
+
+
+class GenerationQueue:
+    def __init__(self, backend, max_pending=LLM_QUEUE_SIZE, concurrency=LLM_MODEL_CONCURRENCY):
+        self.backend = backend
+        self.max_pending = max_pending
+        self.concurrency = concurrency
+        self._semaphores = {}
+        self._in_flight = {}  # (model, prompt, options, max_sentences) -> generation task
+        self.pending = 0
+        self.running = {}
+        self.counters = {"accepted": 0, "coalesced": 0, "rejected": 0, "completed": 0, "failed": 0}
+        self.latency = {
+            "queue_wait": LatencyHistogram(),
+            "first_token": LatencyHistogram(),
+            "generation": LatencyHistogram(),
+            "total": LatencyHistogram(),
+        }
+
+    async def generate(self, model, prompt, options=None, max_sentences=None):
+        key = (model, prompt, json.dumps(options, sort_keys=True), max_sentences)
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            self.reserve()
+            self.pending += 1
+            task = asyncio.ensure_future(self._run(model, prompt, options, max_sentences))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # A client that goes away does not cancel a generation others wait for
+        return await asyncio.shield(task)
+
+    def reserve(self):
+        if self.pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise QueueFull(f"{self.pending} generations pending")
+        self.counters["accepted"] += 1
+
+    async def _run(self, model, prompt, options, max_sentences):
+        started = time.perf_counter()
+        try:
+            if max_sentences:
+                pieces = self._generation(model, prompt, options, max_sentences, started)
+                return "".join([piece async for piece in pieces])
+            semaphore = self._semaphores.setdefault(model, asyncio.Semaphore(self.concurrency))
+            async with semaphore:
+                generation_started = time.perf_counter()
+                self.latency["queue_wait"].observe(generation_started - started)
+                self.running[model] = self.running.get(model, 0) + 1
+                try:
+                    text = await self.backend.generate(model, prompt, options)
+                except Exception:
+                    self.counters["failed"] += 1
+                    raise
+                finally:
+                    self.running[model] -= 1
+                    self.latency["generation"].observe(time.perf_counter() - generation_started)
+            self.counters["completed"] += 1
+            return text
+        finally:
+            self._release(started)
+
+    def _release(self, started):
+        self.pending -= 1
+        self.latency["total"].observe(time.perf_counter() - started)
+
+    def stream(self, model, prompt, options=None, max_sentences=None):
+        """
+        Take a place in the queue and return the async iterator of the text
+        pieces, which gives the place back once exhausted, failed or closed.
+        Streams are not coalesced, each one is its own generation.
+        """
+        self.reserve()
+        self.pending += 1
+        started = time.perf_counter()
+        pieces = self._generation(model, prompt, options, max_sentences, started)
+        return QueuedStream(pieces, functools.partial(self._release, started))
+
+    async def _generation(self, model, prompt, options, max_sentences, started):
+        semaphore = self._semaphores.setdefault(model, asyncio.Semaphore(self.concurrency))
+        async with semaphore:
+            generation_started = time.perf_counter()
+            self.latency["queue_wait"].observe(generation_started - started)
+            self.running[model] = self.running.get(model, 0) + 1
+            pieces = self.backend.stream(model, prompt, options)
+            if max_sentences:
+                pieces = cut_after_sentences(pieces, max_sentences)
+            first = True
+            try:
+                async with aclosing(pieces):
+                    async for piece in pieces:
+                        if first:
+                            self.latency["first_token"].observe(time.perf_counter() - started)
+                            first = False
+                        yield piece
+            except Exception:
+                self.counters["failed"] += 1
+                raise
+            finally:
+                self.running[model] -= 1
+                self.latency["generation"].observe(time.perf_counter() - generation_started)
+        self.counters["completed"] += 1
+
+    async def close(self):
+        """Cancel the generations still in flight and wait for them to end."""
+        tasks = list(self._in_flight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def metrics(self):
+        running = sum(self.running.values())
+        return {
+            "queue_depth": self.pending - running,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "running": dict(self.running),
+            "concurrency_per_model": self.concurrency,
+            **self.counters,
+            "latency_seconds": {name: histogram.snapshot() for name, histogram in self.latency.items()},
+        }
+
+
+class GenerateRequest(BaseModel):
+    input_text: str = ""
+    model: Optional[str] = None
+    # Relay tokens as they are generated instead of one JSON answer
+    stream: bool = False
+    max_tokens: Optional[int] = None
+    stop: Optional[List[str]] = None
+    # Stop once this many sentences are complete
+    max_sentences: Optional[int] = None
+
+
+def create_app(model, backend=None, preload=True):
+    """FastAPI app serving POST /generate with 'model' as default model, and GET /metrics."""
+    backend = backend or OllamaBackend()
+    queue = GenerationQueue(backend)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if preload:
+            try:
+                await backend.load(model)
+                logging.info(f"Model {model} loaded, kept alive for {getattr(backend, 'keep_alive', None)}")
+            except Exception as e:
+                logging.error(f"Could not preload model {model}: {e}")
+        try:
+            yield
+        finally:
+            # Generations first, they still use the client
+            await queue.close()
+            await backend.close()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.queue = queue
+
+    @app.post("/generate")
+    async def generate_text(request: GenerateRequest):
+        print("Called generate text")
+        options = generation_options(request.max_tokens, request.stop)
+        try:
+            if request.stream:
+                pieces = queue.stream(request.model or model, request.input_text, options, request.max_sentences)
+                return StreamingResponse(pieces, media_type="text/plain; charset=utf-8")
+            generated_text = await queue.generate(
+                request.model or model, request.input_text, options, request.max_sentences
+            )
+        except QueueFull as e:
+            return JSONResponse({"error": f"Generation queue full: {e}"}, status_code=503, headers={"Retry-After": "5"})
+        except Exception as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+        return {"generated_text": generated_text}
+
+    @app.get("/metrics")
+    async def metrics():
+        return queue.metrics()
+
+    return app
@@ -1,30 +1,10 @@
-import subprocess
-from flask import Flask, request, jsonify
+import uvicorn
+from llm_proxy import create_app
 
-# Initialize the Flask app
-app = Flask(__name__)
-
-# Function to interact with Ollama via CLI
-def generate_with_ollama(prompt):
-    # Use subprocess to call the Ollama CLI
-    result = subprocess.run(
-        ["ollama", "run", "llama2", prompt],
-        capture_output=True,
-        text=True
-    )
-    return result.stdout.strip()
-
-@app.route('/generate', methods=['POST'])
-def generate_text():
-    # Get input from the request
-    data = request.json
-    input_text = data.get("input_text", "")
-
-    # Call Ollama to generate the response
-    generated_text = generate_with_ollama(input_text)
-
-    # Return the generated text as JSON
-    return jsonify({"generated_text": generated_text})
+# Ollama's HTTP API instead of one `ollama run` process per prompt: the
+# model stays loaded between requests and identical prompts share a
+# generation (see llm_proxy)
+app = create_app("llama2")
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5002)
+    uvicorn.run(app, host='0.0.0.0', port=5002)
@@ -1,12 +1,13 @@
-from flask import Flask, request, jsonify
 import requests
-import time
 import sys
-
-app = Flask(__name__)
+import uvicorn
+from llm_proxy import create_app
 
 MODEL_NAME = "llama2:7b"  # Define model name as a constant
 
+# Async proxy: bounded queue, per-model concurrency, prompt coalescing, /metrics
+app = create_app(MODEL_NAME)
+
 
 def list_models():
     """Check what models are currently downloaded"""
@@ -49,25 +50,8 @@ def ensure_model_available():
         print(f"Model {MODEL_NAME} is already available")
 
 
-@app.route("/generate", methods=["POST"])
-def generate_text():
-    print("Called generate text")
-    data = request.json
-    input_text = data.get("input_text", "")
-
-    try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": MODEL_NAME, "prompt": input_text, "stream": False},
-        )
-        response.raise_for_status()
-        return jsonify({"generated_text": response.json()["response"]})
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": str(e)}), 500
-
-
 if __name__ == "__main__":
     print("Starting server...")
     print("Checking available models...")
     ensure_model_available()
-    app.run(host="0.0.0.0", port=5002)
+    uvicorn.run(app, host="0.0.0.0", port=5002)
@@ -0,0 +1,196 @@
+"""
+Client of the mission profile service (metabackend, POST /generate).
+
+The prompt only depends on the main entity of a document ("What is the
+GE414 engine and what does it do?"), so answers are cached by normalized
+entity name in a SQLite file that survives restarts: least recently used
+entries are evicted past MISSION_PROFILE_CACHE_SIZE and entries expire
+after MISSION_PROFILE_CACHE_TTL seconds. Misses go through one pooled
+requests.Session with connect and read timeouts.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+MISSION_PROFILE_URL = os.environ.get("MISSION_PROFILE_URL", "http://127.0.0.1:5002/generate")
+MISSION_PROFILE_CONNECT_TIMEOUT = float(os.environ.get("MISSION_PROFILE_CONNECT_TIMEOUT", 3))
+# Generation runs a local LLM, allow for a slow answer
+MISSION_PROFILE_READ_TIMEOUT = float(os.environ.get("MISSION_PROFILE_READ_TIMEOUT", 60))
+MISSION_PROFILE_CACHE_PATH = os.environ.get(
+    "MISSION_PROFILE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mission_profile_cache.sqlite3"),
+)
+MISSION_PROFILE_CACHE_SIZE = int(os.environ.get("MISSION_PROFILE_CACHE_SIZE", 10000))
+MISSION_PROFILE_CACHE_TTL = float(os.environ.get("MISSION_PROFILE_CACHE_TTL", 7 * 24 * 3600))
+
+PROMPT_TEMPLATE = "What is the {} and what does it do? Two sentences max."
+# The proxy stops the generation once the answer is this long
+MISSION_PROFILE_MAX_SENTENCES = int(os.environ.get("MISSION_PROFILE_MAX_SENTENCES", 2))
+MISSION_PROFILE_MAX_TOKENS = int(os.environ.get("MISSION_PROFILE_MAX_TOKENS", 120))
+
+
+def normalize_entity(name):
+    """Cache key of an entity name: case and whitespace folded, surrounding punctuation dropped."""
+    return re.sub(r"\s+", " ", str(name)).strip(" \t.,;:!?\"'()[]").casefold()
+
+
+class MissionProfileCache:
+    """Persistent LRU cache of mission profiles with a time to live."""
+
+    def __init__(self, path=MISSION_PROFILE_CACHE_PATH, max_entries=MISSION_PROFILE_CACHE_SIZE, ttl=MISSION_PROFILE_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pid = None
+        with self._lock, self._connection():
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS mission_profiles (
+                    entity TEXT PRIMARY KEY,
+                    profile TEXT,
+                    created REAL,
+                    last_used REAL
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS mission_profiles_last_used ON mission_profiles (last_used)"
+            )
+
+    def _connection(self):
+        # Document workers are forked: a child opens its own connection
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._db
+
+    def get(self, entity):
+        now = time.time()
+        with self._lock, self._connection():
+            row = self._db.execute(
+                "SELECT profile, created FROM mission_profiles WHERE entity = ?", (entity,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM mission_profiles WHERE entity = ?", (entity,))
+                return None
+            self._db.execute("UPDATE mission_profiles SET last_used = ? WHERE entity = ?", (now, entity))
+            return row[0]
+
+    def put(self, entity, profile):
+        now = time.time()
+        with self._lock, self._connection():
+            self._db.execute(
+                "INSERT OR REPLACE INTO mission_profiles (entity, profile, created, last_used) VALUES (?, ?, ?, ?)",
+                (entity, profile, now, now),
+            )
+            # Evict the least recently used entries past the size limit
+            self._db.execute(
+                """DELETE FROM mission_profiles WHERE entity IN (
+                    SELECT entity FROM mission_profiles ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class MissionProfileClient:
+    """
+    Mission profile of an entity, from the cache or the service.
+
+    stats() reports requests, hits, misses, failures and the hit rate since
+    the process started.
+    """
+
+    def __init__(self, url=MISSION_PROFILE_URL, cache=None, pool_size=4):
+        self.url = url
+        self.timeout = (MISSION_PROFILE_CONNECT_TIMEOUT, MISSION_PROFILE_READ_TIMEOUT)
+        self.cache = cache
+        self.session = requests.Session()
+        # Retry connection failures only, a generation that timed out is not resent
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2, connect=2, read=0, backoff_factor=0.5, allowed_methods=None),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "hits": 0, "misses": 0, "failures": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats["requests"] += name != "failures"
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hit_rate"] = stats["hits"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def cached(self, entity_name):
+        """Return the cached mission profile of the entity, None if it has to be generated."""
+        profile = self.cache.get(normalize_entity(entity_name)) if self.cache else None
+        self._count("hits" if profile is not None else "misses")
+        return profile
+
+    def get(self, entity_name):
+        """Return the mission profile text of the entity, or None if the service failed."""
+        key = normalize_entity(entity_name)
+        profile = self.cache.get(key) if self.cache else None
+        if profile is not None:
+            self._count("hits")
+            print(f"Mission profile of '{entity_name}' served from cache (hit rate {self.stats()['hit_rate']:.0%})")
+            return profile
+
+        self._count("misses")
+        profile = self._generate(PROMPT_TEMPLATE.format(entity_name))
+        if profile is None:
+            self._count("failures")
+            return None
+        if self.cache:
+            self.cache.put(key, profile)
+        print(f"Mission profile of '{entity_name}' generated (hit rate {self.stats()['hit_rate']:.0%})")
+        return profile
+
+    def _generate(self, prompt):
+        started = time.perf_counter()
+        try:
+            response = self.session.post(
+                self.url,
+                json={
+                    "input_text": prompt,
+                    "max_sentences": MISSION_PROFILE_MAX_SENTENCES,
+                    "max_tokens": MISSION_PROFILE_MAX_TOKENS,
+                },
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            print(f"Failed to connect to API: {e}")
+            return None
+        if response.status_code != 200:
+            print(f"Failed to connect to API: {response.status_code}")
+            return None
+        print(f"Mission profile generated in {time.perf_counter() - started:.2f}s")
+        return response.json().get("generated_text", "No text generated.")
+
+    def close(self):
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+
+
+# Shared by every document analyzed in this process
+mission_profiles = MissionProfileClient(
+    cache=MissionProfileCache() if os.environ.get("MISSION_PROFILE_CACHE", "1") != "0" else None
+)
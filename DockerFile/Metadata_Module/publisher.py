@@ -35,7 +35,7 @@ def handle_client(client):
         client.close()
    
 
-# Function to publish messages to RabbitMQ
+# Function to publish messages to RabbitMQ, returns whether it was sent
 def publish_to_rabbitmq(routing_key, message):
     try:
         connection_parameters = pika.ConnectionParameters('localhost')
@@ -56,9 +56,11 @@ def publish_to_rabbitmq(routing_key, message):
         )
         print("Message published successfully")
         connection.close()
+        return True
 
     except Exception as e:
         print(f"Error publishing to RabbitMQ: {e}")
+        return False
 # Function to start a socket server and listen for incoming BSON objects
 def receive_bson_obj():
     # Create a TCP/IP socket
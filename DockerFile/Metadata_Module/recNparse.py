@@ -3,6 +3,8 @@ from bson import BSON, decode, encode
 import os
 import logging
 from bson.errors import BSONError
+from blob_store import resolve_payload
+from dead_letter import queue_arguments, should_requeue
 
 
 
@@ -13,6 +15,9 @@ logging.basicConfig(
 
 logging.getLogger("pika").setLevel(logging.WARNING)
 
+# Unacknowledged messages held by a long-lived consumer
+STORE_PREFETCH = int(os.environ.get("STORE_PREFETCH", 16))
+
 
 class MessageProcessor:
     def __init__(self, host="localhost"):
@@ -36,7 +41,7 @@ class MessageProcessor:
 
         # Declare queues
         for queue_name in self.queues.values():
-            self.channel.queue_declare(queue=queue_name, durable=True, arguments=None)
+            self.channel.queue_declare(queue=queue_name, durable=True, arguments=queue_arguments())
 
         # Bind queues to the exchange
         self.channel.queue_bind(
@@ -75,18 +80,20 @@ class MessageProcessor:
         except Exception as e:
             logging.error(f"Error saving file {file_path}: {str(e)}")
 
-    def process_store(self, ch, method, properties, body, content_id):
+    def process_store(self, ch, method, properties, body, content_id=None):
         try:
             obj = decode(body)
             message_content_id = obj["content_id"]
             file_name = obj["file_name"]
 
-            # Check if the ContentId matches
-            if message_content_id != content_id:
+            # Check if the ContentId matches, None accepts any
+            if content_id is None:
+                content_id = message_content_id
+            elif message_content_id != content_id:
                 logging.info(
                     f"Skipping store message with non-matching Content ID: {message_content_id}"
                 )
-                ch.basic_nack(delivery_tag=method.delivey_tag, requeue=True)
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
                 return
 
             logging.info(
@@ -97,7 +104,7 @@ class MessageProcessor:
 
             # Save the main payload including original filename
             payload_filename = f"{file_name}+{content_id}+payload.pdf"
-            self.save_file(os.path.join(base_path, payload_filename), obj["Payload"])
+            self.save_file(os.path.join(base_path, payload_filename), resolve_payload(obj))
 
             # Save Meta, Summary, and Keywords including original filename
             for key in ["Meta", "Summary", "Keywords"]:
@@ -118,16 +125,20 @@ class MessageProcessor:
             ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
         except Exception as e:
             logging.error(f"Error processing store message: {str(e)}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            # Retried once, then dead lettered: a message failing every time
+            # would otherwise come straight back to this consumer forever
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=should_requeue(method, properties))
 
 
-    def process_image(self, ch, method, properties, body, content_id):
+    def process_image(self, ch, method, properties, body, content_id=None):
         try:
             obj = decode(body)
             message_content_id = obj["content_id"]
             file_name = obj["file_name"]
 
-            if message_content_id != content_id:
+            if content_id is None:
+                content_id = message_content_id
+            elif message_content_id != content_id:
                 logging.info(
                     f"Skipping image with non-matching Content ID: {message_content_id}"
                 )
@@ -140,7 +151,7 @@ class MessageProcessor:
 
             # Save the file in the target folder
             image_file_name = f"image_{file_name}+{message_content_id}.png"
-            self.save_file(os.path.join(target_folder, image_file_name), obj["Payload"])
+            self.save_file(os.path.join(target_folder, image_file_name), resolve_payload(obj))
 
             logging.info(f"Processed image with Content ID: {message_content_id}")
             ch.basic_ack(delivery_tag=method.delivery_tag)
@@ -150,7 +161,7 @@ class MessageProcessor:
             ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
         except Exception as e:
             logging.error(f"Error processing image message: {str(e)}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=should_requeue(method, properties))
 
 
 
@@ -200,13 +211,31 @@ class MessageProcessor:
         )
         self.channel.start_consuming()
 
+    def consume(self, queue="store", prefetch_count=STORE_PREFETCH):
+        """
+        Long-lived consumer: handle every message of the queue as it arrives,
+        whatever its content ID, until interrupted.
+        """
+        handlers = {"store": self.process_store, "image": self.process_image}
+        self.channel.basic_qos(prefetch_count=prefetch_count)
+        self.channel.basic_consume(
+            queue=self.queues[queue],
+            on_message_callback=handlers[queue],
+        )
+        logging.info(f"Consuming the {self.queues[queue]} queue")
+        try:
+            self.channel.start_consuming()
+        except KeyboardInterrupt:
+            self.channel.stop_consuming()
+        finally:
+            if self.connection.is_open:
+                self.connection.close()
 
 
 if __name__ == "__main__":
     processor = MessageProcessor()
 
-    # Example usage: consume from the Store queue
-    processor.consume_image()
+    # Store every processed document as its message arrives
+    processor.consume("store")
 
-    # Example usage: consume from the Image queue
-    # processor.consume_image()
+    # The Image queue is consumed by ImageClassifier (image_module.py or image_moduleMac.py)
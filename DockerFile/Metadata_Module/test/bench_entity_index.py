@@ -0,0 +1,61 @@
+import io
+import os
+import sys
+import copy
+import time
+import random
+import contextlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from analyzer import EntityIndex, remove_duplicate_nodes
+
+# Time spent on the entity mentions of one document by the previous list
+# based helpers (membership test against the unique list, substring rescan
+# for the main topic) against EntityIndex and the hashed dedup, for a
+# growing number of mentions drawn from a realistic number of entities.
+
+LABELS = ["digitalTwinAircraft", "digitalTwinEngine", "digitalTwinMarine", "digitalTwinGround"]
+
+
+def mentions(count, entities):
+    names = [f"Entity {i}" for i in range(entities)]
+    return [[random.choice(names), "digitalTwin", random.choice(LABELS)[11:]] for _ in range(count)]
+
+
+def list_based(nodes):
+    entity_counts = {}
+    for node in nodes:
+        name = node[0].strip().lower()
+        entity_counts[name] = entity_counts.get(name, 0) + 1
+    main_topic = max(entity_counts, key=entity_counts.get)
+    unique_nodes = []
+    for node in nodes:
+        if node not in unique_nodes:
+            unique_nodes.append(node)
+    for node in unique_nodes:
+        if main_topic.lower() in node[0].lower():
+            return unique_nodes, copy.deepcopy(node)
+
+
+def indexed(nodes):
+    entity_index = EntityIndex()
+    for node in nodes:
+        entity_index.add(node)
+    return remove_duplicate_nodes(nodes), entity_index.node(entity_index.main_topic())
+
+
+def timed(function, nodes):
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = function(nodes)
+        return time.perf_counter() - started, result
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    for count in (1000, 5000, 20000, 50000):
+        nodes = mentions(count, entities=count // 10)
+        before, expected = timed(list_based, nodes)
+        after, result = timed(indexed, nodes)
+        assert result[0] == expected[0], "dedup changed the node order"
+        print(f"{count:>6} mentions  list {before:8.3f}s  index {after:8.4f}s  ({before / after:7.1f}x)")
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import glob
+import pdfplumber
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from analyzer import nlp, extract_sentence_entities
+
+# Sentences/sec of the custom NER model over the TEST PDFS corpus: one
+# nlp(sentence) call per sentence against batched nlp.pipe with several
+# batch sizes and process counts. Entities must come out the same, in order.
+
+TEST_PDFS = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../../Main_Server/TEST PDFS")
+
+
+def corpus_sentences(paths, repeat):
+    sentences = []
+    for path in paths:
+        with pdfplumber.open(path) as pdf:
+            text = " ".join(page.extract_text() or "" for page in pdf.pages)
+        sentences.extend(s.strip() + "." for s in text.replace("\n", " ").split(". ") if s.strip())
+    # The sample corpus is small, repeat it so multi-process runs are measurable
+    return sentences * repeat
+
+
+def per_sentence(sentences):
+    return [[(ent.text, ent.label_) for ent in nlp(sentence).ents] for sentence in sentences]
+
+
+def measure(function, sentences):
+    started = time.perf_counter()
+    entities = function(sentences)
+    return len(sentences) / (time.perf_counter() - started), entities
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    sentences = corpus_sentences(sorted(glob.glob(os.path.join(TEST_PDFS, "*.pdf"))), repeat)
+    print(f"{len(sentences)} sentences, {os.cpu_count()} CPUs")
+
+    baseline, expected = measure(per_sentence, sentences)
+    print(f"{'nlp(sentence) loop':<32} {baseline:8.1f} sentences/sec")
+
+    for n_process in sorted({1, 2, max(1, (os.cpu_count() or 1) // 2)}):
+        for batch_size in (16, 64, 256):
+            rate, entities = measure(
+                lambda s: extract_sentence_entities(s, batch_size=batch_size, n_process=n_process),
+                sentences,
+            )
+            assert entities == expected, "batched inference changed the entity stream"
+            print(f"{f'pipe batch={batch_size} n_process={n_process}':<32} {rate:8.1f} sentences/sec ({rate / baseline:4.1f}x)")
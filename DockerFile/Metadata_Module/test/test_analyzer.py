@@ -0,0 +1,102 @@
+import unittest
+import copy
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from analyzer import EntityIndex, remove_duplicate_nodes
+
+# Entity mentions in the order analyze collects them, relation nodes spliced
+# in before the second node of a related pair
+MENTIONS = [
+    ["F/A-18 Hornet", "digitalTwin", "Aircraft"],
+    ["engine"],
+    ["GE414", "digitalTwin", "Engine"],
+    ["LM2500", "digitalTwin", "Engine"],
+    ["GE414", "digitalTwin", "Engine"],
+    ["engine"],
+    [" f/a-18 hornet", "digitalTwin", "Aircraft"],
+    ["F/A-18 Hornet", "digitalTwin", "Aircraft"],
+    ["engine"],
+    ["GE414", "digitalTwin", "Engine"],
+    ["USS Nimitz", "digitalTwin", "Marine"],
+    ["LM2500", "digitalTwin", "Engine"],
+]
+
+def previous_remove_duplicate_nodes(nodes):
+    # The list based dedup analyze used before EntityIndex
+    unique_nodes = []
+    for node in nodes:
+        if node not in unique_nodes:
+            unique_nodes.append(node)
+    return unique_nodes
+
+def previous_main_topic_node(nodes):
+    # The entity counts and find_main_topic_node analyze used before EntityIndex
+    entity_counts = {}
+    for node in nodes:
+        if len(node) == 3:
+            name = node[0].strip().lower()
+            entity_counts[name] = entity_counts.get(name, 0) + 1
+    main_topic = max(entity_counts, key=entity_counts.get)
+    for node in previous_remove_duplicate_nodes(nodes):
+        if main_topic.lower() in node[0].lower():
+            return main_topic, copy.deepcopy(node)
+
+def indexed_main_topic_node(nodes):
+    entity_index = EntityIndex()
+    for node in nodes:
+        if len(node) == 3:
+            entity_index.add(node)
+    main_topic = entity_index.main_topic()
+    return main_topic, entity_index.node(main_topic)
+
+class TestEntityIndex(unittest.TestCase):
+    '''
+        purpose: To verify that the hashed dedup keeps the output of the list based one.
+        process: Removes duplicates from a fixed list of entity and relation nodes with both implementations.
+        validation: Ensures that the unique nodes are the same, in the same first-seen order, and that the input is left untouched.
+    '''
+    def test_dedup_order_matches_previous(self):
+        nodes = copy.deepcopy(MENTIONS)
+        self.assertEqual(remove_duplicate_nodes(nodes), previous_remove_duplicate_nodes(MENTIONS))
+        self.assertEqual(nodes, MENTIONS)
+
+    '''
+        purpose: To verify that the main topic is chosen as before, including ties.
+        process: Picks the main topic node of the fixed mentions, where "F/A-18 Hornet" (in two spellings) and "GE414" both have three mentions, then of prefixes and reorderings of them.
+        validation: Ensures that both implementations pick the same topic and node on every input, the first seen entity winning a tie.
+    '''
+    def test_main_topic_matches_previous(self):
+        self.assertEqual(indexed_main_topic_node(MENTIONS), ("f/a-18 hornet", ["F/A-18 Hornet", "digitalTwin", "Aircraft"]))
+        inputs = [MENTIONS[:end] for end in range(1, len(MENTIONS) + 1) if len(MENTIONS[end - 1]) == 3]
+        inputs += [MENTIONS[2:], MENTIONS[::-1]]
+        for nodes in inputs:
+            with self.subTest(nodes=nodes):
+                self.assertEqual(indexed_main_topic_node(nodes), previous_main_topic_node(nodes))
+
+    '''
+        purpose: To verify the one intended change: the main topic node matches its name exactly.
+        process: Picks the main topic of mentions where a longer entity containing the main topic is seen first.
+        validation: Ensures that the node of the main topic itself is returned, where the previous substring scan returned the longer entity.
+    '''
+    def test_main_topic_node_matches_exact_name(self):
+        nodes = [
+            ["GE414 Engine Bay", "digitalTwin", "Aircraft"],
+            ["GE414", "digitalTwin", "Engine"],
+            ["GE414", "digitalTwin", "Engine"],
+        ]
+        self.assertEqual(indexed_main_topic_node(nodes), ("ge414", ["GE414", "digitalTwin", "Engine"]))
+        self.assertEqual(previous_main_topic_node(nodes)[1][0], "GE414 Engine Bay")
+
+    '''
+        purpose: To verify the index of a document without entities.
+        process: Asks an empty index for its main topic and node.
+        validation: Ensures that both are None.
+    '''
+    def test_empty_index(self):
+        entity_index = EntityIndex()
+        self.assertIsNone(entity_index.main_topic())
+        self.assertIsNone(entity_index.node(None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import pika
+from dead_letter import should_requeue, queue_arguments, DEAD_LETTER_EXCHANGE
+
+def delivery(redelivered=False, headers=None):
+    return pika.spec.Basic.Deliver(delivery_tag=1, redelivered=redelivered), pika.BasicProperties(headers=headers)
+
+class TestDeadLetter(unittest.TestCase):
+    '''
+        purpose: To verify the retry bound on classic queues.
+        process: Asks whether a failed first delivery and a failed redelivery should be requeued.
+        validation: Ensures that only the first delivery is requeued, and none when a single attempt is allowed.
+    '''
+    def test_classic_queue_requeues_once(self):
+        self.assertTrue(should_requeue(*delivery()))
+        self.assertFalse(should_requeue(*delivery(redelivered=True)))
+        self.assertFalse(should_requeue(*delivery(), attempts=1))
+
+    '''
+        purpose: To verify the retry bound on quorum queues, which count deliveries.
+        process: Asks about messages with growing x-delivery-count headers and 3 attempts allowed.
+        validation: Ensures that the message is requeued for the first two deliveries and dead lettered on the third.
+    '''
+    def test_delivery_count_bounds_requeues(self):
+        decisions = [should_requeue(*delivery(True, {"x-delivery-count": count}), attempts=3) for count in range(4)]
+        self.assertEqual(decisions, [True, True, False, False])
+
+    '''
+        purpose: To verify the arguments work queues are declared with.
+        process: Reads the queue arguments.
+        validation: Ensures that rejected messages go to the dead letter exchange.
+    '''
+    def test_queue_arguments(self):
+        self.assertEqual(queue_arguments(), {"x-dead-letter-exchange": DEAD_LETTER_EXCHANGE})
+
+if __name__ == '__main__':
+    unittest.main()
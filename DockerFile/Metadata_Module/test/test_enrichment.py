@@ -0,0 +1,38 @@
+import unittest
+import unittest.mock
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import enrichment
+
+class TestEnrichment(unittest.TestCase):
+    '''
+        purpose: To verify that a job that could not be published is not reported as queued.
+        process: Enqueues an enrichment job while the publisher fails, then while it succeeds.
+        validation: Ensures that enqueue_enrichment returns False without a "queued" status on failure, and True with the status on success.
+    '''
+    def test_enqueue_reports_publish_failure(self):
+        with unittest.mock.patch("enrichment.publish_to_rabbitmq", return_value=False), \
+            unittest.mock.patch("enrichment.statusFeed") as status_feed:
+            self.assertFalse(enrichment.enqueue_enrichment("GE414", "a.pdf", "content-1"))
+            status_feed.messageBuilder.assert_not_called()
+        with unittest.mock.patch("enrichment.publish_to_rabbitmq", return_value=True), \
+            unittest.mock.patch("enrichment.statusFeed") as status_feed:
+            self.assertTrue(enrichment.enqueue_enrichment("GE414", "a.pdf", "content-1"))
+            self.assertEqual(status_feed.messageBuilder.call_args.args[2], "Mission profile enrichment queued")
+
+    '''
+        purpose: To verify that transient LLM failures are retried a bounded number of times.
+        process: Generates a profile with a service that fails once and then answers, and with one that always fails.
+        validation: Ensures that the first returns the profile after two calls and the second gives up with None after the allowed retries.
+    '''
+    def test_generation_retried(self):
+        with unittest.mock.patch.object(enrichment.mission_profiles, "get", side_effect=[None, "An engine."]) as get:
+            self.assertEqual(enrichment.generate_profile("GE414", retries=2, delay=0), "An engine.")
+            self.assertEqual(get.call_count, 2)
+        with unittest.mock.patch.object(enrichment.mission_profiles, "get", return_value=None) as get:
+            self.assertIsNone(enrichment.generate_profile("GE414", retries=2, delay=0))
+            self.assertEqual(get.call_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
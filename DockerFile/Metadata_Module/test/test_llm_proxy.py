@@ -0,0 +1,254 @@
+import unittest
+import unittest.mock
+import asyncio
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import httpx
+from llm_proxy import create_app, OllamaBackend, GenerationQueue, LatencyHistogram, QueueFull, cut_after_sentences
+
+class StubOllama:
+    # Stands in for the Ollama model server: answers /api/generate after a delay and records what it ran
+    def __init__(self, delay=0.05, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.prompts = []
+        self.running = 0
+        self.max_running = 0
+        self.keep_alive = []
+        self.options = []
+        self.answer = "The GE414 is an engine. It powers the F18. It is built by GE."
+        self.streamed = 0
+
+    async def handler(self, request):
+        body = json.loads(request.content)
+        self.keep_alive.append(body.get("keep_alive"))
+        if "prompt" not in body:
+            return httpx.Response(200, json={"done": True})
+        self.options.append(body.get("options"))
+        if body["stream"]:
+            return httpx.Response(200, content=self.stream(body["model"], body["prompt"]))
+        self.prompts.append(body["prompt"])
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        if self.fail:
+            return httpx.Response(500, json={"error": "model crashed"})
+        return httpx.Response(200, json={"response": f"{body['model']}: {body['prompt']}"})
+
+    async def stream(self, model, prompt):
+        # One NDJSON line per word, like Ollama with "stream": true
+        words = self.answer.split(" ")
+        for index, word in enumerate(words):
+            await asyncio.sleep(self.delay / len(words))
+            self.streamed += 1
+            yield (json.dumps({"model": model, "response": (" " if index else "") + word, "done": False}) + "\n").encode()
+        yield (json.dumps({"model": model, "response": "", "done": True}) + "\n").encode()
+
+    def backend(self):
+        return OllamaBackend(base_url="http://ollama", keep_alive="30m", transport=httpx.MockTransport(self.handler))
+
+class TestLLMProxy(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.stub = StubOllama()
+        self.app = create_app("llama2", backend=self.stub.backend(), preload=False)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://proxy")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    '''
+        purpose: To verify that /generate keeps the response format of the previous Flask proxy.
+        process: Posts a prompt to /generate with the stub model server behind the proxy.
+        validation: Ensures that the generated text comes back under generated_text and that the model is asked to stay loaded.
+    '''
+    async def test_generate(self):
+        response = await self.client.post("/generate", json={"input_text": "What is the GE414 engine?"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"generated_text": "llama2: What is the GE414 engine?"})
+        self.assertEqual(self.stub.keep_alive, ["30m"])
+
+    '''
+        purpose: To verify that identical prompts in flight share one generation.
+        process: Sends the same prompt five times concurrently, plus one different prompt.
+        validation: Ensures that every request gets its answer, the model runs only twice and the metrics count four coalesced requests.
+    '''
+    async def test_identical_prompts_coalesced(self):
+        requests = [self.client.post("/generate", json={"input_text": "same"}) for _ in range(5)]
+        requests.append(self.client.post("/generate", json={"input_text": "other"}))
+        responses = await asyncio.gather(*requests)
+        self.assertEqual([r.json()["generated_text"] for r in responses], ["llama2: same"] * 5 + ["llama2: other"])
+        self.assertEqual(sorted(self.stub.prompts), ["other", "same"])
+        metrics = (await self.client.get("/metrics")).json()
+        self.assertEqual(metrics["coalesced"], 4)
+        self.assertEqual(metrics["completed"], 2)
+
+    '''
+        purpose: To verify the per-model concurrency limit and the bounded queue.
+        process: Runs a queue limited to 3 pending generations and 1 running per model, then submits 5 different prompts at once.
+        validation: Ensures that the model never runs two prompts at a time, that 3 prompts complete and 2 are rejected with QueueFull.
+    '''
+    async def test_concurrency_limit_and_bounded_queue(self):
+        queue = GenerationQueue(self.stub.backend(), max_pending=3, concurrency=1)
+        results = await asyncio.gather(*(queue.generate("llama2", f"prompt {i}") for i in range(5)), return_exceptions=True)
+        self.assertEqual(self.stub.max_running, 1)
+        self.assertEqual(sum(isinstance(r, str) for r in results), 3)
+        self.assertEqual(queue.counters["rejected"], 2)
+        self.assertEqual(queue.pending, 0)
+
+    '''
+        purpose: To verify that a full queue is reported to the client.
+        process: Shrinks the queue of the app to one pending generation and sends two different prompts concurrently.
+        validation: Ensures that one request succeeds and the other gets a 503 with a Retry-After header.
+    '''
+    async def test_full_queue_returns_503(self):
+        self.app.state.queue.max_pending = 1
+        responses = await asyncio.gather(
+            self.client.post("/generate", json={"input_text": "a"}),
+            self.client.post("/generate", json={"input_text": "b"}),
+        )
+        self.assertEqual(sorted(r.status_code for r in responses), [200, 503])
+        rejected = next(r for r in responses if r.status_code == 503)
+        self.assertIn("Retry-After", rejected.headers)
+
+    '''
+        purpose: To verify that model server failures surface as errors and are counted.
+        process: Makes the stub model server answer with an error and posts a prompt.
+        validation: Ensures that the proxy answers 500 with an error and the metrics count one failure and an empty queue.
+    '''
+    async def test_backend_failure(self):
+        self.stub.fail = True
+        response = await self.client.post("/generate", json={"input_text": "x"})
+        self.assertEqual(response.status_code, 500)
+        self.assertIn("error", response.json())
+        metrics = (await self.client.get("/metrics")).json()
+        self.assertEqual(metrics["failed"], 1)
+        self.assertEqual(metrics["pending"], 0)
+
+    '''
+        purpose: To verify that streaming mode relays the tokens as they are generated.
+        process: Reads a stream from the queue piece by piece, then posts the same prompt with stream set to /generate.
+        validation: Ensures that the first piece arrives while the model is still generating, that the pieces add up to the full completion and that the endpoint returns it as text.
+    '''
+    async def test_stream_relays_tokens(self):
+        queue = self.app.state.queue
+        pieces = []
+        async for piece in queue.stream("llama2", "x"):
+            if not pieces:
+                self.assertEqual(self.stub.streamed, 1)
+            pieces.append(piece)
+        self.assertEqual(len(pieces), len(self.stub.answer.split(" ")))
+        self.assertEqual("".join(pieces), self.stub.answer)
+        self.assertEqual(queue.latency["first_token"].count, 1)
+        self.assertEqual(queue.pending, 0)
+
+        response = await self.client.post("/generate", json={"input_text": "x", "stream": True})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertEqual(response.text, self.stub.answer)
+
+    '''
+        purpose: To verify the sentence cutoff in both modes.
+        process: Asks for at most two sentences, streamed and as one JSON answer.
+        validation: Ensures that both answers end after the second sentence, that the proxy stopped reading the model stream before the rest was generated and that both gave their place in the queue back.
+    '''
+    async def test_max_sentences_cutoff(self):
+        expected = "The GE414 is an engine. It powers the F18."
+        response = await self.client.post("/generate", json={"input_text": "a", "max_sentences": 2})
+        self.assertEqual(response.json(), {"generated_text": expected})
+        self.assertLess(self.stub.streamed, len(self.stub.answer.split(" ")))
+
+        text = ""
+        async with self.client.stream("POST", "/generate", json={"input_text": "b", "stream": True, "max_sentences": 2}) as response:
+            async for chunk in response.aiter_text():
+                text += chunk
+        self.assertEqual(text, expected)
+        self.assertEqual(self.app.state.queue.pending, 0)
+
+    '''
+        purpose: To verify that abbreviations and initials do not count as sentence ends.
+        process: Cuts a text with "U.S.", "Mk. 4" and "Dr." after one and two sentences, fed word by word and character by character.
+        validation: Ensures that the cut falls after the first and second real sentences, without trailing whitespace, whatever the piece boundaries.
+    '''
+    async def test_sentence_cutoff_skips_abbreviations(self):
+        text = "The U.S. Navy flies the F/A-18. It has Mk. 4 engines by Dr. Smith. A third sentence."
+        async def pieces(parts):
+            for part in parts:
+                yield part
+        words = [(" " if index else "") + word for index, word in enumerate(text.split(" "))]
+        for parts in (words, list(text)):
+            first = "".join([piece async for piece in cut_after_sentences(pieces(parts), 1)])
+            second = "".join([piece async for piece in cut_after_sentences(pieces(parts), 2)])
+            self.assertEqual(first, "The U.S. Navy flies the F/A-18.")
+            self.assertEqual(second, "The U.S. Navy flies the F/A-18. It has Mk. 4 engines by Dr. Smith.")
+
+    '''
+        purpose: To verify that streams count against the queue bound as soon as they are requested.
+        process: Requests three streams from a queue limited to two pending generations without iterating them, then closes one.
+        validation: Ensures that the third stream is rejected with QueueFull and that closing a stream that never started gives its place back.
+    '''
+    async def test_stream_reserved_on_request(self):
+        queue = GenerationQueue(self.stub.backend(), max_pending=2)
+        streams = [queue.stream("llama2", "a"), queue.stream("llama2", "b")]
+        self.assertEqual(queue.pending, 2)
+        with self.assertRaises(QueueFull):
+            queue.stream("llama2", "c")
+        await streams[0].aclose()
+        self.assertEqual(queue.pending, 1)
+        self.assertEqual("".join([piece async for piece in streams[1]]), self.stub.answer)
+        self.assertEqual(queue.pending, 0)
+
+    '''
+        purpose: To verify that token limits and stop sequences are passed to the model server.
+        process: Posts prompts with and without max_tokens and stop, with the server-wide limit patched to 100 tokens.
+        validation: Ensures that the request limit is capped at the server limit, the server limit applies by default and stop sequences are forwarded.
+    '''
+    async def test_token_limit_and_stop(self):
+        with unittest.mock.patch("llm_proxy.LLM_MAX_TOKENS", 100):
+            await self.client.post("/generate", json={"input_text": "a", "max_tokens": 500, "stop": ["\n\n"]})
+            await self.client.post("/generate", json={"input_text": "b", "max_tokens": 20})
+            await self.client.post("/generate", json={"input_text": "c"})
+        self.assertEqual(self.stub.options, [
+            {"num_predict": 100, "stop": ["\n\n"]},
+            {"num_predict": 20},
+            {"num_predict": 100},
+        ])
+
+    '''
+        purpose: To verify that the app loads the model at startup and releases everything at shutdown.
+        process: Runs the lifespan of an app with preloading while a slow generation is in flight, and leaves it.
+        validation: Ensures that the model was loaded with keep_alive, that the in-flight generation is cancelled and that the client to the model server is closed.
+    '''
+    async def test_lifespan_loads_and_closes(self):
+        backend = self.stub.backend()
+        app = create_app("llama2", backend=backend, preload=True)
+        self.stub.delay = 10
+        async with app.router.lifespan_context(app):
+            self.assertEqual(self.stub.keep_alive, ["30m"])
+            generation = asyncio.ensure_future(app.state.queue.generate("llama2", "slow"))
+            await asyncio.sleep(0.05)
+        with self.assertRaises(asyncio.CancelledError):
+            await generation
+        self.assertEqual(app.state.queue.pending, 0)
+        self.assertTrue(backend.client.is_closed)
+
+    '''
+        purpose: To verify the latency histogram buckets.
+        process: Observes latencies below, between and above the bucket bounds.
+        validation: Ensures that the buckets are cumulative and the count and sum match.
+    '''
+    def test_latency_histogram(self):
+        histogram = LatencyHistogram(buckets=(1, 10))
+        for seconds in (0.5, 1, 5, 50):
+            histogram.observe(seconds)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["buckets"], {"le_1": 2, "le_10": 3, "le_+Inf": 4})
+        self.assertEqual(snapshot["count"], 4)
+        self.assertEqual(snapshot["sum"], 56.5)
+
+if __name__ == '__main__':
+    unittest.main()
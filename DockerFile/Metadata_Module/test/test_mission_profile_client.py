@@ -0,0 +1,96 @@
+import unittest
+import unittest.mock
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from mission_profile_client import MissionProfileCache, MissionProfileClient, normalize_entity
+
+class FakeClock:
+    # Stands in for time.time so last_used and created are set explicitly
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class TestMissionProfileClient(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.clock = FakeClock()
+        patch = unittest.mock.patch("mission_profile_client.time.time", self.clock)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def cache(self, **kwargs):
+        cache = MissionProfileCache(path=os.path.join(self.folder.name, "mission_profile_cache.sqlite3"), **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    '''
+        purpose: To verify that the cache keeps the most recently used entries at capacity.
+        process: Fills a cache of two entries, reads the oldest one, then adds a third entry.
+        validation: Ensures that the entry that was neither read nor written last is evicted and the other two are kept.
+    '''
+    def test_lru_eviction_at_capacity(self):
+        cache = self.cache(max_entries=2)
+        for entity in ("ge414", "f404"):
+            cache.put(entity, f"{entity} profile")
+            self.clock.now += 1
+        self.assertEqual(cache.get("ge414"), "ge414 profile")
+        self.clock.now += 1
+        cache.put("j79", "j79 profile")
+        self.assertIsNone(cache.get("f404"))
+        self.assertEqual(cache.get("ge414"), "ge414 profile")
+        self.assertEqual(cache.get("j79"), "j79 profile")
+
+    '''
+        purpose: To verify that cached profiles expire.
+        process: Stores a profile in a cache with a 60 second time to live and reads it before and after it expires.
+        validation: Ensures that reading does not extend the time to live and that the expired entry is dropped from the file.
+    '''
+    def test_ttl_expiry(self):
+        cache = self.cache(ttl=60)
+        cache.put("ge414", "An engine.")
+        self.clock.now += 59
+        self.assertEqual(cache.get("ge414"), "An engine.")
+        self.clock.now += 2
+        self.assertIsNone(cache.get("ge414"))
+        self.clock.now -= 61
+        self.assertIsNone(cache.get("ge414"))
+
+    '''
+        purpose: To verify that spellings of the same entity share a cache key.
+        process: Normalizes names differing in case, whitespace and surrounding punctuation.
+        validation: Ensures that they all fold to the same key while inner punctuation is kept.
+    '''
+    def test_normalize_entity(self):
+        for name in ("GE414 Engine", "  ge414   engine. ", "\"GE414\tEngine\"", "(Ge414 ENGINE)?"):
+            self.assertEqual(normalize_entity(name), "ge414 engine")
+        self.assertEqual(normalize_entity("F/A-18 Hornet"), "f/a-18 hornet")
+
+    '''
+        purpose: To verify the counters behind the hit rate.
+        process: Asks a client with a cache for the same entity under two spellings while the service answers once, then for an entity the service fails on.
+        validation: Ensures that the service is called once per missing entity, and that hits, misses, failures and the hit rate are counted.
+    '''
+    def test_hit_and_miss_counters(self):
+        client = MissionProfileClient(url="http://mission-profile", cache=self.cache())
+        self.addCleanup(client.session.close)
+        with unittest.mock.patch.object(client, "_generate", side_effect=["An engine.", None]) as generate:
+            self.assertEqual(client.get("GE414 Engine"), "An engine.")
+            self.assertEqual(client.get("ge414 engine."), "An engine.")
+            self.assertEqual(client.cached("GE414 ENGINE"), "An engine.")
+            self.assertIsNone(client.get("J79"))
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(client.stats(), {
+            "requests": 4,
+            "hits": 2,
+            "misses": 2,
+            "failures": 1,
+            "hit_rate": 0.5,
+        })
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import unittest.mock
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import pika
+from bson import encode
+import recNparse
+
+class FakeChannel:
+    # Records how deliveries are settled
+    def __init__(self):
+        self.settled = []
+
+    def basic_ack(self, delivery_tag):
+        self.settled.append(("ack", delivery_tag))
+
+    def basic_nack(self, delivery_tag, requeue):
+        self.settled.append(("nack", delivery_tag, requeue))
+
+class TestStoreConsumer(unittest.TestCase):
+    def setUp(self):
+        with unittest.mock.patch("recNparse.pika.BlockingConnection"):
+            self.processor = recNparse.MessageProcessor()
+        # Store folders are created in the working directory
+        self.cwd = os.getcwd()
+        self.folder = tempfile.TemporaryDirectory()
+        os.chdir(self.folder.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.folder.cleanup()
+
+    '''
+        purpose: To verify that a store message failing every time does not loop forever in the long-lived consumer.
+        process: Delivers a store message whose payload is missing from the blob store, first as a new delivery and then as a redelivery.
+        validation: Ensures that the first delivery is requeued and the redelivery is nacked without requeue, so it goes to the dead letter queue.
+    '''
+    def test_poison_message_dead_lettered(self):
+        body = encode({"content_id": "c1", "file_name": "a.pdf", "PayloadRef": "sha256:" + "1" * 64})
+        channel = FakeChannel()
+        for redelivered in (False, True):
+            method = pika.spec.Basic.Deliver(delivery_tag=3, redelivered=redelivered)
+            with unittest.mock.patch("recNparse.resolve_payload", side_effect=FileNotFoundError("blob missing")):
+                self.processor.process_store(channel, method, pika.BasicProperties(), body)
+        self.assertEqual(channel.settled, [("nack", 3, True), ("nack", 3, False)])
+
+if __name__ == '__main__':
+    unittest.main()
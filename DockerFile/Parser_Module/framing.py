@@ -0,0 +1,97 @@
+"""
+Wire format between the uploaders and the parser.
+
+Every frame is a single BSON document, which already starts with its own
+4-byte little-endian length. A connection can carry any number of job
+frames; for every job the parser answers with an ack frame on the same
+connection:
+    {
+        "ID": "ObjectID",          # ID of the acknowledged job
+        "Status": "Received" | "Failed",
+        "Message": "String",
+        "time": "String"
+    }
+
+Jobs too big for one BSON document can be sent in chunked mode instead:
+    {"FrameType": "JobHeader", "ID": job_id, "Job": job}
+        the job with "PayloadChunked": True in place of each large Payload
+    {"FrameType": "Chunk", "ID": job_id, "DataType": "Documents", "Index": 0, "Data": bytes}
+        one or more per chunked item, in order
+    {"FrameType": "JobEnd", "ID": job_id}
+        the job is complete and is acked like a single-frame job
+Frames without a FrameType are plain single-frame jobs.
+"""
+
+import os
+import datetime
+from bson import encode
+
+# Largest job we accept in one frame, checked against the length prefix before reading the body
+MAX_FRAME_SIZE = int(os.environ.get("PARSER_MAX_FRAME_SIZE", 1 << 30))
+# Acks are tiny, anything bigger means the stream is out of sync
+MAX_ACK_SIZE = 1 << 16
+
+ACK_RECEIVED = "Received"
+ACK_FAILED = "Failed"
+
+FRAME_JOB_HEADER = "JobHeader"
+FRAME_CHUNK = "Chunk"
+FRAME_JOB_END = "JobEnd"
+# Payloads are split into chunks of this size in chunked mode
+CHUNK_SIZE = 1 << 20
+
+
+class FrameTooLargeError(Exception):
+    pass
+
+
+def check_frame_length(expected_length, max_frame_size):
+    # A BSON document is at least 5 bytes: the int32 length and the trailing null
+    if expected_length < 5:
+        raise Exception(f"Invalid BSON document length {expected_length}")
+    if expected_length > max_frame_size:
+        raise FrameTooLargeError(
+            f"Job of {expected_length} bytes exceeds the {max_frame_size} byte frame limit"
+        )
+
+
+def recv_into_view(sock, view):
+    # Fill the whole memoryview from the socket without intermediate copies
+    while len(view):
+        received = sock.recv_into(view)
+        if not received:
+            raise Exception("Socket closed before we received the complete document")
+        view = view[received:]
+
+
+def recv_frame(sock, max_frame_size=None):
+    """
+    Receive one length-prefixed BSON document into a single preallocated buffer.
+    Returns None if the peer closed the connection before sending anything.
+    """
+    length_data = bytearray(4)
+    received = sock.recv_into(length_data)
+    if not received:
+        return None
+    recv_into_view(sock, memoryview(length_data)[received:])
+
+    # Determine the expected length of the BSON document
+    expected_length = int.from_bytes(length_data, byteorder="little")
+    check_frame_length(expected_length, max_frame_size or MAX_FRAME_SIZE)
+
+    # The length prefix is part of the document, so copy it in and fill the rest
+    bson_data = bytearray(expected_length)
+    bson_data[:4] = length_data
+    recv_into_view(sock, memoryview(bson_data)[4:])
+    return bson_data
+
+
+def build_ack(job_id, status, message):
+    return encode(
+        {
+            "ID": job_id,
+            "Status": status,
+            "Message": message,
+            "time": datetime.datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p"),
+        }
+    )
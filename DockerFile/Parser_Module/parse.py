@@ -1,45 +1,146 @@
 import socket
+import asyncio  # Event loop for the ingest server
+import os
+import signal
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
 from bson import BSON, encode, decode  # Binary JSON format , windows
 import threading  # For handling multiple clients concurrently
 import pika  # RabbitMQ client library
 from pika.exchange_type import ExchangeType
 from copy import deepcopy  # Import deepcopy if you need a deep copy
 import datetime
+import sys
+from publisher_pool import PublisherPool, ConfirmPublisher
+from framing import (
+    MAX_FRAME_SIZE,
+    ACK_RECEIVED,
+    ACK_FAILED,
+    FrameTooLargeError,
+    check_frame_length,
+    recv_into_view,
+    recv_frame,
+    build_ack,
+    FRAME_JOB_HEADER,
+    FRAME_CHUNK,
+    FRAME_JOB_END,
+)
 
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../Metadata_Module"))
+)
+from blob_store import offload_payload
+from id_service import ContentHasher
 
-def recvall(sock, expected_length):
-    data = b""
-    while len(data) < expected_length:
-        more_data = sock.recv(expected_length - len(data))
-        if not more_data:
-            raise Exception("Socket closed before we received the complete document")
-        data += more_data
-    return data
+# With publisher confirms (the default) a job is only acked once the broker has
+# persisted all of its messages; PARSER_PUBLISH_CONFIRMS=0 falls back to
+# plain publishes on a pool where every thread reuses its own connection
+PUBLISH_CONFIRMS = os.environ.get("PARSER_PUBLISH_CONFIRMS", "1") != "0"
+CONFIRM_TIMEOUT = float(os.environ.get("PARSER_CONFIRM_TIMEOUT", 30))
+publisher = ConfirmPublisher("localhost") if PUBLISH_CONFIRMS else PublisherPool("localhost")
 
+# Ingest server settings, overridable from the environment
+INGEST_HOST = os.environ.get("PARSER_HOST", "localhost")
+INGEST_PORT = int(os.environ.get("PARSER_PORT", 12349))
+MAX_CONNECTIONS = int(os.environ.get("PARSER_MAX_CONNECTIONS", 256))
+MAX_CONCURRENT_JOBS = int(os.environ.get("PARSER_MAX_CONCURRENT_JOBS", 32))
+PUBLISH_WORKERS = int(os.environ.get("PARSER_PUBLISH_WORKERS", 8))
+DRAIN_TIMEOUT = float(os.environ.get("PARSER_DRAIN_TIMEOUT", 30))
+# Where payloads of chunked jobs are spooled until the job is complete
+SPOOL_DIR = os.environ.get("PARSER_SPOOL_DIR", tempfile.gettempdir())
 
-def handle_client(client):
-    # Initially, receive the length of the BSON document (first 4 bytes)
-    length_data = client.recv(4)
-    if len(length_data) < 4:
-        print("Failed to receive the complete length of BSON document")
-        return
 
-    # Determine the expected length of the BSON document
-    expected_length = int.from_bytes(length_data, byteorder="little")
+def recvall(sock, expected_length):
+    data = bytearray(expected_length)
+    recv_into_view(sock, memoryview(data))
+    return data
 
-    # Receive the rest of the BSON document based on its length
-    bson_data = length_data + recvall(client, expected_length - 4)
 
+def handle_client(client):
     try:
-        obj = decode(bson_data)
+        bson_data = recv_frame(client)
+        if bson_data is None:
+            print("Failed to receive the complete length of BSON document")
+            return
+        obj = strip_internal_fields(decode(bson_data))
         parse_bson_obj(obj)
     except Exception as e:
         print(f"Error decoding BSON: {e}")
+    finally:
+        client.close()
+
+
+def strip_internal_fields(job):
+    # PayloadSpool and PayloadRef are set by the parser itself, never trust them from the wire
+    for items in job.values():
+        if isinstance(items, list):
+            for item in items:
+                if isinstance(item, dict):
+                    item.pop("PayloadSpool", None)
+                    item.pop("PayloadRef", None)
+    return job
+
+
+class SpooledJob:
+    """
+    A chunked job being received. Payload chunks are appended to one spool
+    file per item, so the parser never holds a whole job in memory; items
+    only point at their spool file once the job is complete. Each payload is
+    hashed as its chunks arrive, so the blob store does not read it again.
+    """
+
+    def __init__(self, job):
+        self.job = strip_internal_fields(job)
+        self.files = {}
+        self.hashers = {}
+
+    def write_chunk(self, data_type, index, data):
+        spool_file = self.files.get((data_type, index))
+        if spool_file is None:
+            # Make sure the item was announced in the header before spooling for it
+            self.job[data_type][index]
+            spool_file = tempfile.NamedTemporaryFile(
+                dir=SPOOL_DIR, prefix="parser_spool_", delete=False
+            )
+            self.files[(data_type, index)] = spool_file
+            self.hashers[(data_type, index)] = ContentHasher()
+        spool_file.write(data)
+        self.hashers[(data_type, index)].update(data)
+
+    def finish(self):
+        for spool_file in self.files.values():
+            spool_file.close()
+        for data_type, items in self.job.items():
+            if not isinstance(items, list):
+                continue
+            for index, item in enumerate(items):
+                if isinstance(item, dict) and item.pop("PayloadChunked", False):
+                    spool_file = self.files.get((data_type, index))
+                    if spool_file is None:
+                        item["Payload"] = b""  # empty file, no chunks were sent
+                    else:
+                        item["PayloadSpool"] = spool_file.name
+                        item["PayloadRef"] = self.hashers[(data_type, index)].hexdigest()
+        return self.job
+
+    def discard(self):
+        for spool_file in self.files.values():
+            try:
+                spool_file.close()
+                if os.path.exists(spool_file.name):  # published spools were moved to the blob store
+                    os.remove(spool_file.name)
+            except OSError as e:
+                print(f"Could not remove spool file {spool_file.name}: {e}")
+        self.files.clear()
 
 
 # Function to parse BSON object and publish data to RabbitMQ
 def parse_bson_obj(obj):
     try:
+        # All messages of the job are published as one batch
+        messages = []
+
         # Dictionary mapping data types to routing keys
         data_types = {
             "Documents": ".Document.",
@@ -48,14 +149,12 @@ def parse_bson_obj(obj):
             "Video": ".Video.",
         }
 
-        # Connect to RabbitMQ
-        connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
-        channel = connection.channel()
-
         # Iterate through each data type and publish relevant items
         for data_type, routing_key in data_types.items():
             if obj[data_type]:
                 for item in obj[data_type]:
+                    # Payloads go to the blob store, the message only carries the PayloadRef
+                    item = offload_payload(item)
                     # Prepare dashboard message with time
                     dashboard_message = {
                         "time": datetime.datetime.now().strftime(
@@ -74,25 +173,36 @@ def parse_bson_obj(obj):
                     }
 
                     # Send to dashboard
-                    channel.basic_publish(
-                        exchange="",
-                        routing_key="Dashboard",
-                        body=encode(dashboard_message),
-                        properties=pika.BasicProperties(delivery_mode=2),
+                    messages.append(
+                        (
+                            "",
+                            "Dashboard",
+                            encode(dashboard_message),
+                            pika.BasicProperties(delivery_mode=2),
+                        )
                     )
 
                     # Send original item to content queue
-                    channel.basic_publish(
-                        exchange="Topic",
-                        routing_key=routing_key,
-                        body=encode(item),
-                        properties=pika.BasicProperties(delivery_mode=2),
+                    messages.append(
+                        (
+                            "Topic",
+                            routing_key,
+                            encode(item),
+                            pika.BasicProperties(delivery_mode=2),
+                        )
                     )
 
             else:
                 print(f"No {data_type.lower()} to send")
 
-        connection.close()
+        future = publisher.publish_batch(messages)
+        try:
+            latency = future.result(CONFIRM_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            future.cancel()  # do not publish it late if it is still waiting for the broker
+            raise TimeoutError(f"Broker did not confirm the job within {CONFIRM_TIMEOUT}s")
+        print(f"Published job {obj.get('ID')}: {len(messages)} messages in {latency * 1000:.1f} ms")
+        return True
 
     except Exception as e:
         print(f"Error in parse_bson_obj: {e}")
@@ -105,32 +215,29 @@ def parse_bson_obj(obj):
                 "message": str(e),
             }
 
-            connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
-            channel = connection.channel()
-            channel.basic_publish(
-                exchange="",
-                routing_key="Dashboard",
-                body=encode(error_message),
-                properties=pika.BasicProperties(delivery_mode=2),
+            # Not waited for: with the broker down every failing job would
+            # block its worker again for the confirm timeout
+            status = publisher.publish_batch(
+                [("", "Dashboard", encode(error_message), pika.BasicProperties(delivery_mode=2))]
             )
-            connection.close()
+            status.add_done_callback(report_status_failure)
         except Exception as e2:
             print(f"Error sending error status: {e2}")
+        return False
+
+
+def report_status_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Error sending error status: {future.exception()}")
 
 
 # Function to publish messages to RabbitMQ
 def publish_to_rabbitmq(routing_key, message):
     try:
-        # Establish a connection to the RabbitMQ server
-        connection_parameters = pika.ConnectionParameters("localhost")
-        connection = pika.BlockingConnection(connection_parameters)
-
-        # Create a channel for communication with RabbitMQ
-        channel = connection.channel()
-
         # prepping status message
+        message = offload_payload(message)
         status_message = message.copy()
-        del status_message["Payload"]  # remove payload from status message
+        status_message.pop("PayloadRef", None)  # remove payload from status message
         status_message["Status"] = "Preprocessed Successfully"
         status_message["Message"] = (
             "Message has been preprocessed and sent to the respective queues"
@@ -139,7 +246,7 @@ def publish_to_rabbitmq(routing_key, message):
         status_message = encode(status_message)
 
         # Serialize the message to BSON
-        message = encode(message)
+        body = encode(message)
 
         """
             Sample message  to be sent to the respective queues
@@ -148,11 +255,12 @@ def publish_to_rabbitmq(routing_key, message):
                 "DocumentId": "ObjectID",
                 "DocumentType": "String",
                 "file_name": "String",
-                "Payload": "String"
+                "PayloadRef": "sha256:<hex digest>",
+                "PayloadSize": "Int"
             }
         """
         # Publish the message to the specified routing key
-        channel.basic_publish(exchange="Topic", routing_key=routing_key, body=message)
+        publisher.publish(exchange="Topic", routing_key=routing_key, body=body)
         """
         This will be sent to the dashboard
             {
@@ -165,9 +273,7 @@ def publish_to_rabbitmq(routing_key, message):
             }
         """
         # publish status message to dashboard
-        channel.basic_publish(
-            exchange="Topic", routing_key=".Status.", body=status_message
-        )
+        publisher.publish(exchange="Topic", routing_key=".Status.", body=status_message)
 
     except Exception as e:
         """
@@ -182,33 +288,240 @@ def publish_to_rabbitmq(routing_key, message):
             }
         """
         status_message = message.copy()
-        del status_message["Payload"]
+        status_message.pop("Payload", None)
+        status_message.pop("PayloadRef", None)
         status_message["Status"] = "Preprocessing Failed"
-        status_message["Message"] = e
+        status_message["Message"] = str(e)
         status_message = encode(status_message)
-        channel.basic_publish(
-            exchange="Topic", routing_key=".Status.", body=status_message
+        publisher.publish(exchange="Topic", routing_key=".Status.", body=status_message)
+
+
+class IngestServer:
+    """
+    asyncio ingest server for length-prefixed BSON jobs.
+
+    Connections are handled as coroutines instead of one thread each, and
+    at most max_concurrent_jobs jobs are read and published at a time. When
+    the broker is slow the job slots stay taken, we stop reading from the
+    sockets and TCP flow control pushes back on the uploaders. Publishing
+    itself is blocking pika code, so it runs on a small thread pool.
+    """
+
+    def __init__(
+        self,
+        host=INGEST_HOST,
+        port=INGEST_PORT,
+        max_connections=MAX_CONNECTIONS,
+        max_concurrent_jobs=MAX_CONCURRENT_JOBS,
+        publish_workers=PUBLISH_WORKERS,
+        drain_timeout=DRAIN_TIMEOUT,
+        max_frame_size=MAX_FRAME_SIZE,
+    ):
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.publish_workers = publish_workers
+        self.drain_timeout = drain_timeout
+        self.max_frame_size = max_frame_size
+
+        self.connections = set()  # running connection tasks
+        self.jobs = set()  # jobs being published
+        self.listening = threading.Event()  # set once the socket is bound
+
+    async def recv_into_view(self, conn, view):
+        while len(view):
+            received = await self.loop.sock_recv_into(conn, view)
+            if not received:
+                raise Exception("Socket closed before we received the complete document")
+            view = view[received:]
+
+    async def read_length(self, conn):
+        """Wait for the next frame's length prefix, or return None if the peer closed the connection."""
+        length_data = bytearray(4)
+        received = await self.loop.sock_recv_into(conn, length_data)
+        if not received:
+            return None
+        await self.recv_into_view(conn, memoryview(length_data)[received:])
+        return length_data
+
+    async def read_body(self, conn, length_data):
+        # Reject oversized jobs before allocating or reading the body
+        expected_length = int.from_bytes(length_data, byteorder="little")
+        check_frame_length(expected_length, self.max_frame_size)
+
+        bson_data = bytearray(expected_length)
+        bson_data[:4] = length_data
+        await self.recv_into_view(conn, memoryview(bson_data)[4:])
+        return bson_data
+
+    async def handle_connection(self, conn, addr):
+        """
+        Read jobs off one connection until the client closes it. Jobs are
+        pipelined: the next frame is read while earlier ones are still being
+        published, and each job is acked by ID as soon as it is done.
+        """
+        send_lock = asyncio.Lock()
+        jobs = set()
+        spooled_jobs = {}  # chunked jobs still receiving payload chunks
+        try:
+            while not self.stopping.is_set():
+                length_data = await self.read_length(conn)
+                if length_data is None:
+                    break
+                # Wait for a free job slot before reading the body, this is the backpressure point
+                await self.job_slots.acquire()
+                try:
+                    bson_data = await self.read_body(conn, length_data)
+                except BaseException:
+                    self.job_slots.release()
+                    raise
+
+                job_id = None
+                try:
+                    obj = decode(bson_data)
+                    del bson_data
+                    job_id = obj.get("ID")
+                    frame_type = obj.get("FrameType")
+                    spooled_job = None
+                    if frame_type == FRAME_JOB_HEADER:
+                        spooled_jobs[job_id] = SpooledJob(obj["Job"])
+                    elif frame_type == FRAME_CHUNK:
+                        spooled_jobs[job_id].write_chunk(obj["DataType"], obj["Index"], obj["Data"])
+                    elif frame_type == FRAME_JOB_END:
+                        spooled_job = spooled_jobs.pop(job_id)
+                        obj = spooled_job.finish()
+                    else:
+                        strip_internal_fields(obj)
+                except Exception as e:
+                    self.job_slots.release()
+                    print(f"Error decoding BSON: {e}")
+                    failed_job = spooled_jobs.pop(job_id, None)
+                    if failed_job is not None:
+                        failed_job.discard()
+                    await self.send_ack(conn, send_lock, build_ack(job_id, ACK_FAILED, str(e)))
+                    continue
+
+                if frame_type in (FRAME_JOB_HEADER, FRAME_CHUNK):
+                    self.job_slots.release()
+                    continue
+
+                task = asyncio.ensure_future(self.process_job(conn, obj, send_lock, spooled_job))
+                jobs.add(task)
+                self.jobs.add(task)
+                task.add_done_callback(jobs.discard)
+                task.add_done_callback(self.jobs.discard)
+                del obj
+            if jobs:
+                await asyncio.wait(set(jobs))
+        except FrameTooLargeError as e:
+            print(f"Rejected job from {addr}: {e}")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error handling client {addr}: {e}")
+        finally:
+            # Jobs the client never finished sending are dropped with their spool files
+            for spooled_job in spooled_jobs.values():
+                spooled_job.discard()
+            conn.close()
+            self.connection_slots.release()
+
+    async def process_job(self, conn, obj, send_lock, spooled_job=None):
+        job_id = obj.get("ID")
+        try:
+            published = await self.loop.run_in_executor(
+                self.executor, parse_bson_obj, obj
+            )
+            if published:
+                ack = build_ack(job_id, ACK_RECEIVED, "Job has been sent to the respective queues")
+            else:
+                ack = build_ack(job_id, ACK_FAILED, "Job could not be published")
+        except Exception as e:
+            print(f"Error processing job {job_id}: {e}")
+            ack = build_ack(job_id, ACK_FAILED, str(e))
+        finally:
+            self.job_slots.release()
+            if spooled_job is not None:
+                spooled_job.discard()
+        await self.send_ack(conn, send_lock, ack)
+
+    async def send_ack(self, conn, send_lock, ack):
+        try:
+            async with send_lock:
+                await self.loop.sock_sendall(conn, ack)
+        except OSError:
+            pass  # one-shot clients close the connection without waiting for the ack
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        self.job_slots = asyncio.Semaphore(self.max_concurrent_jobs)
+        self.connection_slots = asyncio.Semaphore(self.max_connections)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.publish_workers, thread_name_prefix="publisher"
         )
-    # Close the connection to RabbitMQ
-    connection.close()
 
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows, or not on the main thread
 
-# Function to start a socket server and listen for incoming BSON objects
-def receive_bson_obj():
-    # Create a TCP/IP socket
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        # Bind the socket to localhost on port 12345
-        s.bind(("localhost", 12349))
-        # Listen for incoming connections
-        s.listen()
-
-        # Continuously accept new connections
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host, self.port))
+        self.port = server.getsockname()[1]
+        server.listen(self.max_connections)
+        server.setblocking(False)
+        self.listening.set()
+        print(f"Parser listening on {self.host}:{self.port}")
+
+        accept_task = asyncio.ensure_future(self._accept_loop(server))
+        try:
+            await self.stopping.wait()
+        finally:
+            accept_task.cancel()
+            server.close()
+            await self.drain()
+
+    async def _accept_loop(self, server):
         while True:
-            # Accept a connection
-            conn, addr = s.accept()
+            await self.connection_slots.acquire()
+            conn, addr = await self.loop.sock_accept(server)
+            conn.setblocking(False)
             print("Connected by", addr)
-            # Handle each client connection in a separate thread
-            threading.Thread(target=handle_client, args=(conn,)).start()
+            task = asyncio.ensure_future(self.handle_connection(conn, addr))
+            self.connections.add(task)
+            task.add_done_callback(self.connections.discard)
+
+    async def drain(self):
+        """Let in-flight jobs finish publishing, then release the broker connections."""
+        if self.jobs:
+            print(f"Draining {len(self.jobs)} job(s)...")
+            done, pending = await asyncio.wait(set(self.jobs), timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+        # Whatever is left is idle persistent connections waiting for their next job
+        for task in list(self.connections):
+            task.cancel()
+        if self.connections:
+            await asyncio.wait(set(self.connections))
+        self.executor.shutdown(wait=True)
+        publisher.close()
+        print("Parser stopped")
+
+    def stop(self):
+        # Safe to call from another thread as well as from a signal handler
+        self.loop.call_soon_threadsafe(self.stopping.set)
+
+
+# Function to start the ingest server and listen for incoming BSON objects
+def receive_bson_obj():
+    try:
+        asyncio.run(IngestServer().serve())
+    except KeyboardInterrupt:
+        print("Server stopping...")
 
 
 # Main function to start the server
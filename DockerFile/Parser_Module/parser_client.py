@@ -0,0 +1,307 @@
+import socket
+import asyncio
+import inspect
+import threading
+from bson import encode, decode  # Binary JSON format
+from framing import (
+    MAX_ACK_SIZE,
+    ACK_RECEIVED,
+    FRAME_JOB_HEADER,
+    FRAME_CHUNK,
+    FRAME_JOB_END,
+    CHUNK_SIZE,
+    check_frame_length,
+    recv_frame,
+)
+
+DATA_TYPES = ("Documents", "Images", "Audio", "Video")
+
+
+def split_job(job):
+    """
+    Split a job for chunked mode. Returns the header job, where every binary
+    or file-like Payload is replaced by "PayloadChunked": True, and the list
+    of (data_type, index, payload) sources to stream after it.
+    """
+    header = dict(job)
+    sources = []
+    for data_type in DATA_TYPES:
+        if data_type not in job:
+            continue
+        items = []
+        for index, item in enumerate(job[data_type] or []):
+            payload = item.get("Payload")
+            if isinstance(payload, (bytes, bytearray, memoryview)) or hasattr(payload, "read"):
+                item = {key: value for key, value in item.items() if key != "Payload"}
+                item["PayloadChunked"] = True
+                sources.append((data_type, index, payload))
+            items.append(item)
+        header[data_type] = items
+    return header, sources
+
+
+def chunk_frame(job_id, data_type, index, data):
+    return encode(
+        {
+            "FrameType": FRAME_CHUNK,
+            "ID": job_id,
+            "DataType": data_type,
+            "Index": index,
+            "Data": bytes(data),
+        }
+    )
+
+
+def iter_chunks(payload, chunk_size):
+    if hasattr(payload, "read"):
+        while True:
+            data = payload.read(chunk_size)
+            if not data:
+                break
+            yield data
+    else:
+        view = memoryview(payload)
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+
+
+async def iter_chunks_async(payload, chunk_size):
+    # Same as iter_chunks, but also accepts async file objects such as FastAPI's UploadFile
+    if hasattr(payload, "read"):
+        while True:
+            data = payload.read(chunk_size)
+            if inspect.isawaitable(data):
+                data = await data
+            if not data:
+                break
+            yield data
+    else:
+        for data in iter_chunks(payload, chunk_size):
+            yield data
+
+
+class ParserClient:
+    """
+    Persistent connection to the parser for blocking callers (GUI, scripts).
+
+    Jobs are written back to back on one reused connection and the call
+    returns once the parser has acked every job ID, so the caller knows the
+    job actually reached the queues instead of firing and forgetting.
+    """
+
+    def __init__(self, host="localhost", port=12349, timeout=120):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect((self.host, self.port))
+        self.sock = sock
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _send_and_wait(self, frames, job_ids):
+        for frame in frames:
+            self.sock.sendall(frame)
+
+        pending = list(job_ids)
+        acks = {}
+        while pending:
+            frame = recv_frame(self.sock, MAX_ACK_SIZE)
+            if frame is None:
+                raise ConnectionError("Parser closed the connection before acknowledging the job")
+            ack = decode(frame)
+            if ack.get("ID") in pending:
+                pending.remove(ack.get("ID"))
+                acks[ack.get("ID")] = ack
+        return [acks[job_id] for job_id in job_ids]
+
+    def _send(self, make_frames, job_ids):
+        with self.lock:
+            reused = self.sock is not None
+            if not reused:
+                self.connect()
+            try:
+                return self._send_and_wait(make_frames(), job_ids)
+            except ConnectionError:
+                # The parser may have dropped an idle connection, retry once on a fresh one
+                self.close()
+                if not reused:
+                    raise
+            except OSError:
+                self.close()
+                raise
+            self.connect()
+            try:
+                return self._send_and_wait(make_frames(), job_ids)
+            except OSError:
+                self.close()
+                raise
+
+    def send_jobs(self, jobs):
+        """Pipeline several jobs over the connection and return their acks in order."""
+        frames = [encode(job) for job in jobs]
+        return self._send(lambda: frames, [job["ID"] for job in jobs])
+
+    def send_job(self, job):
+        return self.send_jobs([job])[0]
+
+    def send_job_chunked(self, job, chunk_size=CHUNK_SIZE):
+        """
+        Send a job in chunked mode, streaming every binary or file-like Payload
+        in chunk_size pieces. Use this for jobs that do not fit in one BSON
+        document; file payloads are read as they are sent.
+        """
+        job_id = job["ID"]
+        header, sources = split_job(job)
+        # Remember where file payloads start so a retry can rewind them
+        positions = [
+            payload.tell() if hasattr(payload, "seek") else None
+            for _, _, payload in sources
+        ]
+
+        def make_frames():
+            for (_, _, payload), position in zip(sources, positions):
+                if position is not None:
+                    payload.seek(position)
+            yield encode({"FrameType": FRAME_JOB_HEADER, "ID": job_id, "Job": header})
+            for data_type, index, payload in sources:
+                for data in iter_chunks(payload, chunk_size):
+                    yield chunk_frame(job_id, data_type, index, data)
+            yield encode({"FrameType": FRAME_JOB_END, "ID": job_id})
+
+        return self._send(make_frames, [job_id])[0]
+
+
+class AsyncParserClient:
+    """
+    Persistent connection to the parser for asyncio callers (the FastAPI backend).
+
+    Concurrent requests share the connection: writes are serialized and a
+    background task routes every ack back to the request waiting on its job ID.
+    """
+
+    def __init__(self, host="localhost", port=12349, timeout=120):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.writer = None
+        self.pending = {}  # job ID -> future, of the current connection only
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        # Each connection routes the acks of the jobs sent on it
+        self.pending = {}
+        self.reader_task = asyncio.ensure_future(self._read_acks(reader, self.writer, self.pending))
+
+    async def _read_acks(self, reader, writer, pending):
+        try:
+            while True:
+                length_data = await reader.readexactly(4)
+                expected_length = int.from_bytes(length_data, byteorder="little")
+                check_frame_length(expected_length, MAX_ACK_SIZE)
+                ack = decode(length_data + await reader.readexactly(expected_length - 4))
+                future = pending.pop(ack.get("ID"), None)
+                if future is not None and not future.done():
+                    future.set_result(ack)
+        except Exception as e:
+            # Connection is gone, fail the jobs sent on it; jobs on a newer
+            # connection are not affected
+            if self.writer is writer:
+                self.writer = None
+            writer.close()
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError(f"Parser connection lost before the job was acknowledged: {e!r}")
+                    )
+            pending.clear()
+
+    async def _write(self, job_id, frame):
+        if self.writer is None or self.writer.is_closing():
+            await self.connect()
+        # Registered before writing, the ack may come back right away
+        pending = self.pending
+        future = pending[job_id] = asyncio.get_running_loop().create_future()
+        try:
+            self.writer.write(frame)
+            await self.writer.drain()
+        except BaseException:
+            pending.pop(job_id, None)
+            raise
+        return future, pending
+
+    async def _register_and_write(self, job_id, frame):
+        async with self.lock:
+            try:
+                future, pending = await self._write(job_id, frame)
+            except (OSError, ConnectionError):
+                # Stale connection, retry once on a fresh one
+                self.writer = None
+                future, pending = await self._write(job_id, frame)
+            return future, self.writer, pending
+
+    async def _wait_ack(self, job_id, future, pending):
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            # Timed out or cancelled: the ack will not be waited for
+            if pending.get(job_id) is future:
+                del pending[job_id]
+
+    async def send_job(self, job):
+        future, _, pending = await self._register_and_write(job["ID"], encode(job))
+        return await self._wait_ack(job["ID"], future, pending)
+
+    async def send_job_chunked(self, job, chunk_size=CHUNK_SIZE):
+        """
+        Send a job in chunked mode. Payloads may be bytes or (async) file
+        objects and are read chunk by chunk as they are written, so only one
+        chunk per upload is in memory. Frames of concurrent uploads interleave
+        on the shared connection.
+        """
+        job_id = job["ID"]
+        header, sources = split_job(job)
+        future, writer, pending = await self._register_and_write(
+            job_id, encode({"FrameType": FRAME_JOB_HEADER, "ID": job_id, "Job": header})
+        )
+
+        async def write(frame):
+            async with self.lock:
+                # The header went out on this connection, the rest has to follow it
+                if self.writer is not writer:
+                    raise ConnectionError("Parser connection lost while sending the job")
+                writer.write(frame)
+                await writer.drain()
+
+        try:
+            for data_type, index, payload in sources:
+                async for data in iter_chunks_async(payload, chunk_size):
+                    await write(chunk_frame(job_id, data_type, index, data))
+            await write(encode({"FrameType": FRAME_JOB_END, "ID": job_id}))
+        except BaseException:
+            pending.pop(job_id, None)
+            future.cancel()
+            raise
+        return await self._wait_ack(job_id, future, pending)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.writer = None
+
+
+def ack_ok(ack):
+    return ack.get("Status") == ACK_RECEIVED
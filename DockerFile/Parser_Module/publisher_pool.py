@@ -0,0 +1,325 @@
+import threading  # For per-thread connections
+import time
+import logging
+import concurrent.futures
+from concurrent.futures import Future
+import pika  # RabbitMQ client library
+from pika.exceptions import AMQPConnectionError, AMQPChannelError
+
+logging.getLogger("pika").setLevel(logging.WARNING)
+
+
+class PublisherPool:
+    """
+    Long-lived RabbitMQ publishers shared by every thread of the parser.
+
+    pika's BlockingConnection is not thread-safe, so each worker thread lazily
+    opens its own connection and channel the first time it publishes and then
+    keeps reusing them for every following job. If the broker drops a
+    connection the publish is retried on a fresh one with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        host="localhost",
+        max_retries=5,
+        initial_backoff=0.5,
+        max_backoff=30.0,
+    ):
+        self.connection_params = pika.ConnectionParameters(
+            host, heartbeat=600, blocked_connection_timeout=300
+        )
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = set()  # every open connection, so close() can reach them
+
+    def _connect(self):
+        connection = pika.BlockingConnection(self.connection_params)
+        channel = connection.channel()
+        self._local.connection = connection
+        self._local.channel = channel
+        with self._lock:
+            self._connections.add(connection)
+        return channel
+
+    def _discard(self):
+        # Drop this thread's connection so the next publish reconnects
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        self._local.channel = None
+        if connection is None:
+            return
+        with self._lock:
+            self._connections.discard(connection)
+        try:
+            if connection.is_open:
+                connection.close()
+        except Exception:
+            pass
+
+    def channel(self):
+        """Return the calling thread's channel, opening it if needed."""
+        channel = getattr(self._local, "channel", None)
+        if channel is None or not channel.is_open:
+            self._discard()
+            channel = self._connect()
+        return channel
+
+    def publish(self, exchange, routing_key, body, properties=None):
+        backoff = self.initial_backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.channel().basic_publish(
+                    exchange=exchange,
+                    routing_key=routing_key,
+                    body=body,
+                    properties=properties,
+                )
+                return
+            except (AMQPConnectionError, AMQPChannelError) as e:
+                self._discard()
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(
+                    f"Publish to '{routing_key}' failed ({e!r}), reconnecting in {backoff:.1f}s"
+                )
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def publish_batch(self, messages):
+        """
+        Publish (exchange, routing_key, body, properties) messages one after the
+        other. Returns an already completed Future holding the elapsed seconds,
+        the same interface as ConfirmPublisher.publish_batch.
+        """
+        started = time.perf_counter()
+        future = Future()
+        try:
+            for exchange, routing_key, body, properties in messages:
+                self.publish(exchange, routing_key, body, properties)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(time.perf_counter() - started)
+        return future
+
+    def close(self):
+        """Close every connection opened by the pool (used on shutdown)."""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for connection in connections:
+            try:
+                if connection.is_open:
+                    connection.close()
+            except Exception as e:
+                logging.error(f"Error closing RabbitMQ connection: {e}")
+
+
+class PublishBatch:
+    # Messages of one job and the Future resolved once the broker confirmed all of them
+    def __init__(self, messages):
+        self.messages = messages
+        self.pending = len(messages)
+        self.future = Future()
+        self.started = time.perf_counter()
+
+    def confirm(self):
+        self.pending -= 1
+        if self.pending == 0 and not self.future.done():
+            self.future.set_result(time.perf_counter() - self.started)
+
+    def fail(self, error):
+        if not self.future.done():
+            self.future.set_exception(error)
+
+
+class ConfirmPublisher:
+    """
+    Publisher with RabbitMQ publisher confirms, for callers that need to know
+    their messages were persisted by the broker.
+
+    A single asynchronous connection runs on its own IO thread. publish_batch
+    hands over all messages of a job at once and returns a Future right away;
+    the IO thread writes them back to back without waiting for each confirm
+    and resolves the Future with the batch latency in seconds when the broker
+    has acked every message, or fails it on a nack or a lost connection.
+    Batches from many jobs are in flight at the same time. After a lost
+    connection the publisher reconnects with exponential backoff and sends
+    the batches that were waiting for it.
+    """
+
+    def __init__(self, host="localhost", initial_backoff=0.5, max_backoff=30.0):
+        self.connection_params = pika.ConnectionParameters(
+            host, heartbeat=600, blocked_connection_timeout=300
+        )
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._waiting = []  # batches not written to the broker yet
+        self._unconfirmed = {}  # delivery tag -> batch, in publish order
+        self._delivery_tag = 0
+        self._connection = None
+        self._channel = None
+        self._ready = False
+        self._ready_once = False  # whether the current connection got as far as confirm mode
+        self._closing = False
+        self._thread = None  # IO thread, started by the first publish
+
+    def _run(self):
+        backoff = self.initial_backoff
+        while not self._closing:
+            self._ready_once = False
+            connection = pika.SelectConnection(
+                self.connection_params,
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_error,
+                on_close_callback=self._on_connection_closed,
+            )
+            with self._lock:
+                self._connection = connection
+            connection.ioloop.start()
+            with self._lock:
+                self._connection = None
+            if self._ready_once:
+                backoff = self.initial_backoff
+            if not self._closing:
+                logging.warning(f"Confirm publisher disconnected, reconnecting in {backoff:.1f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        self._fail_waiting(ConnectionError("Publisher is closed"))
+
+    # Everything below runs on the IO thread
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_error(self, connection, error):
+        logging.error(f"Confirm publisher could not connect: {error!r}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        self._channel = None
+        self._ready = False
+        self._fail_unconfirmed(ConnectionError(f"Connection lost before the broker confirmed: {reason!r}"))
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        self._channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.confirm_delivery(self._on_confirm, callback=self._on_confirm_mode)
+
+    def _on_channel_closed(self, channel, reason):
+        # Reconnect from scratch, the connection close callback fails what is in flight
+        self._ready = False
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+
+    def _on_confirm_mode(self, frame):
+        self._delivery_tag = 0
+        self._ready = True
+        self._ready_once = True
+        self._flush()
+
+    def _flush(self):
+        if not self._ready:
+            return
+        with self._lock:
+            batches, self._waiting = self._waiting, []
+        for batch in batches:
+            if batch.future.done():
+                continue  # the caller gave up waiting
+            try:
+                for exchange, routing_key, body, properties in batch.messages:
+                    self._channel.basic_publish(exchange, routing_key, body, properties)
+                    self._delivery_tag += 1
+                    self._unconfirmed[self._delivery_tag] = batch
+            except Exception as e:
+                batch.fail(e)
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        if method.multiple:
+            tags = [tag for tag in self._unconfirmed if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        for tag in tags:
+            batch = self._unconfirmed.pop(tag, None)
+            if batch is None:
+                continue
+            if acked:
+                batch.confirm()
+            else:
+                batch.fail(Exception("Broker rejected the message (basic.nack)"))
+
+    def _fail_unconfirmed(self, error):
+        batches = list(self._unconfirmed.values())
+        self._unconfirmed.clear()
+        for batch in batches:
+            batch.fail(error)
+
+    def _fail_waiting(self, error):
+        with self._lock:
+            batches, self._waiting = self._waiting, []
+        for batch in batches:
+            batch.fail(error)
+
+    # Public API, safe to call from any thread
+
+    def _wake(self, callback):
+        with self._lock:
+            connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(callback)
+            except Exception:
+                pass  # connection is going away, the batch is sent after the reconnect
+
+    def publish_batch(self, messages):
+        """
+        Queue (exchange, routing_key, body, properties) messages for publishing.
+        Returns a Future with the seconds until all of them were confirmed.
+        Cancel it to drop the batch if it has not been written yet.
+        """
+        batch = PublishBatch(list(messages))
+        if not batch.messages:
+            batch.future.set_result(0.0)
+            return batch.future
+        with self._lock:
+            if self._closing:
+                raise ConnectionError("Publisher is closed")
+            self._waiting.append(batch)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ConfirmPublisher", daemon=True)
+                self._thread.start()
+        self._wake(self._flush)
+        return batch.future
+
+    def publish(self, exchange, routing_key, body, properties=None, timeout=30):
+        future = self.publish_batch([(exchange, routing_key, body, properties)])
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # The caller saw a failure, do not send the message after a reconnect
+            future.cancel()
+            raise
+
+    def close(self, timeout=10):
+        """Close the connection. Batches still waiting or unconfirmed fail with ConnectionError."""
+        self._closing = True
+
+        def close_connection():
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+            elif self._connection is not None:
+                self._connection.ioloop.stop()
+
+        self._wake(close_connection)
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import threading
+import pika
+from bson import encode
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from publisher_pool import PublisherPool, ConfirmPublisher
+
+# Requires a running RabbitMQ broker on localhost with the Topic exchange set up
+
+ITEMS_PER_JOB = 4
+
+
+def make_batch(i):
+    messages = []
+    for n in range(ITEMS_PER_JOB):
+        item = {"ID": f"bench-{i}", "file_name": f"bench-{n}.pdf", "PayloadRef": "sha256:" + "0" * 64}
+        properties = pika.BasicProperties(delivery_mode=2)
+        messages.append(("", "Dashboard", encode({"job_id": item["ID"]}), properties))
+        messages.append(("Topic", ".Document.", encode(item), properties))
+    return messages
+
+
+class BlockingConfirms:
+    # The straightforward way to get confirms: every publish waits for its own ack
+    def __init__(self):
+        self.local = threading.local()
+
+    def publish_batch(self, messages):
+        if not hasattr(self.local, "channel"):
+            connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
+            self.local.channel = connection.channel()
+            self.local.channel.confirm_delivery()
+        for exchange, routing_key, body, properties in messages:
+            self.local.channel.basic_publish(exchange, routing_key, body, properties)
+
+
+def run(publish_job, num_jobs, num_threads):
+    latencies = []
+
+    def worker(start):
+        for i in range(start, num_jobs, num_threads):
+            started = time.perf_counter()
+            publish_job(make_batch(i))
+            latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(num_threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return num_jobs / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def report(name, result):
+    jobs_per_sec, p50, p95 = result
+    print(f"{name:<28} {jobs_per_sec:8.1f} jobs/sec  p50 {p50 * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    NUM_JOBS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    NUM_THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    pool = PublisherPool("localhost")
+    report("Pool, no confirms", run(lambda m: pool.publish_batch(m).result(), NUM_JOBS, NUM_THREADS))
+    pool.close()
+
+    report("Blocking, confirm per message", run(BlockingConfirms().publish_batch, NUM_JOBS, NUM_THREADS))
+
+    confirming = ConfirmPublisher("localhost")
+    report("Batched async confirms", run(lambda m: confirming.publish_batch(m).result(30), NUM_JOBS, NUM_THREADS))
+    confirming.close()
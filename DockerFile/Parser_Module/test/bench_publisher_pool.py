@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import threading
+import pika
+from bson import encode
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import parse
+from publisher_pool import PublisherPool
+
+# Requires a running RabbitMQ broker on localhost with the Topic exchange set up
+
+
+def make_job(i):
+    return {
+        "ID": f"bench-{i}",
+        "Documents": [
+            {
+                "ID": f"bench-{i}",
+                "content_id": f"content-{i}",
+                "DocumentId": f"doc-{i}",
+                "file_name": "bench.pdf",
+                "Payload": b"x" * 1024,
+            }
+        ],
+        "Images": [],
+        "Audio": [],
+        "Video": [],
+    }
+
+
+def parse_with_new_connection(obj):
+    # The old behaviour: one connection opened and closed per job
+    connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
+    channel = connection.channel()
+    for item in obj["Documents"]:
+        channel.basic_publish(exchange="", routing_key="Dashboard", body=encode({"job_id": item["ID"]}))
+        channel.basic_publish(exchange="Topic", routing_key=".Document.", body=encode(item))
+    connection.close()
+
+
+def run(target, num_jobs, num_threads):
+    def worker(start):
+        for i in range(start, num_jobs, num_threads):
+            target(make_job(i))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(num_threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return num_jobs / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    NUM_JOBS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    NUM_THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    before = run(parse_with_new_connection, NUM_JOBS, NUM_THREADS)
+    print(f"Connection per job: {before:.1f} jobs/sec")
+
+    parse.publisher = PublisherPool("localhost")
+    after = run(parse.parse_bson_obj, NUM_JOBS, NUM_THREADS)
+    parse.publisher.close()
+    print(f"Pooled publisher:   {after:.1f} jobs/sec ({after / before:.1f}x)")
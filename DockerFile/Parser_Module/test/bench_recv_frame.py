@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import socket
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from parse import recv_frame
+
+MB = 1024 * 1024
+SIZES = [1 * MB, 100 * MB, 1024 * MB]
+
+
+def recv_concat(sock):
+    # The previous receive path: bytes concatenation, quadratic in the frame size
+    length_data = sock.recv(4)
+    expected_length = int.from_bytes(length_data, byteorder="little")
+    data = b""
+    while len(data) < expected_length - 4:
+        more_data = sock.recv(expected_length - 4 - len(data))
+        if not more_data:
+            raise Exception("Socket closed before we received the complete document")
+        data += more_data
+    return length_data + data
+
+
+def make_frame(size):
+    # Only the length prefix matters to the receive path, the body is not decoded
+    frame = bytearray(size)
+    frame[:4] = size.to_bytes(4, byteorder="little")
+    return frame
+
+
+def time_receive(receiver, frame):
+    sender_sock, receiver_sock = socket.socketpair()
+    sender = threading.Thread(target=sender_sock.sendall, args=(frame,))
+    started = time.perf_counter()
+    sender.start()
+    data = receiver(receiver_sock)
+    elapsed = time.perf_counter() - started
+    sender.join()
+    sender_sock.close()
+    receiver_sock.close()
+    assert len(data) == len(frame)
+    return elapsed
+
+
+if __name__ == "__main__":
+    # The old path takes minutes at 1 GB, so it only runs up to 100 MB unless asked
+    include_slow = "--include-slow" in sys.argv
+
+    for size in SIZES:
+        frame = make_frame(size)
+        after = time_receive(lambda sock: recv_frame(sock, max_frame_size=size), frame)
+        line = f"{size // MB:>5} MB  recv_into: {after:8.3f}s ({size / MB / after:8.1f} MB/s)"
+        if size <= 100 * MB or include_slow:
+            before = time_receive(recv_concat, frame)
+            line += f"  concat: {before:8.3f}s ({size / MB / before:8.1f} MB/s)"
+        else:
+            line += "  concat: skipped (use --include-slow)"
+        print(line)
+        del frame
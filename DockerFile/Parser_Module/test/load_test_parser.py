@@ -1,28 +1,17 @@
 import socket
 import bson
-import hashlib
 import datetime
 import json
-import random
 import threading
 import logging
+import os
+import sys
 
-logging.basicConfig(filename='sender_log.log', level=logging.INFO)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../Metadata_Module')))
+from id_service import new_id
 
+logging.basicConfig(filename='sender_log.log', level=logging.INFO)
 
-def compute_unique_id(data_object):
-    # Convert the object to a string
-    data_str = json.dumps(data_object, default=object)
-    
-    # Append the current date and time
-    current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
-    
-    combined_data = data_str + current_time + str(random.random())
-    
-    # Generate SHA-256 hash
-    unique_id = hashlib.sha256(combined_data.encode()).hexdigest()
-    
-    return unique_id
 
 def send_bson_obj(job):   
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -33,23 +22,23 @@ def send_bson_obj(job):
     s.close()
 
 def id_generator(job):
-    job['ID'] = compute_unique_id(job)  # Assigning unique ID as a string
+    job['ID'] = new_id()  # Assigning unique ID as a string
     if 'NumberOfDocuments' in job and job['NumberOfDocuments'] > 0:
         for document in job['Documents']:
             document['ID'] = job['ID']
-            document['DocumentId'] = compute_unique_id(document)
+            document['DocumentId'] = new_id()
     if 'NumberOfImages' in job and job['NumberOfImages'] > 0:
         for image in job['Images']:
             image['ID'] = job['ID']
-            image['PictureID'] = compute_unique_id(image)
+            image['PictureID'] = new_id()
     if 'NumberOfAudio' in job and job['NumberOfAudio'] > 0:
         for audio in job['Audio']:
             audio['ID'] = job['ID']
-            audio['AudioID'] = compute_unique_id(audio)
+            audio['AudioID'] = new_id()
     if 'NumberOfVideo' in job and job['NumberOfVideo'] > 0:
         for video in job['Video']:
             video['ID'] = job['ID']
-            video['VideoID'] = compute_unique_id(video)
+            video['VideoID'] = new_id()
     return job
 
 def send_jobs_concurrently(job, num_jobs, num_threads):
@@ -2,10 +2,22 @@ import unittest
 import unittest.mock
 import bson
 import socket
+import io
+import tempfile
+import asyncio
+import threading
+import time
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from parse import handle_client, parse_bson_obj, publish_to_rabbitmq, receive_bson_obj
+from parse import handle_client, parse_bson_obj, publish_to_rabbitmq, receive_bson_obj, IngestServer, recv_frame, FrameTooLargeError
+from publisher_pool import PublisherPool, ConfirmPublisher
+import concurrent.futures
+from concurrent.futures import Future
+import pika.spec
+from parser_client import ParserClient, AsyncParserClient, ack_ok
+from blob_store import BlobStore, offload_payload, resolve_payload
+from id_service import content_hash
 
 class TestParseFunctions(unittest.TestCase):
     def setUp(self):
@@ -15,22 +27,55 @@ class TestParseFunctions(unittest.TestCase):
             'Audio': [],
             'Video': []
         }
-        self.bson_obj = bson.dumps(self.obj)
+        self.bson_obj = bson.encode(self.obj)
+
+        # Keep offloaded payloads out of the real blob store
+        blob_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(blob_dir.cleanup)
+        self.blob_store = BlobStore(blob_dir.name)
+        patcher = unittest.mock.patch('blob_store.blob_store', self.blob_store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     '''
       - Purpose: To verify the handle_client function's ability to correctly handle a client connection.
       - Process: Mocks the socket.socket.recv function and checks if it's called with the correct arguments. Also mocks the socket.socket.close function and checks if it's called.
       - Validation: Ensures that the client handling function correctly handles a client connection.
     '''
-    def test_handle_client(self):
+    def mock_client(self, data):
+        # Serve data through recv_into in small pieces, like a real socket would
+        stream = io.BytesIO(data)
+        def recv_into(view):
+            chunk = stream.read(min(len(view), 7))
+            view[:len(chunk)] = chunk
+            return len(chunk)
         mock_socket = unittest.mock.MagicMock()
-        mock_socket.recv.return_value = self.bson_obj
+        mock_socket.recv_into.side_effect = recv_into
+        return mock_socket
+
+    def test_handle_client(self):
+        mock_socket = self.mock_client(self.bson_obj)
 
         with unittest.mock.patch('parse.parse_bson_obj') as mock_parse_bson_obj:
             handle_client(mock_socket)
             mock_parse_bson_obj.assert_called_once_with(self.obj)
             mock_socket.close.assert_called_once()
-            
+
+    '''
+      - Purpose: To verify that handle_client rejects jobs larger than the configured frame limit.
+      - Process: Sends a length prefix above the limit and checks how many bytes are read after it.
+      - Validation: Ensures that the oversized job is rejected from its length prefix alone, without reading the body.
+    '''
+    def test_handle_client_frame_too_large(self):
+        mock_socket = self.mock_client(self.bson_obj)
+        with unittest.mock.patch('parse.parse_bson_obj') as mock_parse_bson_obj, \
+            unittest.mock.patch('framing.MAX_FRAME_SIZE', 8):
+            with self.assertRaises(FrameTooLargeError):
+                recv_frame(mock_socket, max_frame_size=8)
+            handle_client(self.mock_client(self.bson_obj))
+            mock_parse_bson_obj.assert_not_called()
+            self.assertEqual(mock_socket.recv_into.call_count, 1)
+
     '''
       - Purpose: To verify the parse_bson_obj function's ability to correctly parse a BSON object and call the publish_to_rabbitmq function for each document.
       - Process: Mocks the publish_to_rabbitmq function and checks if it's called with the correct arguments based on the BSON object.
@@ -43,39 +88,330 @@ class TestParseFunctions(unittest.TestCase):
     
     '''
       - Purpose: To verify the publish_to_rabbitmq function's ability to correctly publish a message to RabbitMQ.
-      - Process: Mocks the pika.BlockingConnection and pika.BlockingConnection.channel functions and checks if they're called with the correct arguments. Also mocks the pika.BlockingConnection.close function and checks if it's called.
-      - Validation: Ensures that the publishing function correctly establishes a connection to RabbitMQ, creates a channel, publishes a message, and closes the connection.
+      - Process: Mocks the pika.BlockingConnection and pika.BlockingConnection.channel functions, publishes twice through a fresh PublisherPool and checks the calls.
+      - Validation: Ensures that the publishing function publishes the message on the Topic exchange and reuses one long-lived connection instead of opening and closing one per message.
     '''
     def test_publish_to_rabbitmq(self):
       mock_connection = unittest.mock.Mock()
       mock_channel = unittest.mock.Mock()
-      with unittest.mock.patch('pika.BlockingConnection', return_value=mock_connection), \
-        unittest.mock.patch.object(mock_connection, 'channel', return_value=mock_channel), \
-        unittest.mock.patch.object(mock_connection, 'close'):
+      mock_connection.channel.return_value = mock_channel
+      with unittest.mock.patch('pika.BlockingConnection', return_value=mock_connection) as mock_blocking_connection, \
+        unittest.mock.patch('parse.publisher', PublisherPool()):
+        publish_to_rabbitmq('.Document.', self.obj['Documents'][0])
         publish_to_rabbitmq('.Document.', self.obj['Documents'][0])
+        mock_blocking_connection.assert_called_once()
         mock_connection.channel.assert_called_once()
-        mock_channel.basic_publish.assert_called_once_with(exchange="Topic", routing_key='.Document.', body=bson.dumps(self.obj['Documents'][0]))
-        mock_connection.close.assert_called_once()
+        mock_channel.basic_publish.assert_any_call(exchange="Topic", routing_key='.Document.', body=bson.encode(self.obj['Documents'][0]), properties=None)
+        mock_connection.close.assert_not_called()
+
+    def mock_publisher(self):
+      # Publisher whose batches are confirmed immediately
+      mock_publisher = unittest.mock.Mock()
+      confirmed = Future()
+      confirmed.set_result(0.001)
+      mock_publisher.publish_batch.return_value = confirmed
+      return unittest.mock.patch('parse.publisher', mock_publisher)
+
+    '''
+      - Purpose: To verify that parse_bson_obj publishes all messages of a job as one batch through the shared publisher.
+      - Process: Replaces the module level publisher with a mock and parses a job with one document.
+      - Validation: Ensures that the dashboard and content messages are sent together in a single batch and no new connection is opened per job.
+    '''
+    def test_parse_bson_obj_uses_publisher_pool(self):
+      obj = {
+          'Documents': [{'ID': 'JobID', 'content_id': 'ContentID', 'DocumentId': 'DocID', 'file_name': 'a.pdf', 'Payload': b''}],
+          'Images': [],
+          'Audio': [],
+          'Video': []
+      }
+      with self.mock_publisher() as mock_publisher, \
+        unittest.mock.patch('pika.BlockingConnection') as mock_blocking_connection:
+        self.assertTrue(parse_bson_obj(obj))
+        mock_blocking_connection.assert_not_called()
+        mock_publisher.publish_batch.assert_called_once()
+        routing_keys = [routing_key for _, routing_key, _, _ in mock_publisher.publish_batch.call_args.args[0]]
+        self.assertEqual(routing_keys, ['Dashboard', '.Document.'])
+
+    '''
+      - Purpose: To verify that binary payloads are offloaded to the blob store instead of being published through RabbitMQ.
+      - Process: Parses a job with an image payload through a mocked publisher and decodes the published content message.
+      - Validation: Ensures that the message carries only a PayloadRef and PayloadSize, that the reference resolves to the original bytes and that identical payloads are stored once.
+    '''
+    def test_parse_bson_obj_offloads_payload(self):
+      payload = os.urandom(5000)
+      obj = {
+          'Documents': [],
+          'Images': [
+              {'ID': 'JobID', 'PictureID': 'PicA', 'file_name': 'a.png', 'Payload': payload},
+              {'ID': 'JobID', 'PictureID': 'PicB', 'file_name': 'b.png', 'Payload': payload},
+          ],
+          'Audio': [],
+          'Video': []
+      }
+      with self.mock_publisher() as mock_publisher:
+        self.assertTrue(parse_bson_obj(obj))
+      messages = [bson.decode(body) for _, routing_key, body, _ in mock_publisher.publish_batch.call_args.args[0] if routing_key == '.Image.']
+      self.assertEqual(len(messages), 2)
+      for message in messages:
+        self.assertNotIn('Payload', message)
+        self.assertEqual(message['PayloadSize'], len(payload))
+        self.assertEqual(resolve_payload(message), payload)
+        self.assertLess(len(bson.encode(message)), 500)
+      self.assertEqual(messages[0]['PayloadRef'], messages[1]['PayloadRef'])
+
+    '''
+      - Purpose: To verify that a failed streamed write leaves nothing behind and reports the real error.
+      - Process: Streams chunks from an iterator that fails midway, then streams while the temp file cannot be created.
+      - Validation: Ensures that the original exceptions are raised, not a NameError from the cleanup, and that no partial file is left in the store.
+    '''
+    def test_blob_store_put_stream_cleanup(self):
+        def chunks():
+            yield b'first chunk'
+            raise ConnectionResetError('client went away')
+        with self.assertRaises(ConnectionResetError):
+            self.blob_store.put_stream(chunks())
+        self.assertEqual([files for _, _, files in os.walk(self.blob_store.root)], [[]])
+
+        with unittest.mock.patch.object(self.blob_store, '_temp_file', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.blob_store.put_stream([b'data'])
+        self.assertEqual(self.blob_store.put_stream([b'da', b'ta']), content_hash(b'data'))
+
+    '''
+      - Purpose: To verify that the publisher pool reconnects when the broker drops the connection.
+      - Process: Makes the first basic_publish raise a pika connection error and the second succeed.
+      - Validation: Ensures that the message is published on a fresh connection after the failure.
+    '''
+    def test_publisher_pool_reconnects(self):
+      import pika.exceptions
+      mock_connection = unittest.mock.Mock()
+      mock_channel = unittest.mock.Mock()
+      mock_channel.basic_publish.side_effect = [pika.exceptions.StreamLostError(), None]
+      mock_connection.channel.return_value = mock_channel
+      with unittest.mock.patch('pika.BlockingConnection', return_value=mock_connection) as mock_blocking_connection, \
+        unittest.mock.patch('time.sleep'):
+        pool = PublisherPool(initial_backoff=0)
+        pool.publish(exchange="Topic", routing_key='.Document.', body=b'x')
+        self.assertEqual(mock_blocking_connection.call_count, 2)
+        self.assertEqual(mock_channel.basic_publish.call_count, 2)
+
+    '''
+      - Purpose: To verify that the confirm publisher resolves a job's batch only once the broker confirmed all of its messages.
+      - Process: Drives the publisher's IO callbacks by hand with a mocked connection and channel, publishes two batches and feeds broker acks and nacks.
+      - Validation: Ensures that both batches are written without waiting for confirms, a multiple ack resolves the first batch with its latency and a nack fails the second.
+    '''
+    def test_confirm_publisher_batches(self):
+      mock_channel = unittest.mock.Mock()
+      mock_connection = unittest.mock.Mock()
+      mock_connection.ioloop.add_callback_threadsafe.side_effect = lambda callback: callback()
+      publisher = ConfirmPublisher()
+      publisher._thread = unittest.mock.Mock()  # IO callbacks are invoked by the test instead
+      publisher._connection = mock_connection
+      publisher._on_channel_open(mock_channel)
+      publisher._on_confirm_mode(None)
+
+      first = publisher.publish_batch([('', 'Dashboard', b'a', None), ('Topic', '.Document.', b'b', None)])
+      second = publisher.publish_batch([('Topic', '.Image.', b'c', None)])
+      self.assertEqual(mock_channel.basic_publish.call_count, 3)
+      self.assertFalse(first.done())
 
+      publisher._on_confirm(unittest.mock.Mock(method=pika.spec.Basic.Ack(delivery_tag=2, multiple=True)))
+      self.assertGreaterEqual(first.result(0), 0)
+      self.assertFalse(second.done())
+      publisher._on_confirm(unittest.mock.Mock(method=pika.spec.Basic.Nack(delivery_tag=3)))
+      with self.assertRaises(Exception):
+        second.result(0)
+
+    '''
+      - Purpose: To verify that a publish the caller gave up on is not sent after a reconnect.
+      - Process: Publishes one message through a confirm publisher that has no connection, with a short timeout, then brings the channel up.
+      - Validation: Ensures that the publish raises a timeout, its batch is cancelled and nothing is written once the channel is ready.
     '''
-      - Purpose: To verify the receive_bson_obj function's ability to correctly start a socket server and listen for incoming BSON objects.
-      - Process: Mocks the socket.socket function and checks if it's called with the correct arguments. Also mocks the socket.socket.bind, socket.socket.listen, and threading.Thread.start functions and checks if they're called.
-      - Validation: Ensures that the socket server is correctly started and listens for incoming BSON objects.
+    def test_confirm_publisher_publish_timeout_cancels(self):
+      mock_channel = unittest.mock.Mock()
+      publisher = ConfirmPublisher()
+      publisher._thread = unittest.mock.Mock()  # no IO thread, the broker stays unreachable
+      with self.assertRaises(concurrent.futures.TimeoutError):
+        publisher.publish('', 'Dashboard', b'a', timeout=0.05)
+      self.assertTrue(publisher._waiting[0].future.cancelled())
+
+      publisher._on_channel_open(mock_channel)
+      publisher._on_confirm_mode(None)
+      mock_channel.basic_publish.assert_not_called()
+
+    '''
+      - Purpose: To verify that a failing job does not wait for its error status to be confirmed.
+      - Process: Parses a malformed job through a mocked publisher whose batches are never confirmed.
+      - Validation: Ensures that parse_bson_obj returns False right away after handing the error status to the publisher.
+    '''
+    def test_parse_bson_obj_error_status_not_awaited(self):
+      mock_publisher = unittest.mock.Mock()
+      mock_publisher.publish_batch.return_value = Future()
+      with unittest.mock.patch('parse.publisher', mock_publisher):
+        started = time.perf_counter()
+        self.assertFalse(parse_bson_obj({'Documents': [{'file_name': 'a.pdf'}]}))
+        self.assertLess(time.perf_counter() - started, 1)
+      routing_keys = [routing_key for _, routing_key, _, _ in mock_publisher.publish_batch.call_args.args[0]]
+      self.assertEqual(routing_keys, ['Dashboard'])
+
+    def start_ingest_server(self, **kwargs):
+        server = IngestServer(host='localhost', port=0, **kwargs)
+        thread = threading.Thread(target=asyncio.run, args=(server.serve(),), daemon=True)
+        thread.start()
+        self.assertTrue(server.listening.wait(5))
+        return server, thread
+
+    '''
+      - Purpose: To verify the ingest server's ability to correctly accept connections and parse incoming BSON objects.
+      - Process: Starts an IngestServer on a free port, sends two length-prefixed BSON jobs over two connections and then stops the server.
+      - Validation: Ensures that every job is handed to parse_bson_obj and that the server drains and stops cleanly.
     '''
     def test_receive_bson_obj(self):
-        mock_socket = unittest.mock.Mock()
-        mock_socket.__enter__ = unittest.mock.Mock(return_value=mock_socket)
-        mock_socket.__exit__ = unittest.mock.Mock()
-        mock_socket.accept.side_effect = [(mock_socket, 'localhost'), KeyboardInterrupt]
-        with unittest.mock.patch('socket.socket', return_value=mock_socket), \
-            unittest.mock.patch.object(mock_socket, 'bind'), \
-            unittest.mock.patch.object(mock_socket, 'listen'), \
-            unittest.mock.patch('threading.Thread.start') as mock_start:
-            try:
-              receive_bson_obj()
-            except KeyboardInterrupt:
-              pass
-            mock_start.assert_called_once()
+        with unittest.mock.patch('parse.parse_bson_obj') as mock_parse_bson_obj, \
+            unittest.mock.patch('parse.publisher'):
+            server, thread = self.start_ingest_server()
+            for _ in range(2):
+                with socket.create_connection(('localhost', server.port)) as client:
+                    client.sendall(self.bson_obj)
+            time.sleep(0.5)
+            server.stop()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(mock_parse_bson_obj.call_count, 2)
+            mock_parse_bson_obj.assert_called_with(self.obj)
+
+    '''
+      - Purpose: To verify that several jobs can be pipelined over one persistent connection and are acknowledged by job ID.
+      - Process: Sends three jobs in one batch and then a fourth through a ParserClient, making the second job fail to publish.
+      - Validation: Ensures that a single connection is used, every job gets an ack with its own ID and the failed job is reported as failed.
+    '''
+    def test_receive_bson_obj_pipelined_acks(self):
+        jobs = [dict(self.obj, ID=f'job-{i}') for i in range(4)]
+        with unittest.mock.patch('parse.parse_bson_obj', side_effect=lambda obj: obj['ID'] != 'job-1') as mock_parse_bson_obj, \
+            unittest.mock.patch('parse.publisher'):
+            server, thread = self.start_ingest_server()
+            client = ParserClient('localhost', server.port, timeout=5)
+            with unittest.mock.patch.object(client, 'connect', wraps=client.connect) as mock_connect:
+                acks = client.send_jobs(jobs[:3])
+                acks.append(client.send_job(jobs[3]))
+                mock_connect.assert_called_once()
+            self.assertEqual([ack['ID'] for ack in acks], ['job-0', 'job-1', 'job-2', 'job-3'])
+            self.assertEqual([ack_ok(ack) for ack in acks], [True, False, True, True])
+
+            async def send_async():
+                async_client = AsyncParserClient('localhost', server.port, timeout=5)
+                results = await asyncio.gather(*(async_client.send_job(dict(self.obj, ID=f'async-{i}')) for i in range(3)))
+                await async_client.close()
+                return results
+            async_acks = asyncio.run(send_async())
+            self.assertEqual(sorted(ack['ID'] for ack in async_acks), ['async-0', 'async-1', 'async-2'])
+
+            client.close()
+            server.stop()
+            thread.join(5)
+            self.assertEqual(mock_parse_bson_obj.call_count, 7)
+
+    '''
+      - Purpose: To verify that the async client does not keep jobs it stopped waiting for and that a lost connection only fails the jobs sent on it.
+      - Process: Sends jobs to a server that never acks: one that times out, one on a first connection and one on a second connection, then closes the first connection from the server side.
+      - Validation: Ensures that the timed out job leaves no pending entry, that only the job of the lost connection fails and that the job on the newer connection is still waiting.
+    '''
+    def test_async_client_pending_jobs(self):
+        async def scenario():
+            connections = []
+            async def never_ack(reader, writer):
+                connections.append(writer)
+                await reader.read()
+            server = await asyncio.start_server(never_ack, 'localhost', 0)
+            client = AsyncParserClient('localhost', server.sockets[0].getsockname()[1], timeout=0.1)
+            with self.assertRaises(asyncio.TimeoutError):
+                await client.send_job(dict(self.obj, ID='timed-out'))
+            self.assertEqual(client.pending, {})
+
+            client.timeout = 5
+            first = asyncio.ensure_future(client.send_job(dict(self.obj, ID='first')))
+            await asyncio.sleep(0.1)
+            client.writer = None  # the next job opens a second connection
+            second = asyncio.ensure_future(client.send_job(dict(self.obj, ID='second')))
+            await asyncio.sleep(0.1)
+            self.assertEqual(len(connections), 2)
+            connections[0].close()
+            with self.assertRaises(ConnectionError):
+                await first
+            self.assertFalse(second.done())
+            self.assertIn('second', client.pending)
+            second.cancel()
+            await client.close()
+            server.close()
+            await server.wait_closed()
+        asyncio.run(scenario())
+
+    '''
+      - Purpose: To verify that a job sent in chunked mode is reassembled by the parser and that single-frame jobs still work on the same connection.
+      - Process: Sends a job whose document payload is split into small chunks (from bytes and from a file object), followed by a plain single-frame job.
+      - Validation: Ensures that the complete payloads end up in the blob store, both jobs are acked and the spool files are removed afterwards.
+    '''
+    def test_receive_bson_obj_chunked(self):
+        payload = os.urandom(10000)
+        job = {
+            'ID': 'chunked-job',
+            'Documents': [{'ID': 'chunked-job', 'file_name': 'a.pdf', 'Payload': payload}],
+            'Images': [{'ID': 'chunked-job', 'file_name': 'b.png', 'Payload': io.BytesIO(payload[:3000])}],
+            'Audio': [{'ID': 'chunked-job', 'file_name': 'c.mp3', 'Payload': b''}],
+            'Video': []
+        }
+        published = []
+        def fake_parse(obj):
+            items = {data_type: [offload_payload(item) for item in obj[data_type]] for data_type in ('Documents', 'Images', 'Audio')}
+            published.append((obj['ID'], items))
+            return True
+        with tempfile.TemporaryDirectory() as spool_dir, \
+            unittest.mock.patch('parse.SPOOL_DIR', spool_dir), \
+            unittest.mock.patch('parse.parse_bson_obj', side_effect=fake_parse), \
+            unittest.mock.patch('parse.publisher'):
+            server, thread = self.start_ingest_server()
+            client = ParserClient('localhost', server.port, timeout=5)
+            self.assertTrue(ack_ok(client.send_job_chunked(job, chunk_size=1024)))
+            self.assertTrue(ack_ok(client.send_job(dict(self.obj, ID='single-frame-job'))))
+            client.close()
+            server.stop()
+            thread.join(5)
+            self.assertEqual(os.listdir(spool_dir), [])
+        job_id, items = published[0]
+        self.assertEqual(job_id, 'chunked-job')
+        self.assertEqual(resolve_payload(items['Documents'][0]), payload)
+        self.assertEqual(items['Documents'][0]['PayloadRef'], content_hash(payload))
+        self.assertEqual(resolve_payload(items['Images'][0]), payload[:3000])
+        self.assertEqual(resolve_payload(items['Audio'][0]), b'')
+        self.assertNotIn('PayloadChunked', items['Documents'][0])
+        self.assertEqual(published[1][0], 'single-frame-job')
+
+    '''
+      - Purpose: To verify that the ingest server never publishes more jobs at once than its concurrency limit.
+      - Process: Blocks parse_bson_obj to simulate a slow broker and sends more jobs than the limit on separate connections.
+      - Validation: Ensures that only max_concurrent_jobs jobs are in flight until the broker catches up, and that all jobs are processed after that.
+    '''
+    def test_receive_bson_obj_concurrency_limit(self):
+        release = threading.Event()
+        in_flight = []
+        def slow_parse(obj):
+            in_flight.append(obj)
+            release.wait(5)
+        with unittest.mock.patch('parse.parse_bson_obj', side_effect=slow_parse), \
+            unittest.mock.patch('parse.publisher'):
+            server, thread = self.start_ingest_server(max_concurrent_jobs=2)
+            clients = [socket.create_connection(('localhost', server.port)) for _ in range(4)]
+            for client in clients:
+                client.sendall(self.bson_obj)
+            time.sleep(0.5)
+            self.assertEqual(len(in_flight), 2)
+            release.set()
+            for client in clients:
+                client.close()
+            time.sleep(0.5)
+            server.stop()
+            thread.join(5)
+            self.assertEqual(len(in_flight), 4)
 
     '''
       - Purpose: To verify that the handle_client function correctly handles exceptions.
@@ -89,25 +425,27 @@ class TestParseFunctions(unittest.TestCase):
       mock_channel.basic_publish.side_effect = Exception
       with unittest.mock.patch('pika.BlockingConnection', return_value=mock_connection), \
         unittest.mock.patch.object(mock_connection, 'channel', return_value=mock_channel), \
-        unittest.mock.patch.object(mock_connection, 'close'):
+        unittest.mock.patch('parse.publisher', PublisherPool()):
         with self.assertRaises(Exception):
           publish_to_rabbitmq('.Document.', self.obj['Documents'][0])
           
     '''
-      - Purpose: To verify that the handle_client function correctly handles exceptions.
-      - Process: Mocks the socket.socket.recv function and checks if it's called with the correct arguments. Also mocks the socket.socket.close function and checks if it's called.
-      - Validation: Ensures that the client handling function correctly handles exceptions.
+      - Purpose: To verify that the ingest server correctly handles a client that disconnects in the middle of a job.
+      - Process: Sends only part of a BSON document and closes the connection, then sends a complete job.
+      - Validation: Ensures that the broken job is dropped without being parsed and the server keeps serving other clients.
     '''
     def test_receive_bson_obj_with_exception(self):
-        mock_socket = unittest.mock.Mock()
-        mock_socket.__enter__ = unittest.mock.Mock(return_value=mock_socket)
-        mock_socket.__exit__ = unittest.mock.Mock()
-        mock_socket.accept.side_effect = Exception
-        with unittest.mock.patch('socket.socket', return_value=mock_socket), \
-            unittest.mock.patch.object(mock_socket, 'bind'), \
-            unittest.mock.patch.object(mock_socket, 'listen'), \
-            unittest.mock.patch('threading.Thread.start') as mock_start:
-            receive_bson_obj()  
-          
+        with unittest.mock.patch('parse.parse_bson_obj') as mock_parse_bson_obj, \
+            unittest.mock.patch('parse.publisher'):
+            server, thread = self.start_ingest_server()
+            with socket.create_connection(('localhost', server.port)) as client:
+                client.sendall(self.bson_obj[:10])
+            with socket.create_connection(('localhost', server.port)) as client:
+                client.sendall(self.bson_obj)
+            time.sleep(0.5)
+            server.stop()
+            thread.join(5)
+            mock_parse_bson_obj.assert_called_once_with(self.obj)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
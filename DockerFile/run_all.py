@@ -13,6 +13,9 @@ commands = [
     ("python websocket_server.py", os.path.join(base_dir, "WebSocket_Backend")),
     ("npm start", os.path.join(base_dir, "react_frontend")),
     ("python metabackendmac.py", os.path.join(base_dir, "Metadata_Module")),
+    ("python recNparse.py", os.path.join(base_dir, "Metadata_Module")),
+    ("python image_module.py", os.path.join(base_dir, "Metadata_Module")),
+    ("python enrichment.py", os.path.join(base_dir, "Metadata_Module")),
     ("uvicorn file_uploader_backend:app --reload", os.path.join(base_dir, "Main_Server"))
 ]
 
@@ -63,6 +66,11 @@ try:
     run_command("python websocket_server.py", os.path.join(base_dir, "WebSocket_Backend"))
     run_command("npm start", os.path.join(base_dir, "react_frontend"))
     run_command("python metabackendmac.py", os.path.join(base_dir, "Metadata_Module"))
+    # Long-lived consumers of the Store and Image queues filled by doc_module.py
+    run_command("python recNparse.py", os.path.join(base_dir, "Metadata_Module"))
+    run_command("python image_module.py", os.path.join(base_dir, "Metadata_Module"))
+    # Generates the mission profiles the analyzer queues on the Enrichment queue
+    run_command("python enrichment.py", os.path.join(base_dir, "Metadata_Module"))
     run_command("uvicorn file_uploader_backend:app --reload", os.path.join(base_dir, "Main_Server"))
 
     # Wait for the React UI process to finish
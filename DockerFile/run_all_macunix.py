@@ -13,6 +13,9 @@ commands = [
     ("python3 websocket_server.py", os.path.join(base_dir, "WebSocket_Backend")),
     ("export NODE_OPTIONS=--openssl-legacy-provider && npm start", os.path.join(base_dir, "react_frontend")),
     ("python3 metabackendmac.py", os.path.join(base_dir, "Metadata_Module")),
+    ("python3 recNparse.py", os.path.join(base_dir, "Metadata_Module")),
+    ("python3 image_moduleMac.py", os.path.join(base_dir, "Metadata_Module")),
+    ("python3 enrichment.py", os.path.join(base_dir, "Metadata_Module")),
     ("uvicorn file_uploader_backend:app --reload", os.path.join(base_dir, "Main_Server"))
 ]
 
@@ -61,6 +64,11 @@ try:
     run_command("python3 websocket_server.py", os.path.join(base_dir, "WebSocket_Backend"))
     run_command("export NODE_OPTIONS=--openssl-legacy-provider && npm start", os.path.join(base_dir, "react_frontend"))
     run_command("python3 metabackendmac.py", os.path.join(base_dir, "Metadata_Module"))
+    # Long-lived consumers of the Store and Image queues filled by doc_module.py
+    run_command("python3 recNparse.py", os.path.join(base_dir, "Metadata_Module"))
+    run_command("python3 image_moduleMac.py", os.path.join(base_dir, "Metadata_Module"))
+    # Generates the mission profiles the analyzer queues on the Enrichment queue
+    run_command("python3 enrichment.py", os.path.join(base_dir, "Metadata_Module"))
     run_command("uvicorn file_uploader_backend:app --reload", os.path.join(base_dir, "Main_Server"))
 
     # Wait for the React UI process to finish